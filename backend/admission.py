@@ -0,0 +1,179 @@
+"""
+ワーカーごとの受け付け制限（アドミッション制御）
+gunicorn の aiohttp ワーカーは /ws のセッションとTTSのリクエストをいくつでも受け付けるため、
+朝の混雑時に1つのワーカーにセッションが偏ると、そのワーカーの全員の遅延が大きくなる。
+ワーカーごとに同時に処理する数の上限を設け、超えた分は待たせずにすぐ断る
+
+- /ws のセッション: 上限を超えたらWebSocketを 1013（Try Again Later）で閉じる
+  （aiohttpのサーバーではアップグレード前に 503 + Retry-After を返す）
+- TTS（/api/tts/synthesize・stream・batch）: 上限を超えたら 503 + Retry-After を返す。
+  合成する場合（304・すべてメモリキャッシュにある場合以外）だけ枠を使う
+- /api/health で現在の数と空き（headroom）を返す（常に200。フロントエンドがTTSの有無の確認に使う）
+- /api/ready は空きがなければ 503 を返し、ロードバランサーが混んでいるワーカーを避けられるようにする
+
+上限は0で無制限（既定）
+"""
+import os
+import functools
+import contextlib
+from typing import Any, Dict, Optional
+
+from aiohttp import web
+
+MAX_WS_SESSIONS_PER_WORKER = int(os.getenv('MAX_WS_SESSIONS_PER_WORKER', '0'))
+MAX_TTS_IN_FLIGHT_PER_WORKER = int(os.getenv('MAX_TTS_IN_FLIGHT_PER_WORKER', '0'))
+ADMISSION_RETRY_AFTER = int(os.getenv('ADMISSION_RETRY_AFTER', '5'))
+
+# 上限を超えたセッションを閉じるクローズコード（Try Again Later）
+BUSY_CLOSE_CODE = 1013
+
+
+class AdmissionRejected(Exception):
+    """枠に空きがない（呼び出し側で busy_response を返す）"""
+
+    def __init__(self, limiter: 'AdmissionLimiter'):
+        super().__init__(f"{limiter.name} is at its limit ({limiter.limit})")
+        self.limiter = limiter
+
+
+class AdmissionLimiter:
+    """同時に処理する数を数え、上限を超えた分を断る（待たせない）"""
+
+    def __init__(self, name: str, limit: int, retry_after: int = ADMISSION_RETRY_AFTER):
+        """
+        初期化
+        Args:
+            name: 制限の名前（ログ・統計用）
+            limit: 同時に処理する数の上限（0で無制限）
+            retry_after: 断ったときにクライアントに伝える再試行までの秒数
+        """
+        self.name = name
+        self.limit = limit
+        self.retry_after = retry_after
+        self.active = 0
+        self._stats = {
+            'admitted': 0,
+            'rejected': 0,
+            'peak': 0,
+        }
+
+    @property
+    def headroom(self) -> Optional[int]:
+        """あといくつ受け付けられるか（無制限の場合はNone）"""
+        if self.limit <= 0:
+            return None
+        return max(0, self.limit - self.active)
+
+    def try_acquire(self) -> bool:
+        """空きがあれば1つ確保する（なければFalse）"""
+        if self.limit > 0 and self.active >= self.limit:
+            self._stats['rejected'] += 1
+            return False
+        self.active += 1
+        self._stats['admitted'] += 1
+        self._stats['peak'] = max(self._stats['peak'], self.active)
+        return True
+
+    def release(self) -> None:
+        """確保した1つを返す"""
+        self.active = max(0, self.active - 1)
+
+    @contextlib.contextmanager
+    def slot(self, needed: bool = True):
+        """
+        with の間だけ1つ確保する
+        Args:
+            needed: Falseの場合は確保しない（キャッシュから返せる場合など）
+        Raises:
+            AdmissionRejected: 空きがない場合
+        """
+        if not needed:
+            yield
+            return
+        if not self.try_acquire():
+            raise AdmissionRejected(self)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """現在の数・上限・空きと、受け付けた数・断った数"""
+        return {
+            'active': self.active,
+            'limit': self.limit or None,
+            'headroom': self.headroom,
+            'load': round(self.active / self.limit, 2) if self.limit > 0 else None,
+            **self._stats,
+        }
+
+
+# ワーカー（プロセス）ごとの制限
+ws_sessions = AdmissionLimiter('ws_sessions', MAX_WS_SESSIONS_PER_WORKER)
+tts_requests = AdmissionLimiter('tts_requests', MAX_TTS_IN_FLIGHT_PER_WORKER)
+
+
+def get_load() -> Dict[str, Any]:
+    """/api/health に載せるワーカーの負荷（どちらかの空きが0なら accepting はFalse）"""
+    limiters = (ws_sessions, tts_requests)
+    return {
+        'worker_pid': os.getpid(),
+        'accepting': all(limiter.headroom != 0 for limiter in limiters),
+        **{limiter.name: limiter.get_stats() for limiter in limiters},
+    }
+
+
+def busy_response(limiter: AdmissionLimiter) -> web.Response:
+    """上限を超えたリクエストへの 503 + Retry-After"""
+    return web.json_response(
+        {'error': 'Server busy, retry later', 'limit': limiter.name},
+        status=503,
+        headers={'Retry-After': str(limiter.retry_after)}
+    )
+
+
+def limit_concurrency(limiter: AdmissionLimiter):
+    """aiohttpのハンドラーを、limiter の空きがある間だけ実行するデコレーター"""
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(request):
+            try:
+                with limiter.slot():
+                    return await handler(request)
+            except AdmissionRejected:
+                return busy_response(limiter)
+        return wrapper
+    return decorator
+
+
+async def synthesize_with_admission(
+    limiter: AdmissionLimiter,
+    async_tts_service,
+    text: str,
+    voice_name: str,
+    language_code: str,
+    audio_format: str,
+    sample_rate: int
+) -> bytes:
+    """
+    メモリキャッシュにあればそのまま返し、合成する場合だけ limiter の枠を使って合成する
+    Args:
+        limiter: TTSの同時処理数の制限
+        async_tts_service: AsyncTTSServiceのインスタンス
+        text, voice_name, language_code, audio_format, sample_rate: 合成の条件
+    Returns:
+        指定フォーマットの音声データ
+    Raises:
+        AdmissionRejected: 合成が必要で、空きがない場合
+    """
+    audio_data = async_tts_service.get_cached_speech(text, voice_name, language_code, audio_format, sample_rate)
+    if audio_data is not None:
+        return audio_data
+    with limiter.slot():
+        return await async_tts_service.synthesize_speech(
+            text=text,
+            voice_name=voice_name,
+            language_code=language_code,
+            audio_format=audio_format,
+            sample_rate=sample_rate
+        )
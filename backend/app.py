@@ -11,6 +11,9 @@ from dotenv import load_dotenv
 # .envファイルを読み込む
 load_dotenv()
 
+# ワーカーごとの受け付け制限（.env の上限を読み込んだ後にインポートする）
+from admission import ws_sessions, tts_requests, get_load, busy_response, AdmissionRejected, synthesize_with_admission
+
 # ログ設定
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
@@ -18,12 +21,21 @@ logger = logging.getLogger(__name__)
 # Google Cloud TTS service をインポート（存在する場合）
 try:
     from google_cloud_tts import GoogleCloudTTSService
+    from async_tts import AsyncTTSService
+    from tts_streaming import is_stream_cached, open_pcm_stream
+    from tts_warmup import run_startup_warmup
+    from tts_formats import negotiate_audio_format, parse_sample_rate, audio_content_type
+    from tts_batch import BATCH_CONTENT_TYPE, is_batch_cached, parse_batch_items, synthesize_batch
+    from http_cache import TTS_CACHE_CONTROL, weak_etag, etag_matches
     tts_service = GoogleCloudTTSService()
+    # 合成はスレッドプールで実行してイベントループ（WebSocketプロキシ）を止めない
+    async_tts_service = AsyncTTSService(tts_service)
     HAS_TTS_SERVICE = True
-    logger.info("[TTS] Google Cloud TTS service initialized")
+    logger.info(f"[TTS] Google Cloud TTS service initialized (max concurrency: {async_tts_service.max_concurrency})")
 except ImportError as e:
     HAS_TTS_SERVICE = False
     tts_service = None
+    async_tts_service = None
     logger.warning(f"[TTS] Google Cloud TTS service not available: {e}")
 
 # 基本認証の設定
@@ -36,7 +48,10 @@ logger.info(f"[Basic Auth] Password configured: {'*' * len(BASIC_AUTH_PASSWORD)
 
 # 既存のWebSocketハンドラーをインポート
 try:
-    from main import handle_client, proxy, PROJECT_ID, PORT
+    from main import handle_client, proxy, PROJECT_ID, PORT, start_upstream_pool, close_upstream_pool
+    from main import get_proxy_stats
+    from proxy_metrics import proxy_metrics
+    from ws_bridge import bridge_websocket
 except ImportError as e:
     logger.warning(f"Failed to import from main.py: {e}")
     # デフォルト値を設定
@@ -44,6 +59,10 @@ except ImportError as e:
     PORT = int(os.getenv("PORT", "8080"))
     handle_client = None
     proxy = None
+    start_upstream_pool = None
+    close_upstream_pool = None
+    get_proxy_stats = None
+    proxy_metrics = None
 
 app = web.Application()
 
@@ -120,9 +139,19 @@ async def health_handler(request):
     """ヘルスチェックエンドポイント"""
     return web.json_response({
         'status': 'healthy',
-        'service': 'JR Ticket System Backend'
+        'service': 'JR Ticket System Backend',
+        # ロードバランサー向けのワーカーの負荷と空き
+        'load': get_load()
     })
 
+async def ready_handler(request):
+    """レディネスチェック（ワーカーに空きがなければ503。ロードバランサーが混んでいるワーカーを避ける）"""
+    load = get_load()
+    return web.json_response(
+        {'status': 'ready' if load['accepting'] else 'busy', 'load': load},
+        status=200 if load['accepting'] else 503
+    )
+
 async def tts_synthesize_handler(request):
     """TTSテキスト合成エンドポイント"""
     if not HAS_TTS_SERVICE:
@@ -144,23 +173,30 @@ async def tts_synthesize_handler(request):
                 status=400
             )
         
-        logger.info(f"[TTS] Synthesizing: {text[:50]}... with voice: {voice_name}")
+        # 出力フォーマット（audioFormat 指定 > Acceptヘッダー > WAV）
+        audio_format = negotiate_audio_format(
+            request.headers.get('Accept'),
+            data.get('audioFormat')
+        )
+        sample_rate = parse_sample_rate(data.get('sampleRate'), audio_format)
+        
+        logger.info(f"[TTS] Synthesizing: {text[:50]}... with voice: {voice_name} ({audio_format})")
         
-        # 音声合成を実行
-        audio_data = tts_service.synthesize_speech(
-            text=text,
-            voice_name=voice_name,
-            language_code=language_code
+        # 音声合成を実行（キャッシュ済みの場合はTTS APIを呼ばず、ワーカーの同時処理数の枠も使わずに返る）
+        audio_data = await synthesize_with_admission(
+            tts_requests, async_tts_service, text, voice_name, language_code, audio_format, sample_rate
         )
         
-        # WAVファイルとして返す
         return web.Response(
             body=audio_data,
-            content_type='audio/wav',
             headers={
-                'Content-Length': str(len(audio_data))
+                'Content-Type': audio_content_type(audio_format, sample_rate),
+                'Content-Length': str(len(audio_data)),
+                'Vary': 'Accept'
             }
         )
+    except AdmissionRejected as e:
+        return busy_response(e.limiter)
     except ValueError as e:
         logger.error(f"[TTS] Validation error: {e}")
         return web.json_response({'error': str(e)}, status=400)
@@ -168,6 +204,206 @@ async def tts_synthesize_handler(request):
         logger.error(f"[TTS] Error: {e}")
         return web.json_response({'error': str(e)}, status=500)
 
+async def tts_synthesize_get_handler(request):
+    """
+    TTSテキスト合成エンドポイント（GET版、ブラウザ・リバースプロキシでキャッシュ可能）
+    /api/tts/synthesize?text=...&voiceName=Kore&languageCode=ja-JP&audioFormat=wav&sampleRate=24000
+    """
+    if not HAS_TTS_SERVICE:
+        return web.json_response(
+            {'error': 'TTS service is not available'},
+            status=503
+        )
+    
+    text = request.query.get('text', '')
+    voice_name = request.query.get('voiceName', 'Kore')
+    language_code = request.query.get('languageCode', 'ja-JP')
+    
+    if not text:
+        return web.json_response(
+            {'error': 'Text is required'},
+            status=400
+        )
+    if voice_name not in tts_service.CHIRP3_HD_VOICES:
+        return web.json_response(
+            {'error': f"Invalid voice name. Available: {list(tts_service.CHIRP3_HD_VOICES.keys())}"},
+            status=400
+        )
+    
+    try:
+        audio_format = negotiate_audio_format(
+            request.headers.get('Accept'),
+            request.query.get('audioFormat')
+        )
+        sample_rate = parse_sample_rate(request.query.get('sampleRate'), audio_format)
+    except ValueError as e:
+        return web.json_response({'error': str(e)}, status=400)
+    
+    # ETagは合成の条件のハッシュ（合成しなくても決まる）ため、一致すれば何もせずに304を返す
+    etag = weak_etag(tts_service.content_hash(text, voice_name, language_code, audio_format, sample_rate))
+    cache_headers = {
+        'ETag': etag,
+        'Cache-Control': TTS_CACHE_CONTROL,
+        'Vary': 'Accept'
+    }
+    if etag_matches(request.headers.get('If-None-Match'), etag):
+        return web.Response(status=304, headers=cache_headers)
+    
+    try:
+        audio_data = await synthesize_with_admission(
+            tts_requests, async_tts_service, text, voice_name, language_code, audio_format, sample_rate
+        )
+    except AdmissionRejected as e:
+        return busy_response(e.limiter)
+    except ValueError as e:
+        return web.json_response({'error': str(e)}, status=400)
+    except Exception as e:
+        logger.error(f"[TTS] Error: {e}")
+        return web.json_response({'error': str(e)}, status=500)
+    
+    return web.Response(
+        body=audio_data,
+        headers={
+            'Content-Type': audio_content_type(audio_format, sample_rate),
+            'Content-Length': str(len(audio_data)),
+            **cache_headers
+        }
+    )
+
+async def tts_stream_handler(request):
+    """TTSストリーミング合成エンドポイント（文単位で合成できた順にPCMを送出）"""
+    if not HAS_TTS_SERVICE:
+        return web.json_response(
+            {'error': 'TTS service is not available'},
+            status=503
+        )
+    
+    try:
+        data = await request.json()
+    except Exception:
+        return web.json_response({'error': 'Invalid JSON'}, status=400)
+    
+    text = data.get('text', '')
+    voice_name = data.get('voiceName', 'Kore')
+    language_code = data.get('languageCode', 'ja-JP')
+    
+    if not text:
+        return web.json_response(
+            {'error': 'Text is required'},
+            status=400
+        )
+    if voice_name not in tts_service.CHIRP3_HD_VOICES:
+        return web.json_response(
+            {'error': f"Invalid voice name. Available: {list(tts_service.CHIRP3_HD_VOICES.keys())}"},
+            status=400
+        )
+    try:
+        sample_rate = parse_sample_rate(data.get('sampleRate'), 'pcm')
+    except ValueError as e:
+        return web.json_response({'error': str(e)}, status=400)
+    
+    logger.info(f"[TTS Stream] Synthesizing: {text[:50]}... with voice: {voice_name}")
+    
+    # 合成する区間がある場合（すべてメモリキャッシュにある場合以外）だけ、ワーカーの同時処理数の枠を使う
+    try:
+        with tts_requests.slot(needed=not is_stream_cached(async_tts_service, text, voice_name, language_code, sample_rate)):
+            return await write_tts_stream(request, text, voice_name, language_code, sample_rate)
+    except AdmissionRejected as e:
+        return busy_response(e.limiter)
+
+async def write_tts_stream(request, text, voice_name, language_code, sample_rate):
+    """tts_stream_handler で受け付けたテキストの音声を送出する"""
+    # 16bit リトルエンディアン モノラルのPCMをチャンク転送で返す
+    response = web.StreamResponse(
+        headers={
+            'Content-Type': audio_content_type('pcm', sample_rate),
+            'X-Audio-Sample-Rate': str(sample_rate),
+            'X-Audio-Channels': '1',
+            'Cache-Control': 'no-cache'
+        }
+    )
+    # 先頭の区間の合成を待ってからヘッダーを送る（失敗した場合は500を返せるように）
+    try:
+        segments = await open_pcm_stream(
+            async_tts_service,
+            text=text,
+            voice_name=voice_name,
+            language_code=language_code,
+            sample_rate=sample_rate
+        )
+    except Exception as e:
+        logger.error(f"[TTS Stream] Error: {e}")
+        return web.json_response({'error': str(e)}, status=500)
+    
+    response.enable_chunked_encoding()
+    await response.prepare(request)
+    
+    try:
+        async for pcm_data in segments:
+            await response.write(pcm_data)
+    except ConnectionResetError:
+        logger.info("[TTS Stream] Client disconnected")
+        return response
+    except Exception as e:
+        # ヘッダー送信後のためステータスは変えられない（送出を打ち切る）
+        logger.error(f"[TTS Stream] Error: {e}")
+    finally:
+        # 残りの区間の合成を取り消す
+        await segments.aclose()
+    
+    await response.write_eof()
+    return response
+
+async def tts_batch_handler(request):
+    """TTSバッチ合成エンドポイント（複数の案内文を並行に合成し、合成できた順に返す）"""
+    if not HAS_TTS_SERVICE:
+        return web.json_response(
+            {'error': 'TTS service is not available'},
+            status=503
+        )
+    
+    try:
+        data = await request.json()
+        items = parse_batch_items(data)
+        audio_format = negotiate_audio_format(None, data.get('audioFormat'))
+        sample_rate = parse_sample_rate(data.get('sampleRate'), audio_format)
+    except ValueError as e:
+        return web.json_response({'error': str(e)}, status=400)
+    except Exception:
+        return web.json_response({'error': 'Invalid JSON'}, status=400)
+    
+    logger.info(f"[TTS Batch] Synthesizing {len(items)} items ({audio_format})")
+    
+    # 合成するアイテムがある場合（すべてメモリキャッシュにある場合以外）だけ、ワーカーの同時処理数の枠を使う
+    try:
+        with tts_requests.slot(needed=not is_batch_cached(async_tts_service, items, audio_format, sample_rate)):
+            return await write_tts_batch(request, items, audio_format, sample_rate)
+    except AdmissionRejected as e:
+        return busy_response(e.limiter)
+
+async def write_tts_batch(request, items, audio_format, sample_rate):
+    """tts_batch_handler で受け付けたアイテムの音声を送出する"""
+    # アイテムごとに長さ付きのパートをチャンク転送で返す
+    response = web.StreamResponse(
+        headers={
+            'Content-Type': BATCH_CONTENT_TYPE,
+            'X-TTS-Batch-Items': str(len(items)),
+            'Cache-Control': 'no-cache'
+        }
+    )
+    response.enable_chunked_encoding()
+    await response.prepare(request)
+    
+    try:
+        async for part in synthesize_batch(async_tts_service, items, audio_format, sample_rate):
+            await response.write(part)
+    except ConnectionResetError:
+        logger.info("[TTS Batch] Client disconnected")
+        return response
+    
+    await response.write_eof()
+    return response
+
 async def tts_voices_handler(request):
     """利用可能な音声リストを取得するエンドポイント"""
     if not HAS_TTS_SERVICE:
@@ -183,6 +419,43 @@ async def tts_voices_handler(request):
         logger.error(f"[TTS] Error getting voices: {e}")
         return web.json_response({'error': str(e)}, status=500)
 
+async def tts_cache_stats_handler(request):
+    """TTSキャッシュの統計情報（ヒット/ミス/追い出し）を返すエンドポイント"""
+    if not HAS_TTS_SERVICE:
+        return web.json_response(
+            {'error': 'TTS service is not available'},
+            status=503
+        )
+    
+    return web.json_response({
+        'cache': tts_service.get_cache_stats(),
+        'executor': async_tts_service.get_stats()
+    })
+
+async def proxy_stats_handler(request):
+    """Geminiプロキシの統計情報（セッションごとの送信キューの深さ・破棄数など）を返すエンドポイント"""
+    if not get_proxy_stats:
+        return web.json_response(
+            {'error': 'WebSocket proxy is not available'},
+            status=503
+        )
+    
+    return web.json_response(get_proxy_stats())
+
+async def metrics_handler(request):
+    """Geminiプロキシのセッション計測のヒストグラム（Prometheusのテキスト形式、ワーカーごと）"""
+    if not proxy_metrics:
+        return web.json_response(
+            {'error': 'WebSocket proxy is not available'},
+            status=503
+        )
+    
+    return web.Response(
+        text=proxy_metrics.render_prometheus(),
+        content_type='text/plain',
+        headers={'Cache-Control': 'no-store'}
+    )
+
 # CORS設定
 cors = aiohttp_cors.setup(app, defaults={
     "*": aiohttp_cors.ResourceOptions(
@@ -198,18 +471,12 @@ async def websocket_handler(request):
         logger.error("WebSocket handler not available - Gemini API configuration may be missing")
         return web.Response(text="WebSocket service unavailable", status=503)
     
-    ws = web.WebSocketResponse()
-    await ws.prepare(request)
-    
-    # 既存のhandle_client関数を使用
-    try:
-        await handle_client(ws)
-    except Exception as e:
-        logger.error(f"WebSocket error: {e}")
-    finally:
-        await ws.close()
+    # セッション数が上限に達していれば、アップグレードせずに 503 + Retry-After を返す
+    if ws_sessions.headroom == 0:
+        return busy_response(ws_sessions)
     
-    return ws
+    # aiohttpのWebSocketをwebsocketsのインターフェースに合わせてhandle_clientに渡す
+    return await bridge_websocket(request, handle_client)
 
 # ルート設定
 # WebSocketルート
@@ -281,8 +548,37 @@ async def config_handler(request):
 
 app.router.add_get('/api/config', config_handler)
 app.router.add_get('/api/health', health_handler)
+app.router.add_get('/api/ready', ready_handler)
 app.router.add_post('/api/tts/synthesize', tts_synthesize_handler)
+app.router.add_get('/api/tts/synthesize', tts_synthesize_get_handler)
+app.router.add_post('/api/tts/stream', tts_stream_handler)
+app.router.add_post('/api/tts/batch', tts_batch_handler)
 app.router.add_get('/api/tts/voices', tts_voices_handler)
+app.router.add_get('/api/tts/cache/stats', tts_cache_stats_handler)
+app.router.add_get('/api/proxy/stats', proxy_stats_handler)
+app.router.add_get('/api/metrics', metrics_handler)
+
+
+async def start_tts_warmup(app):
+    """固定案内文の事前合成をバックグラウンドで開始（TTS_WARMUP_ON_START=true の場合）"""
+    if async_tts_service:
+        app['tts_warmup_task'] = asyncio.create_task(run_startup_warmup(async_tts_service))
+
+
+async def stop_tts_warmup(app):
+    """事前合成が終わっていなければ取り消す"""
+    task = app.get('tts_warmup_task')
+    if task and not task.done():
+        task.cancel()
+
+
+app.on_startup.append(start_tts_warmup)
+app.on_cleanup.append(stop_tts_warmup)
+
+# 上流（Gemini Live）接続のプールを起動時から補充しておく
+if start_upstream_pool:
+    app.on_startup.append(start_upstream_pool)
+    app.on_cleanup.append(close_upstream_pool)
 
 # APIルートにCORSを適用
 for route in app.router.routes():
@@ -0,0 +1,194 @@
+"""
+Google Cloud TTSの非同期ラッパー
+同期APIのsynthesize_speechを上限付きのスレッドプールで実行し、
+aiohttpのイベントループ（Gemini WebSocketプロキシ）を止めないようにする
+"""
+import os
+import asyncio
+import logging
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any
+
+from singleflight import AsyncSingleFlight
+from tts_formats import DEFAULT_SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncTTSService:
+    """GoogleCloudTTSServiceを同時実行数を制限して非同期に呼び出すサービス"""
+
+    def __init__(self, tts_service, max_concurrency: Optional[int] = None):
+        """
+        初期化
+        Args:
+            tts_service: GoogleCloudTTSServiceのインスタンス
+            max_concurrency: 同時に実行する合成の最大数（省略時は環境変数 TTS_MAX_CONCURRENCY）
+        """
+        self.tts_service = tts_service
+        self.max_concurrency = max_concurrency or int(os.getenv('TTS_MAX_CONCURRENCY', '4'))
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency,
+            thread_name_prefix='tts'
+        )
+        # 同じ内容の同時リクエストは1回の合成にまとめる
+        self._singleflight = AsyncSingleFlight()
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._running = 0
+        self._stats = {
+            'requests': 0,
+            'memory_fast_path': 0,
+            'executed': 0,
+            'failed': 0,
+        }
+
+    def get_cached_speech(
+        self,
+        text: str,
+        voice_name: str = 'Kore',
+        language_code: str = 'ja-JP',
+        audio_format: str = 'wav',
+        sample_rate: int = DEFAULT_SAMPLE_RATE
+    ) -> Optional[bytes]:
+        """
+        メモリキャッシュ済みの音声を返す（スレッドプールを使わない）
+
+        Args:
+            text: 合成するテキスト
+            voice_name: 音声の名前（Chirp3 HD）
+            language_code: 言語コード
+            audio_format: 出力フォーマット
+            sample_rate: 出力のサンプリングレート
+
+        Returns:
+            指定フォーマットの音声データ（キャッシュにない場合はNone）
+        """
+        cached = self.tts_service.get_cached_speech(
+            text, voice_name, language_code, audio_format, sample_rate
+        )
+        if cached is not None:
+            self._stats['requests'] += 1
+            self._stats['memory_fast_path'] += 1
+        return cached
+
+    def is_cached(
+        self,
+        text: str,
+        voice_name: str = 'Kore',
+        language_code: str = 'ja-JP',
+        audio_format: str = 'wav',
+        sample_rate: int = DEFAULT_SAMPLE_RATE
+    ) -> bool:
+        """
+        スレッドプールを使わずにメモリキャッシュから返せるか
+
+        Args:
+            text: 合成するテキスト
+            voice_name: 音声の名前（Chirp3 HD）
+            language_code: 言語コード
+            audio_format: 出力フォーマット
+            sample_rate: 出力のサンプリングレート
+
+        Returns:
+            メモリキャッシュにある場合はTrue
+        """
+        return self.tts_service.is_cached(text, voice_name, language_code, audio_format, sample_rate)
+
+    async def synthesize_speech(
+        self,
+        text: str,
+        voice_name: str = 'Kore',
+        language_code: str = 'ja-JP',
+        audio_format: str = 'wav',
+        sample_rate: int = DEFAULT_SAMPLE_RATE
+    ) -> bytes:
+        """
+        テキストから音声を非同期に合成
+
+        Args:
+            text: 合成するテキスト
+            voice_name: 音声の名前（Chirp3 HD）
+            language_code: 言語コード
+            audio_format: 出力フォーマット（wav / pcm / ogg_opus / mp3）
+            sample_rate: 出力のサンプリングレート
+
+        Returns:
+            指定フォーマットの音声データ（bytes）
+        """
+        # メモリキャッシュにあればスレッドプールを経由せずに返す
+        # （遅いChirp3呼び出しでプールが埋まっていてもキャッシュヒットは待たせない）
+        cached = self.get_cached_speech(text, voice_name, language_code, audio_format, sample_rate)
+        if cached is not None:
+            return cached
+        self._stats['requests'] += 1
+
+        # 同じ (テキスト, 音声, 言語, フォーマット, レート) の合成が実行中なら、その結果を共有する
+        # （WAVとPCMはキャッシュキーが同じため、フォーマットも含めて区別する）
+        cache_key = self.tts_service.cache_key(text, voice_name, language_code, audio_format, sample_rate)
+        return await self._singleflight.do(
+            f"{cache_key}:{audio_format}",
+            lambda: self.run(
+                self.tts_service.synthesize_speech,
+                text=text,
+                voice_name=voice_name,
+                language_code=language_code,
+                audio_format=audio_format,
+                sample_rate=sample_rate
+            )
+        )
+
+    async def run(self, func, *args, **kwargs):
+        """
+        任意の同期処理をTTS用スレッドプールで実行
+
+        Args:
+            func: 実行する同期関数
+            args, kwargs: 関数に渡す引数
+
+        Returns:
+            関数の戻り値
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._in_flight += 1
+        try:
+            return await loop.run_in_executor(
+                self._executor,
+                functools.partial(self._run_counted, func, *args, **kwargs)
+            )
+        except Exception:
+            self._stats['failed'] += 1
+            raise
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def _run_counted(self, func, *args, **kwargs):
+        """スレッドプール上で実行中の数を数えながら関数を呼び出す"""
+        with self._lock:
+            self._running += 1
+            self._stats['executed'] += 1
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """同時実行数とカウンタを取得"""
+        with self._lock:
+            return {
+                'max_concurrency': self.max_concurrency,
+                'in_flight': self._in_flight,
+                'running': self._running,
+                'queued': self._in_flight - self._running,
+                **self._stats,
+                'singleflight': self._singleflight.get_stats(),
+            }
+
+    def shutdown(self) -> None:
+        """スレッドプールを停止"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,192 @@
+"""
+クライアントからの入力音声フレームのまとめ送り
+ブラウザのAudioWorkletは短いPCMチャンクごとに realtime_input を送るため、
+そのまま転送すると上流（Vertex AI）へのメッセージ数とフレームごとのオーバーヘッドが増える。
+短い時間（PROXY_COALESCE_MS）だけ入力音声を溜め、1つの media_chunks メッセージにまとめて送る
+
+- 音声以外のメッセージ（setup / client_content / toolResponse など）が来たら、
+  溜めた音声を先に送ってからすぐに転送する（順序は変えない）
+- 溜めた音声が窓の長さに達したら、窓の終わりを待たずに送る
+- 1フレームで窓の長さ以上ある音声は溜めずにそのまま送る（遅延を増やさない）
+"""
+import os
+import json
+import base64
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+Message = Union[str, bytes]
+
+# まとめる時間（ミリ秒、0で無効）
+PROXY_COALESCE_MS = float(os.getenv('PROXY_COALESCE_MS', '60'))
+
+# Live APIの入力音声（16kHz / 16bit モノラル）
+INPUT_SAMPLE_RATE = 16000
+INPUT_BYTES_PER_SAMPLE = 2
+
+
+def parse_audio_frame(message: Message) -> Optional[Tuple[str, str, List[dict]]]:
+    """
+    realtime_input の音声フレームを分解
+
+    Args:
+        message: クライアントからのフレーム
+
+    Returns:
+        (realtime_input のキー, media_chunks のキー, チャンクのリスト)。
+        音声だけのフレームでない場合はNone
+    """
+    try:
+        data = json.loads(message)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if not isinstance(data, dict) or len(data) != 1:
+        return None
+    input_key, body = next(iter(data.items()))
+    if input_key not in ('realtime_input', 'realtimeInput') or not isinstance(body, dict) or len(body) != 1:
+        return None
+    chunks_key, chunks = next(iter(body.items()))
+    if chunks_key not in ('media_chunks', 'mediaChunks') or not isinstance(chunks, list) or not chunks:
+        return None
+    for chunk in chunks:
+        if not isinstance(chunk, dict) or not isinstance(chunk.get('data'), str):
+            return None
+    return input_key, chunks_key, chunks
+
+
+def merge_audio_frames(frames: List[Tuple[str, str, List[dict]]]) -> str:
+    """
+    分解した音声フレームを1つの realtime_input メッセージにまとめる
+    同じ mime type の連続したチャンクは、PCMを連結して1つのチャンクにする
+
+    Args:
+        frames: parse_audio_frame の結果のリスト
+
+    Returns:
+        まとめたメッセージ（JSON文字列）
+    """
+    input_key, chunks_key, _ = frames[0]
+    merged: List[dict] = []
+    pending: List[bytes] = []
+    current: Optional[dict] = None
+
+    def close_current():
+        if current is not None:
+            merged.append({**current, 'data': base64.b64encode(b''.join(pending)).decode('ascii')})
+
+    for _, _, chunks in frames:
+        for chunk in chunks:
+            mime_type = {k: v for k, v in chunk.items() if k != 'data'}
+            if current is None or mime_type != current:
+                close_current()
+                current = mime_type
+                pending = []
+            pending.append(base64.b64decode(chunk['data']))
+    close_current()
+    return json.dumps({input_key: {chunks_key: merged}})
+
+
+class AudioCoalescer:
+    """入力音声を窓の長さだけ溜めて、まとめて送り先に渡す"""
+
+    def __init__(
+        self,
+        emit: Callable[[Message, bool], Awaitable[bool]],
+        window_ms: float = PROXY_COALESCE_MS
+    ):
+        """
+        初期化
+        Args:
+            emit: 送り先（メッセージ, 音声か）を受け取り、受け付けたらTrueを返すコルーチン関数
+            window_ms: まとめる時間（ミリ秒）
+        """
+        self._emit = emit
+        self.window = window_ms / 1000
+        # 窓の長さ分のPCMのbase64の長さ（これ以上のフレームは溜めない）
+        self._window_base64_len = int(
+            window_ms / 1000 * INPUT_SAMPLE_RATE * INPUT_BYTES_PER_SAMPLE * 4 / 3
+        )
+        self._frames: List[Tuple[str, str, List[dict]]] = []
+        self._originals: List[Message] = []
+        self._buffered_len = 0
+        self._lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task] = None
+        self._closed = False
+        self._stats = {
+            'frames_in': 0,
+            'frames_out': 0,
+        }
+
+    async def push(self, message: Message, is_audio: bool) -> bool:
+        """
+        フレームを受け取る
+
+        Args:
+            message: クライアントからのフレーム
+            is_audio: 入力音声のフレームか
+
+        Returns:
+            送り先が受け付けている間はTrue（閉じられていた場合はFalse）
+        """
+        self._stats['frames_in'] += 1
+        parsed = None
+        if is_audio and len(message) < self._window_base64_len:
+            parsed = parse_audio_frame(message)
+
+        async with self._lock:
+            if self._closed:
+                return False
+            if parsed is None:
+                # まとめられないフレームは、溜めた音声を先に送ってからそのまま送る
+                if not await self._flush_locked():
+                    return False
+                return await self._send(message, is_audio)
+
+            self._frames.append(parsed)
+            self._originals.append(message)
+            self._buffered_len += sum(len(chunk['data']) for chunk in parsed[2])
+            if self._buffered_len >= self._window_base64_len:
+                return await self._flush_locked()
+            if self._timer is None:
+                self._timer = asyncio.create_task(self._flush_after_window())
+            return True
+
+    async def flush(self) -> bool:
+        """溜めた音声をすぐに送る"""
+        async with self._lock:
+            return await self._flush_locked()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """受け取ったフレーム数と送ったフレーム数"""
+        return {
+            'window_ms': self.window * 1000,
+            'buffered': len(self._frames),
+            **self._stats,
+        }
+
+    async def _flush_after_window(self) -> None:
+        await asyncio.sleep(self.window)
+        async with self._lock:
+            # 自分自身を取り消さないよう、送る前にタイマーを外す
+            self._timer = None
+            await self._flush_locked()
+
+    async def _flush_locked(self) -> bool:
+        if self._timer is not None and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+        self._timer = None
+        if not self._frames:
+            return True
+        frames, originals = self._frames, self._originals
+        self._frames, self._originals, self._buffered_len = [], [], 0
+        # 1フレームだけなら作り直さずにそのまま送る
+        message = originals[0] if len(originals) == 1 else merge_audio_frames(frames)
+        return await self._send(message, True)
+
+    async def _send(self, message: Message, is_audio: bool) -> bool:
+        accepted = await self._emit(message, is_audio)
+        if accepted:
+            self._stats['frames_out'] += 1
+        else:
+            self._closed = True
+        return accepted
@@ -0,0 +1,226 @@
+"""
+TTS音声の後処理エンジン
+繰り返し除去・DC除去・無音付加・フェードイン/アウト・ハイパスフィルタ・正規化を
+1回のint16→float32変換で行い、以降はfloat32のまま（可能な限りインプレースで）処理する
+フィルタ係数（SOS）とフェードカーブはサンプリングレートごとに事前計算してキャッシュする
+"""
+import math
+import struct
+import logging
+import functools
+from typing import Tuple, Union
+
+import numpy as np
+from scipy import signal
+
+from repeat_detector import RepeatDetector, RepeatDetection
+
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=16)
+def highpass_sos(sample_rate: int, cutoff: float = 20.0, order: int = 2) -> np.ndarray:
+    """
+    ハイパスフィルタのSOS係数を取得（サンプリングレートごとにキャッシュ）
+
+    Args:
+        sample_rate: サンプリングレート
+        cutoff: カットオフ周波数（Hz）
+        order: フィルタ次数
+
+    Returns:
+        float32のSOS係数
+    """
+    sos = signal.butter(order, cutoff / (sample_rate / 2), btype='high', output='sos')
+    return sos.astype(np.float32)
+
+
+@functools.lru_cache(maxsize=16)
+def fade_curves(fade_samples: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    フェードイン/アウトのS字カーブを取得（長さごとにキャッシュ）
+
+    Args:
+        fade_samples: フェードのサンプル数
+
+    Returns:
+        (フェードインカーブ, フェードアウトカーブ) のfloat32配列
+    """
+    t = np.linspace(0, 1, fade_samples, dtype=np.float32)
+    # スムーズステップ関数
+    fade_in = t * t * (3.0 - 2.0 * t)
+    u = 1.0 - t
+    fade_out = 1.0 - u * u * (3.0 - 2.0 * u)
+    fade_in.flags.writeable = False
+    fade_out.flags.writeable = False
+    return fade_in, fade_out
+
+
+@functools.lru_cache(maxsize=16)
+def resample_filter(up: int, down: int) -> np.ndarray:
+    """
+    ポリフェーズリサンプリング用のローパスFIRフィルタを取得（変換比ごとにキャッシュ）
+    scipy.signal.resample_poly の既定（Kaiser窓, beta=5.0）と同じ設計
+
+    Args:
+        up: アップサンプリング率（約分済み）
+        down: ダウンサンプリング率（約分済み）
+
+    Returns:
+        float32のフィルタ係数
+    """
+    max_rate = max(up, down)
+    half_len = 10 * max_rate
+    taps = signal.firwin(2 * half_len + 1, 1.0 / max_rate, window=('kaiser', 5.0))
+    taps = taps.astype(np.float32)
+    taps.flags.writeable = False
+    return taps
+
+
+def resample_pcm(pcm: bytes, src_rate: int, dst_rate: int) -> bytes:
+    """
+    16bit PCMのサンプリングレートを変換
+
+    Args:
+        pcm: PCMデータ（16ビット、モノラル）
+        src_rate: 元のサンプリングレート
+        dst_rate: 変換後のサンプリングレート
+
+    Returns:
+        変換後のPCMデータ
+    """
+    if src_rate == dst_rate or len(pcm) < 2:
+        return bytes(pcm)
+    g = math.gcd(src_rate, dst_rate)
+    up, down = dst_rate // g, src_rate // g
+    samples = np.frombuffer(pcm, dtype=np.int16, count=len(pcm) // 2).astype(np.float32)
+    resampled = signal.resample_poly(samples, up, down, window=resample_filter(up, down))
+    np.clip(resampled, -32768, 32767, out=resampled)
+    return resampled.astype(np.int16).tobytes()
+
+
+def pcm_from_audio_content(audio_content: bytes) -> Union[bytes, memoryview]:
+    """
+    TTS APIの音声データからPCM部分を取り出す（コピーしない）
+
+    LINEAR16の応答にはWAVヘッダーが付いているため、dataチャンクの中身だけを返す
+    ヘッダーがない場合はそのまま返す
+
+    Args:
+        audio_content: TTS APIの応答データ
+
+    Returns:
+        PCMデータ（16ビット、モノラル）
+    """
+    if len(audio_content) < 12 or audio_content[:4] != b'RIFF' or audio_content[8:12] != b'WAVE':
+        return audio_content
+
+    view = memoryview(audio_content)
+    pos = 12
+    while pos + 8 <= len(audio_content):
+        chunk_id = audio_content[pos:pos + 4]
+        chunk_size = struct.unpack_from('<I', audio_content, pos + 4)[0]
+        if chunk_id == b'data':
+            return view[pos + 8:pos + 8 + chunk_size]
+        pos += 8 + chunk_size + (chunk_size & 1)
+    return audio_content
+
+
+class AudioPostProcessor:
+    """TTS音声の後処理（ポップノイズ除去と重複除去）"""
+
+    def __init__(
+        self,
+        sample_rate: int = 24000,
+        fade_duration: float = 0.05,
+        silence_duration: float = 0.01,
+        highpass_cutoff: float = 20.0,
+        peak_level: float = 0.95
+    ):
+        """
+        初期化
+        Args:
+            sample_rate: サンプリングレート
+            fade_duration: フェードイン/アウトの長さ（秒）
+            silence_duration: 開始部分に付加する無音の長さ（秒）
+            highpass_cutoff: ハイパスフィルタのカットオフ周波数（Hz）
+            peak_level: 正規化後のピーク（フルスケールに対する比率）
+        """
+        self.sample_rate = sample_rate
+        self.fade_samples = int(fade_duration * sample_rate)
+        self.silence_samples = int(silence_duration * sample_rate)
+        self.peak_level = peak_level
+        self.repeat_detector = RepeatDetector(sample_rate=sample_rate)
+        self.sos = highpass_sos(sample_rate, highpass_cutoff)
+        if self.fade_samples > 0:
+            self.fade_in, self.fade_out = fade_curves(self.fade_samples)
+
+    def process(self, audio_content: bytes) -> bytes:
+        """
+        重複除去とフェード処理を行ったPCMを返す
+
+        Args:
+            audio_content: TTS APIの音声データ（WAVヘッダー付きでも可）
+
+        Returns:
+            後処理済みのPCMデータ（16ビット、モノラル）
+        """
+        processed, _ = self.process_with_diagnostics(audio_content)
+        return processed
+
+    def process_with_diagnostics(self, audio_content: bytes) -> Tuple[bytes, RepeatDetection]:
+        """
+        重複除去とフェード処理を行ったPCMと、繰り返し検出の診断情報を返す
+
+        Args:
+            audio_content: TTS APIの音声データ（WAVヘッダー付きでも可）
+
+        Returns:
+            (後処理済みのPCMデータ, 繰り返し検出の結果)
+        """
+        pcm = pcm_from_audio_content(audio_content)
+        total = len(pcm) // 2
+        detection = RepeatDetection(False, total, total, 1.0, 0.0)
+        try:
+            samples = np.frombuffer(pcm, dtype=np.int16, count=total)
+            if len(samples) == 0:
+                return bytes(pcm), detection
+
+            # 先頭の無音分を含めたバッファを確保し、int16→float32の変換は1回だけ行う
+            silence = self.silence_samples
+            buffer = np.zeros(silence + len(samples), dtype=np.float32)
+            body = buffer[silence:]
+            body[:] = samples
+
+            # 繰り返しを検出して1周期分だけ残す（ビューを切り詰めるだけでコピーしない）
+            body, detection = self.repeat_detector.trim(body)
+            buffer = buffer[:silence + len(body)]
+            if detection.detected:
+                logger.info(
+                    f"[AudioPostProcessor] 音声の繰り返し（{detection.repeat_count:.2f}回）を検出しました"
+                    f"（相関係数: {detection.correlation:.3f}, 元の長さ: {total / self.sample_rate:.2f}秒 → "
+                    f"削除後: {detection.period_samples / self.sample_rate:.2f}秒）"
+                )
+
+            # DCオフセット（直流成分）を除去
+            body -= body.mean(dtype=np.float64)
+
+            # フェードイン（無音部分の後から）とフェードアウトを適用
+            fade = self.fade_samples
+            if fade > 0 and len(buffer) > fade * 2:
+                body[:fade] *= self.fade_in
+                buffer[-fade:] *= self.fade_out
+
+            # ハイパスフィルタでDC成分と低周波ノイズを除去（float32のまま処理）
+            filtered = signal.sosfiltfilt(self.sos, buffer)
+
+            # クリッピングを防ぐために正規化
+            peak = max(float(filtered.max()), -float(filtered.min()))
+            if peak > 0:
+                filtered *= np.float32(32767 * self.peak_level / peak)
+
+            return filtered.astype(np.int16).tobytes(), detection
+
+        except Exception as e:
+            logger.error(f"[AudioPostProcessor] 後処理中にエラーが発生しました: {e}")
+            return bytes(pcm), detection
@@ -0,0 +1,158 @@
+"""
+ワーカーごとの受け付け制限（admission）のベンチマーク
+朝の混雑を想定して、1つのワーカーにTTSのリクエストと /ws のセッションが一度に集中した場合の
+応答時間を、上限なし（従来）と上限ありで比較する
+
+実行方法:
+    python benchmarks/bench_admission.py [--requests 40] [--tts-limit 8] [--sessions 30] [--session-limit 10]
+
+- TTS: AsyncTTSService（スレッドプール4）と合成に --tts-delay 秒かかる偽TTSを、
+  limit_concurrency を付けたaiohttpのハンドラーで呼ぶ。断られたリクエストの応答時間も計測する
+- /ws: main.handle_client を websockets で起動し、上流への接続の代わりに --session-seconds 秒待つ。
+  上限を超えたセッションが 1013 で閉じられるまでの時間を計測する
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import logging
+
+import websockets
+from aiohttp import web, ClientSession
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import main
+import admission
+from async_tts import AsyncTTSService
+from admission import AdmissionLimiter, limit_concurrency, get_load
+
+
+class SlowFakeTTSService:
+    """Chirp3呼び出しの代わりにスレッドをブロックする偽TTSサービス"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def cache_key(self, text, voice_name='Kore', language_code='ja-JP', audio_format='wav', sample_rate=24000):
+        return f"{voice_name}:{language_code}:{audio_format}:{sample_rate}:{text}"
+
+    def get_cached_speech(self, text, voice_name='Kore', language_code='ja-JP', audio_format='wav', sample_rate=24000):
+        return None
+
+    def synthesize_speech(self, text, voice_name='Kore', language_code='ja-JP', audio_format='wav', sample_rate=24000):
+        time.sleep(self.delay)
+        return b'\0' * 4800
+
+
+def percentile(values, p) -> str:
+    if not values:
+        return '-'
+    return f"{sorted(values)[min(len(values) - 1, int(len(values) * p))]:.0f}"
+
+
+async def bench_tts(requests: int, limit: int, delay: float):
+    """同時に requests 件のTTSを送り、(受け付けた応答時間, 断った応答時間, Retry-After) を返す"""
+    tts = AsyncTTSService(SlowFakeTTSService(delay), max_concurrency=4)
+    limiter = AdmissionLimiter('tts_requests', limit)
+
+    @limit_concurrency(limiter)
+    async def synthesize(request):
+        data = await request.json()
+        return web.Response(body=await tts.synthesize_speech(data['text']))
+
+    app = web.Application()
+    app.router.add_post('/api/tts/synthesize', synthesize)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/api/tts/synthesize"
+
+    admitted, rejected, retry_after = [], [], None
+    async with ClientSession() as session:
+        async def one(i):
+            nonlocal retry_after
+            started = time.perf_counter()
+            async with session.post(url, json={'text': f'案内文{i}'}) as response:
+                await response.read()
+                elapsed = (time.perf_counter() - started) * 1000
+                if response.status == 503:
+                    rejected.append(elapsed)
+                    retry_after = response.headers.get('Retry-After')
+                else:
+                    admitted.append(elapsed)
+        await asyncio.gather(*(one(i) for i in range(requests)))
+    await runner.cleanup()
+    return admitted, rejected, retry_after
+
+
+async def bench_sessions(sessions: int, limit: int, hold: float):
+    """同時に sessions 件の /ws を開き、(受け付けた数, 断られるまでの時間, クローズコード, 同時セッション数の最大) を返す"""
+    admission.ws_sessions.limit = limit
+
+    async def fake_create_proxy(client_websocket, bearer_token):
+        await asyncio.sleep(hold)
+
+    async def fake_token():
+        return 'token'
+
+    main.create_proxy = fake_create_proxy
+    main.proxy.get_access_token_async = fake_token
+
+    rejected, codes, peak = [], set(), 0
+    async with websockets.serve(main.handle_client, '127.0.0.1', 0) as server:
+        url = f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+
+        async def one():
+            nonlocal peak
+            started = time.perf_counter()
+            async with websockets.connect(url) as websocket:
+                peak = max(peak, admission.ws_sessions.active)
+                try:
+                    await websocket.recv()
+                except websockets.exceptions.ConnectionClosed as e:
+                    if e.rcvd and e.rcvd.code == admission.BUSY_CLOSE_CODE:
+                        rejected.append((time.perf_counter() - started) * 1000)
+                        codes.add(e.rcvd.code)
+        await asyncio.gather(*(one() for _ in range(sessions)))
+    return sessions - len(rejected), rejected, codes, peak
+
+
+async def main_async(args):
+    print(f"TTS: {args.requests} concurrent requests, {args.tts_delay * 1000:.0f} ms per synthesis, pool of 4")
+    print(f"{'limit':<10} {'admitted':>8} {'p50 ms':>8} {'p95 ms':>8} {'rejected':>8} {'reject p95 ms':>14} {'Retry-After':>12}")
+    for limit in (0, args.tts_limit):
+        admitted, rejected, retry_after = await bench_tts(args.requests, limit, args.tts_delay)
+        print(
+            f"{limit or 'none':<10} {len(admitted):>8} {percentile(admitted, 0.5):>8} {percentile(admitted, 0.95):>8} "
+            f"{len(rejected):>8} {percentile(rejected, 0.95):>14} {retry_after or '-':>12}"
+        )
+
+    print(f"\n/ws: {args.sessions} concurrent sessions held for {args.session_seconds:.1f} s")
+    print(f"{'limit':<10} {'admitted':>8} {'peak':>6} {'rejected':>8} {'close p95 ms':>13} {'codes':>8}")
+    for limit in (0, args.session_limit):
+        accepted, rejected, codes, peak = await bench_sessions(args.sessions, limit, args.session_seconds)
+        print(
+            f"{limit or 'none':<10} {accepted:>8} {peak:>6} {len(rejected):>8} "
+            f"{percentile(rejected, 0.95):>13} {','.join(map(str, sorted(codes))) or '-':>8}"
+        )
+    print(f"\n/api/health load: {get_load()}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=40)
+    parser.add_argument('--tts-limit', type=int, default=8)
+    parser.add_argument('--tts-delay', type=float, default=0.3)
+    parser.add_argument('--sessions', type=int, default=30)
+    parser.add_argument('--session-limit', type=int, default=10)
+    parser.add_argument('--session-seconds', type=float, default=1.0)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    asyncio.run(main_async(args))
+
+
+if __name__ == '__main__':
+    main_cli()
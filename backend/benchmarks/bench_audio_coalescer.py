@@ -0,0 +1,93 @@
+"""
+入力音声のまとめ送り（AudioCoalescer）のベンチマーク
+ブラウザから短いチャンク（既定20ms）の realtime_input が実時間で届く状況を再現し、
+窓の長さごとに上流へ送るメッセージ数・バイト数と、まとめ送りで増える遅延を比較する
+
+実行方法:
+    python benchmarks/bench_audio_coalescer.py [--seconds 10] [--chunk-ms 20]
+"""
+import os
+import sys
+import json
+import time
+import base64
+import asyncio
+import argparse
+import statistics
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from audio_coalescer import AudioCoalescer, INPUT_SAMPLE_RATE
+
+
+def build_frames(seconds: float, chunk_ms: float):
+    """ブラウザと同じ形の入力音声フレーム"""
+    rng = np.random.default_rng(0)
+    samples = int(INPUT_SAMPLE_RATE * chunk_ms / 1000)
+    frames = []
+    for _ in range(int(seconds * 1000 / chunk_ms)):
+        pcm = (rng.standard_normal(samples) * 3000).astype(np.int16)
+        frames.append(json.dumps({
+            'realtime_input': {'media_chunks': [{'mime_type': 'audio/pcm', 'data': base64.b64encode(pcm.tobytes()).decode('ascii')}]}
+        }))
+    return frames
+
+
+async def run(frames, chunk_ms: float, window_ms: float):
+    sent = []
+    arrivals = []
+    first_pending = 0
+
+    async def emit(message, is_audio):
+        # 送るフレームに含まれる最初のチャンクが届いてからの遅延
+        nonlocal first_pending
+        sent.append((len(message), time.perf_counter() - arrivals[first_pending]))
+        first_pending = len(arrivals)
+        return True
+
+    coalescer = AudioCoalescer(emit, window_ms) if window_ms > 0 else None
+    cpu_start = time.process_time()
+    for frame in frames:
+        arrivals.append(time.perf_counter())
+        if coalescer:
+            await coalescer.push(frame, True)
+        else:
+            await emit(frame, True)
+        await asyncio.sleep(chunk_ms / 1000)
+    if coalescer:
+        await coalescer.flush()
+    cpu = time.process_time() - cpu_start
+    delays = [delay * 1000 for _, delay in sent]
+    return {
+        'messages': len(sent),
+        'bytes': sum(size for size, _ in sent),
+        'delay_mean': statistics.mean(delays),
+        'delay_max': max(delays),
+        'cpu_ms': cpu * 1000,
+    }
+
+
+async def main_async(args):
+    frames = build_frames(args.seconds, args.chunk_ms)
+    print(f"{len(frames)} input frames of {args.chunk_ms:.0f} ms ({args.seconds:.0f} s of audio)")
+    print(f"{'window ms':>10} {'messages':>9} {'msg/s':>7} {'KB':>8} {'delay mean':>11} {'delay max':>10} {'CPU ms':>8}")
+    for window_ms in args.windows:
+        r = await run(frames, args.chunk_ms, window_ms)
+        print(
+            f"{window_ms:>10.0f} {r['messages']:>9} {r['messages'] / args.seconds:>7.1f} {r['bytes'] / 1024:>8.0f} "
+            f"{r['delay_mean']:>11.1f} {r['delay_max']:>10.1f} {r['cpu_ms']:>8.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--chunk-ms', type=float, default=20)
+    parser.add_argument('--windows', type=float, nargs='+', default=[0, 40, 60, 100])
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
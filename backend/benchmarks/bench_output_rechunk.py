@@ -0,0 +1,71 @@
+"""
+モデルの音声の固定長フレームへの分け直し（FramedAudioOutput）のベンチマーク
+Geminiと同じく長さがまちまちな音声チャンクを、そのまま送る場合と20msのフレームに分け直す場合で、
+クライアントに届くフレームの長さのばらつき（平均・標準偏差・最大）と、プロキシでの処理時間を比較する
+
+実行方法:
+    python benchmarks/bench_output_rechunk.py [--seconds 60] [--frame-ms 20]
+"""
+import os
+import sys
+import json
+import time
+import base64
+import argparse
+import statistics
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from pcm_protocol import server_to_client_frames
+from pcm_rechunker import FramedAudioOutput, OUTPUT_SAMPLE_RATE
+
+def gemini_frames(seconds: float, seed: int = 0):
+    """長さがまちまちな音声チャンク（20ms〜500ms）と、ときどきの turnComplete"""
+    rng = np.random.default_rng(seed)
+    frames = []
+    total = 0.0
+    while total < seconds:
+        duration = float(rng.choice([0.02, 0.04, 0.1, 0.2, 0.5], p=[0.1, 0.2, 0.4, 0.2, 0.1]))
+        pcm = rng.integers(-3000, 3000, int(duration * OUTPUT_SAMPLE_RATE), dtype=np.int16).tobytes()
+        frames.append(json.dumps({'serverContent': {'modelTurn': {'parts': [
+            {'inlineData': {'mimeType': 'audio/pcm;rate=24000', 'data': base64.b64encode(pcm).decode('ascii')}}
+        ]}}}).encode())
+        total += duration
+        if rng.random() < 0.05:
+            frames.append(b'{"serverContent": {"turnComplete": true}}')
+    return frames
+
+
+def run(frames, transform):
+    started = time.perf_counter()
+    out = [frame for message in frames for frame in transform(message)]
+    elapsed = time.perf_counter() - started
+    audio = [len(frame) // 2 for frame in out if isinstance(frame, bytes)]
+    return audio, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seconds', type=float, default=60)
+    parser.add_argument('--frame-ms', type=float, default=20)
+    args = parser.parse_args()
+
+    frames = gemini_frames(args.seconds)
+    print(f"{len(frames)} upstream frames, {args.seconds:.0f} s of 24 kHz audio")
+    print(f"{'mode':<10} {'frames':>7} {'mean ms':>8} {'stdev ms':>9} {'max ms':>7} {'proxy us/frame':>15}")
+    for mode, transform in (
+        ('as-is', server_to_client_frames),
+        (f'{args.frame_ms:.0f} ms', FramedAudioOutput(args.frame_ms).process),
+    ):
+        audio, elapsed = run(frames, transform)
+        durations = [samples / OUTPUT_SAMPLE_RATE * 1000 for samples in audio]
+        print(
+            f"{mode:<10} {len(audio):>7} {statistics.mean(durations):>8.1f} {statistics.pstdev(durations):>9.1f} "
+            f"{max(durations):>7.1f} {elapsed / len(frames) * 1e6:>15.1f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
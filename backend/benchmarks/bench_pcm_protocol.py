@@ -0,0 +1,89 @@
+"""
+/ws のプロトコルごとの転送量のベンチマーク
+従来のJSON（base64のPCMを realtime_input / serverContent で包む）と、
+バイナリPCMのサブプロトコル（jre-pcm16.v1）で、クライアントとプロキシの間の
+バイト数・フレーム数と、プロキシでの変換にかかるCPU時間を比較する
+
+実行方法:
+    python benchmarks/bench_pcm_protocol.py [--seconds 60] [--uplink-chunk-ms 100]
+"""
+import os
+import sys
+import json
+import time
+import base64
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from pcm_protocol import client_to_server_frames, server_to_client_frames
+
+UPLINK_RATE = 16000
+DOWNLINK_RATE = 24000
+DOWNLINK_CHUNK_MS = 100
+
+
+def pcm(seconds: float, sample_rate: int, seed: int) -> bytes:
+    rng = np.random.default_rng(seed)
+    return (rng.standard_normal(int(seconds * sample_rate)) * 3000).astype(np.int16).tobytes()
+
+
+def uplink_json_frame(chunk: bytes) -> str:
+    """ブラウザ（gemini-api.ts の sendAudio）と同じ形のフレーム"""
+    return json.dumps({
+        'realtime_input': {'media_chunks': [{'mime_type': 'audio/pcm', 'data': base64.b64encode(chunk).decode('ascii')}]}
+    })
+
+
+def downlink_gemini_frame(chunk: bytes) -> bytes:
+    """Geminiが返す音声フレーム"""
+    return json.dumps({
+        'serverContent': {'modelTurn': {'parts': [
+            {'inlineData': {'mimeType': f'audio/pcm;rate={DOWNLINK_RATE}', 'data': base64.b64encode(chunk).decode('ascii')}}
+        ]}}
+    }).encode()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seconds', type=float, default=60)
+    parser.add_argument('--uplink-chunk-ms', type=float, default=100)
+    args = parser.parse_args()
+
+    uplink_chunks = [pcm(args.uplink_chunk_ms / 1000, UPLINK_RATE, i) for i in range(int(args.seconds * 1000 / args.uplink_chunk_ms))]
+    downlink_chunks = [pcm(DOWNLINK_CHUNK_MS / 1000, DOWNLINK_RATE, i) for i in range(int(args.seconds * 1000 / DOWNLINK_CHUNK_MS))]
+    gemini_frames = [downlink_gemini_frame(chunk) for chunk in downlink_chunks]
+
+    # クライアント → プロキシ
+    json_up = [uplink_json_frame(chunk) for chunk in uplink_chunks]
+    started = time.process_time()
+    for chunk in uplink_chunks:
+        client_to_server_frames(chunk)
+    wrap_cpu = time.process_time() - started
+
+    # プロキシ → クライアント（JSONはテキストにするだけ、jre-pcm16.v1 は音声をデコードする）
+    started = time.process_time()
+    binary_down = [frame for message in gemini_frames for frame in server_to_client_frames(message)]
+    unwrap_cpu = time.process_time() - started
+
+    rows = (
+        ('uplink', 'json', len(json_up), sum(len(f) for f in json_up)),
+        ('uplink', 'pcm16', len(uplink_chunks), sum(len(c) for c in uplink_chunks)),
+        ('downlink', 'json', len(gemini_frames), sum(len(f) for f in gemini_frames)),
+        ('downlink', 'pcm16', len(binary_down), sum(len(f) for f in binary_down)),
+    )
+    print(f"{args.seconds:.0f} s of audio each way (uplink {UPLINK_RATE} Hz in {args.uplink_chunk_ms:.0f} ms chunks, "
+          f"downlink {DOWNLINK_RATE} Hz in {DOWNLINK_CHUNK_MS} ms chunks)")
+    print(f"{'direction':<10} {'protocol':<9} {'frames':>7} {'KB':>9} {'vs json':>8}")
+    baseline = {}
+    for direction, protocol, frames, size in rows:
+        baseline.setdefault(direction, size)
+        print(f"{direction:<10} {protocol:<9} {frames:>7} {size / 1024:>9.1f} {size / baseline[direction]:>7.0%}")
+    print(f"proxy CPU for jre-pcm16.v1: wrap {wrap_cpu / len(uplink_chunks) * 1e6:.1f} us/frame, "
+          f"unwrap {unwrap_cpu / len(gemini_frames) * 1e6:.1f} us/frame")
+
+
+if __name__ == '__main__':
+    main()
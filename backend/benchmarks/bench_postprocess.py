@@ -0,0 +1,131 @@
+"""
+TTS音声後処理のマイクロベンチマーク
+従来の _remove_duplicate_audio + _apply_fade_in_out（参照実装として下に複製）と
+AudioPostProcessor.process の、音声1秒あたりの処理時間を比較する
+
+実行方法:
+    python benchmarks/bench_postprocess.py [--repeat 20]
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+from scipy import signal
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from audio_postprocess import AudioPostProcessor
+from synthetic_audio import speech_like, wav_bytes
+
+SAMPLE_RATE = 24000
+
+
+# =====================================
+# 従来の実装（google_cloud_tts.py から複製）
+# =====================================
+
+def legacy_remove_duplicate_audio(pcm_data: bytes, sample_rate: int = SAMPLE_RATE) -> bytes:
+    audio_array = np.frombuffer(pcm_data, dtype=np.int16)
+    total_samples = len(audio_array)
+    if total_samples == 0:
+        return pcm_data
+    min_chunk_samples = int(sample_rate * 0.5)
+
+    def normalize_audio(audio):
+        if np.std(audio) > 0:
+            return (audio - np.mean(audio)) / np.std(audio)
+        return audio
+
+    third_length = total_samples // 3
+    if third_length > min_chunk_samples and total_samples % 3 < sample_rate * 0.1:
+        part1 = audio_array[:third_length]
+        part2 = audio_array[third_length:2 * third_length]
+        part3 = audio_array[2 * third_length:3 * third_length]
+        part1_norm = normalize_audio(part1.astype(np.float32))
+        part2_norm = normalize_audio(part2.astype(np.float32))
+        part3_norm = normalize_audio(part3.astype(np.float32))
+        corr_12 = np.corrcoef(part1_norm, part2_norm)[0, 1]
+        corr_23 = np.corrcoef(part2_norm, part3_norm)[0, 1]
+        corr_13 = np.corrcoef(part1_norm, part3_norm)[0, 1]
+        if corr_12 > 0.95 and corr_23 > 0.95 and corr_13 > 0.95:
+            return part1.tobytes()
+
+    half_length = total_samples // 2
+    if half_length > min_chunk_samples and total_samples % 2 < sample_rate * 0.1:
+        part1 = audio_array[:half_length]
+        part2 = audio_array[half_length:2 * half_length]
+        part1_norm = normalize_audio(part1.astype(np.float32))
+        part2_norm = normalize_audio(part2.astype(np.float32))
+        corr = np.corrcoef(part1_norm, part2_norm)[0, 1]
+        if corr > 0.95:
+            return part1.tobytes()
+    return pcm_data
+
+
+def legacy_apply_fade_in_out(pcm_data: bytes, fade_duration: float = 0.05,
+                             sample_rate: int = SAMPLE_RATE) -> bytes:
+    audio_array = np.frombuffer(pcm_data, dtype=np.int16).astype(np.float32)
+    audio_array = audio_array - np.mean(audio_array)
+    silence_samples = int(0.01 * sample_rate)
+    silence = np.zeros(silence_samples, dtype=np.float32)
+    audio_array = np.concatenate([silence, audio_array])
+    fade_samples = int(fade_duration * sample_rate)
+    if fade_samples > 0 and len(audio_array) > fade_samples * 2:
+        t = np.linspace(0, 1, fade_samples)
+        fade_in_curve = t * t * (3.0 - 2.0 * t)
+        fade_out_curve = 1.0 - (1.0 - t) * (1.0 - t) * (3.0 - 2.0 * (1.0 - t))
+        audio_array[silence_samples:silence_samples + fade_samples] *= fade_in_curve
+        audio_array[-fade_samples:] *= fade_out_curve
+    nyquist = sample_rate / 2
+    b, a = signal.butter(2, 20 / nyquist, btype='high')
+    audio_array = signal.filtfilt(b, a, audio_array)
+    max_val = np.max(np.abs(audio_array))
+    if max_val > 0:
+        audio_array = audio_array * (32767 * 0.95 / max_val)
+    return audio_array.astype(np.int16).tobytes()
+
+
+def legacy_process(audio_content: bytes) -> bytes:
+    return legacy_apply_fade_in_out(legacy_remove_duplicate_audio(audio_content))
+
+
+# =====================================
+# 計測
+# =====================================
+
+def time_per_audio_second(func, payload: bytes, duration: float, repeat: int) -> float:
+    """音声1秒あたりの処理時間（ミリ秒）の中央値"""
+    func(payload)  # ウォームアップ
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(payload)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings)) * 1000 / duration
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    processor = AudioPostProcessor(sample_rate=SAMPLE_RATE)
+
+    print(f"{'duration':>8} | {'legacy ms/s':>11} | {'engine ms/s':>11} | {'speedup':>7} | {'output corr':>11}")
+    print('-' * 62)
+    for duration in (1.0, 3.0, 10.0, 30.0):
+        samples = speech_like(duration, SAMPLE_RATE)
+        # 従来の実装はPCMを、エンジンはTTS APIと同じWAVヘッダー付きデータを受け取る
+        legacy = time_per_audio_second(legacy_process, samples.tobytes(), duration, args.repeat)
+        engine = time_per_audio_second(processor.process, wav_bytes(samples), duration, args.repeat)
+        # 出力が従来と同等であることの確認（相関係数）
+        legacy_out = np.frombuffer(legacy_process(samples.tobytes()), dtype=np.int16)
+        engine_out = np.frombuffer(processor.process(wav_bytes(samples)), dtype=np.int16)
+        corr = np.corrcoef(legacy_out, engine_out)[0, 1]
+        print(f"{duration:7.1f}s | {legacy:11.3f} | {engine:11.3f} | {legacy / engine:6.2f}x | {corr:11.5f}")
+
+
+if __name__ == '__main__':
+    main()
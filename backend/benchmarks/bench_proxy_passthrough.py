@@ -0,0 +1,167 @@
+"""
+Geminiプロキシの転送方式のベンチマーク
+従来の json.loads → json.dumps による転送（PROXY_MODE=json）と、
+デコードしない passthrough 転送（送信キューなし / あり）のフレーム/秒とCPU時間を比較する
+
+実行方法:
+    python benchmarks/bench_proxy_passthrough.py [--sessions 20]
+
+WebSocketの送受信自体の負荷を除くため、メモリ上の疑似ソケットで転送処理だけを計測する。
+1セッションは3分間の会話を想定する:
+    クライアント → サーバー: 16kHz PCMを1秒ごとに送る realtime_input（180フレーム）
+    サーバー → クライアント: 24kHz PCMを100msごとに返す serverContent（60秒分 = 600フレーム）
+                             と setupComplete / turnComplete / toolCall の制御メッセージ
+"""
+import os
+import sys
+import time
+import json
+import base64
+import asyncio
+import argparse
+import logging
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import main
+from main import proxy_task, passthrough_task, log_control_frame
+from relay_queue import RelayQueue, is_audio_input
+
+SESSION_SECONDS = 180
+MODEL_SPEECH_SECONDS = 60
+SERVER_CHUNK_SECONDS = 0.1
+TURNS = 12
+
+
+def pcm_base64(seconds: float, sample_rate: int, seed: int) -> str:
+    rng = np.random.default_rng(seed)
+    pcm = (rng.standard_normal(int(seconds * sample_rate)) * 3000).astype(np.int16)
+    return base64.b64encode(pcm.tobytes()).decode('ascii')
+
+
+def build_client_frames():
+    """クライアント → サーバーのフレーム（ブラウザと同じくテキスト）"""
+    frames = [json.dumps({'setup': {'model': 'projects/p/locations/us-central1/publishers/google/models/gemini'}})]
+    for i in range(SESSION_SECONDS):
+        frames.append(json.dumps({
+            'realtime_input': {'media_chunks': [{'mime_type': 'audio/pcm', 'data': pcm_base64(1.0, 16000, i)}]}
+        }))
+    return frames
+
+
+def build_server_frames():
+    """サーバー → クライアントのフレーム（Geminiはバイナリフレームで返す）"""
+    frames = [json.dumps({'setupComplete': {}}).encode()]
+    chunks = int(MODEL_SPEECH_SECONDS / SERVER_CHUNK_SECONDS)
+    per_turn = chunks // TURNS
+    for i in range(chunks):
+        frames.append(json.dumps({
+            'serverContent': {'modelTurn': {'parts': [
+                {'inlineData': {'mimeType': 'audio/pcm;rate=24000', 'data': pcm_base64(SERVER_CHUNK_SECONDS, 24000, i)}}
+            ]}}
+        }).encode())
+        if (i + 1) % per_turn == 0:
+            frames.append(json.dumps({'serverContent': {'turnComplete': True}}).encode())
+            frames.append(json.dumps({
+                'toolCall': {'functionCalls': [{'id': str(i), 'name': 'search_route', 'args': {'from': '上野'}}]}
+            }).encode())
+    return frames
+
+
+class MemorySource:
+    """フレームを順に返す疑似ソケット"""
+
+    def __init__(self, frames):
+        self.frames = frames
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for frame in self.frames:
+            yield frame
+
+    async def close(self, code=1000, reason=''):
+        pass
+
+
+class MemorySink:
+    """送られたフレームを数えるだけの疑似ソケット"""
+
+    def __init__(self):
+        self.frames = 0
+        self.bytes = 0
+
+    async def send(self, message):
+        self.frames += 1
+        self.bytes += len(message)
+
+    async def close(self, code=1000, reason=''):
+        pass
+
+
+async def run_session(mode: str, client_frames, server_frames):
+    up, down = MemorySink(), MemorySink()
+    if mode == 'json':
+        await asyncio.gather(
+            proxy_task(MemorySource(client_frames), up),
+            proxy_task(MemorySource(server_frames), down),
+        )
+    elif mode == 'queued':
+        await asyncio.gather(
+            passthrough_task(
+                MemorySource(client_frames), up,
+                relay_queue=RelayQueue('client_to_server', max_audio_age=2.0), audio_classifier=is_audio_input
+            ),
+            passthrough_task(
+                MemorySource(server_frames), down, as_text=True, on_control=log_control_frame,
+                relay_queue=RelayQueue('server_to_client')
+            ),
+        )
+    else:
+        await asyncio.gather(
+            passthrough_task(MemorySource(client_frames), up),
+            passthrough_task(MemorySource(server_frames), down, as_text=True, on_control=log_control_frame),
+        )
+    return up.frames + down.frames
+
+
+def bench(mode: str, sessions: int, client_frames, server_frames):
+    frames = 0
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    for _ in range(sessions):
+        frames += asyncio.run(run_session(mode, client_frames, server_frames))
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    return {
+        'frames_per_second': frames / wall,
+        'cpu_ms_per_session': cpu / sessions * 1000,
+        'cpu_us_per_frame': cpu / frames * 1e6,
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sessions', type=int, default=20)
+    args = parser.parse_args()
+
+    # 制御メッセージのログは計測から外す
+    logging.getLogger(main.__name__).setLevel(logging.WARNING)
+
+    client_frames = build_client_frames()
+    server_frames = build_server_frames()
+    total_bytes = sum(len(f) for f in client_frames) + sum(len(f) for f in server_frames)
+    print(f"1 session: {len(client_frames) + len(server_frames)} frames, {total_bytes / 1e6:.1f} MB")
+
+    results = {mode: bench(mode, args.sessions, client_frames, server_frames) for mode in ('json', 'passthrough', 'queued')}
+    print(f"{'mode':<12} {'frames/s':>12} {'CPU ms/session':>16} {'CPU us/frame':>14}")
+    for mode, r in results.items():
+        print(f"{mode:<12} {r['frames_per_second']:>12.0f} {r['cpu_ms_per_session']:>16.1f} {r['cpu_us_per_frame']:>14.1f}")
+    speedup = results['json']['cpu_ms_per_session'] / results['passthrough']['cpu_ms_per_session']
+    print(f"passthrough uses {speedup:.1f}x less CPU per session")
+
+
+if __name__ == '__main__':
+    main_cli()
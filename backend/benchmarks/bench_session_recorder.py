@@ -0,0 +1,145 @@
+"""
+プロキシでの会話音声の録音（SessionRecorder）のベンチマーク
+キオスクのマイク入力（100msごとの realtime_input）と、実時間の4倍の速さで届くモデルの音声
+（割り込みあり）を疑似時計で再現し、1フレームあたりの処理時間、メモリ上の窓の大きさ、
+WAVの長さと、左右のチャンネルで音声の位置がずれていないかを確認する。
+録音用のスレッドに渡す場合（submit）のイベントループ側の時間と、同じWAVになることも確認する
+
+実行方法:
+    python benchmarks/bench_session_recorder.py [--seconds 180]
+"""
+import os
+import sys
+import json
+import time
+import wave
+import base64
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from session_recorder import SessionRecorder, RECORDING_SAMPLE_RATE, RECORDING_EXECUTOR
+
+INPUT_RATE = 16000
+CHUNK_SECONDS = 0.1
+# モデルの応答の長さ・間隔（秒）と、割り込まれる応答の頻度（3回に1回）
+TURN_SECONDS = 8.0
+TURN_INTERVAL = 20.0
+INTERRUPT_EVERY = 3
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def tone(seconds: float, rate: int, freq: float, level: float = 8000) -> bytes:
+    t = np.arange(int(seconds * rate)) / rate
+    return (np.sin(2 * np.pi * freq * t) * level).astype(np.int16).tobytes()
+
+
+def build_events(seconds: float):
+    """(時刻, 'client' | 'server', フレーム) の時刻順のリスト"""
+    events = []
+    silence = bytes(int(CHUNK_SECONDS * INPUT_RATE) * 2)
+    marker = tone(CHUNK_SECONDS, INPUT_RATE, 440)
+    for i in range(int(seconds / CHUNK_SECONDS)):
+        # 各応答の2秒前にお客様が話す（音のあるチャンク）
+        t = (i + 1) * CHUNK_SECONDS
+        speaking = (t % TURN_INTERVAL) > TURN_INTERVAL - 2 - 1e-9
+        pcm = marker if speaking else silence
+        events.append((t, 'client', json.dumps({
+            'realtime_input': {'media_chunks': [{'mime_type': 'audio/pcm', 'data': base64.b64encode(pcm).decode('ascii')}]}
+        })))
+    turns = []
+    for n, start in enumerate(np.arange(TURN_INTERVAL, seconds - TURN_SECONDS, TURN_INTERVAL)):
+        interrupted = n % INTERRUPT_EVERY == INTERRUPT_EVERY - 1
+        turns.append((float(start), interrupted))
+        chunk = tone(CHUNK_SECONDS, RECORDING_SAMPLE_RATE, 880)
+        for k in range(int(TURN_SECONDS / CHUNK_SECONDS)):
+            # 実時間の4倍の速さで届く
+            events.append((start + k * CHUNK_SECONDS / 4, 'server', json.dumps({'serverContent': {'modelTurn': {'parts': [
+                {'inlineData': {'mimeType': 'audio/pcm;rate=24000', 'data': base64.b64encode(chunk).decode('ascii')}}
+            ]}}}).encode()))
+        if interrupted:
+            events.append((start + TURN_SECONDS / 2, 'server', b'{"serverContent": {"interrupted": true}}'))
+    events.sort(key=lambda event: event[0])
+    return events, turns
+
+
+def active_spans(channel: np.ndarray, rate: int):
+    """音のある区間（秒）のリスト"""
+    active = np.abs(channel.astype(np.int32)).reshape(-1, rate // 100).max(axis=1) > 1000
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], active.astype(np.int8), [0]))))
+    return [(start / 100, end / 100) for start, end in zip(edges[::2], edges[1::2])]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seconds', type=float, default=180)
+    args = parser.parse_args()
+
+    events, turns = build_events(args.seconds)
+    clock = FakeClock()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'session.wav')
+        recorder = SessionRecorder(path, clock=clock)
+        elapsed = 0.0
+        for t, direction, frame in events:
+            clock.now = t
+            started = time.perf_counter()
+            if direction == 'client':
+                recorder.record_client_frame(frame)
+            else:
+                recorder.record_server_frame(frame)
+            elapsed += time.perf_counter() - started
+        clock.now = args.seconds
+        recorder.close()
+        stats = recorder.get_stats()
+
+        with wave.open(path, 'rb') as wav:
+            channels, rate, frames = wav.getnchannels(), wav.getframerate(), wav.getnframes()
+            audio = np.frombuffer(wav.readframes(frames), dtype='<i2').reshape(-1, channels)
+        size = os.path.getsize(path)
+
+        # 録音用のスレッドに渡す場合（main.py と同じ）
+        threaded_path = os.path.join(tmp, 'threaded.wav')
+        clock.now = 0.0
+        threaded = SessionRecorder(threaded_path, clock=clock)
+        loop_elapsed = 0.0
+        for t, direction, frame in events:
+            clock.now = t
+            started = time.perf_counter()
+            threaded.submit(threaded.record_client_frame if direction == 'client' else threaded.record_server_frame, frame)
+            loop_elapsed += time.perf_counter() - started
+        clock.now = args.seconds
+        RECORDING_EXECUTOR.submit(threaded.close).result()
+        with open(path, 'rb') as a, open(threaded_path, 'rb') as b:
+            identical = a.read() == b.read()
+
+    print(f"{len(events)} frames over {args.seconds:.0f} s, {CHUNK_SECONDS * 1000:.0f} ms chunks, model audio at 4x real time")
+    print(f"CPU: {elapsed / len(events) * 1e6:.1f} us per frame")
+    print(f"event loop with submit: {loop_elapsed / len(events) * 1e6:.1f} us per frame "
+          f"(WAV identical to inline: {identical})")
+    print(f"in-memory window: {stats['window_bytes'] / 1024:.0f} KB (fixed), "
+          f"WAV: {channels} ch {rate} Hz {frames / rate:.1f} s, {size / 1024 / 1024:.1f} MB")
+    print(f"stats: {stats}")
+
+    customer = active_spans(audio[:, 0], rate)
+    agent = active_spans(audio[:, 1], rate)
+    print("customer speech (expected 2 s before each reply):")
+    print("  " + ", ".join(f"{a:.1f}-{b:.1f}" for a, b in customer[:5]) + (" ..." if len(customer) > 5 else ""))
+    print("agent replies (expected start / end):")
+    for (start, interrupted), (a, b) in zip(turns, agent):
+        expected_end = start + (TURN_SECONDS / 2 if interrupted else TURN_SECONDS)
+        print(f"  {start:6.1f}-{expected_end:6.1f} -> {a:6.1f}-{b:6.1f}{' (interrupted)' if interrupted else ''}")
+
+
+if __name__ == '__main__':
+    main()
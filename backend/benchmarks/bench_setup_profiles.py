@@ -0,0 +1,53 @@
+"""
+setupプロファイルのベンチマーク
+クライアントが完全なsetup（長いシステムプロンプトを含む）を送る場合と、
+setupProfile（ID・変数のみ）を送ってプロキシがキャッシュ済みのsetupに置き換える場合で、
+接続時にクライアントが送るバイト数と、プロキシでの処理時間を比較する
+
+実行方法:
+    python benchmarks/bench_setup_profiles.py [--iterations 2000]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from setup_profiles import SetupProfileRegistry
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    registry = SetupProfileRegistry('project', 'us-central1', reload_interval=3600)
+    default_request = json.dumps({'setupProfile': {'id': 'ticket-flow', 'version': 1}})
+    station_request = json.dumps(
+        {'setupProfile': {'id': 'ticket-flow', 'version': 1, 'variables': {'departure_station': '上野'}}},
+        ensure_ascii=False
+    )
+    # クライアントが送っていた完全なsetup（ブラウザの JSON.stringify と同じくASCII以外はそのまま）
+    full_setup = json.dumps(json.loads(registry.resolve(station_request)), ensure_ascii=False)
+
+    def per_call_us(func):
+        started = time.perf_counter()
+        for _ in range(args.iterations):
+            func()
+        return (time.perf_counter() - started) / args.iterations * 1e6
+
+    rows = (
+        ('full setup (json mode: loads + dumps)', full_setup, per_call_us(lambda: json.dumps(json.loads(full_setup)))),
+        ('setupProfile (default variables)', default_request, per_call_us(lambda: registry.resolve(default_request))),
+        ('setupProfile (departure_station)', station_request, per_call_us(lambda: registry.resolve(station_request))),
+    )
+    print(f"{'client message':<40} {'bytes':>7} {'proxy us':>9}")
+    for name, message, us in rows:
+        print(f"{name:<40} {len(message.encode('utf-8')):>7} {us:>9.1f}")
+    print(f"registry: {registry.get_stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""
+プロキシでのツール呼び出しの実行（tool_registry）のベンチマーク
+Geminiの代わりのWebSocketサーバー（上流）が toolCall を送り、tool_response が返るまでの時間を、
+キオスクがブラウザで処理して返す場合（PROXY_TOOLS_ENABLED=false と同じ）と、
+プロキシがローカルのデータで処理する場合で比較する
+
+実行方法:
+    python benchmarks/bench_tool_calls.py [--calls 100] [--kiosk-rtt-ms 30] [--lookup-ms 40]
+
+localhost上の実際のWebSocketで main.create_proxy を通す。キオスクとの往復は同じホストで
+計測できないため、キオスク役は --kiosk-rtt-ms（ネットワークの往復）と --lookup-ms
+（ブラウザでの Cosmos DB への問い合わせ）だけ待ってから toolResponse を返す
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import logging
+import tempfile
+import statistics
+
+import websockets
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import main
+from tool_registry import create_default_registry
+
+DESTINATIONS = ['上野', '東京', '品川', '日立', 'いわき', '土浦', '取手', '柏', '我孫子', '松戸']
+CALLS = [
+    ('normalize_station', {'name': 'うえの'}),
+    ('normalize_station', {'name': 'しんじく'}),
+    ('search_routes', {'origin': '水戸', 'destination': '上野駅', 'min_departure': '09:30'}),
+    ('search_routes', {'origin': '水戸', 'destination': 'ひたち'}),
+]
+
+
+def write_routes(path: str) -> None:
+    """水戸から各駅への経路（1時間に2本、5時〜23時）を routes コンテナと同じ形で書き出す"""
+    routes = []
+    for destination in DESTINATIONS:
+        for hour in range(5, 23):
+            for minute in (10, 40):
+                departure = hour * 3600 + minute * 60
+                duration = 3600 + len(routes) % 7 * 300
+                arrival = departure + duration
+                routes.append({
+                    'id': f'{destination}-{hour}-{minute}',
+                    'origin': {'code': '0001', 'name': '水戸'},
+                    'destination': {'code': '0002', 'name': destination},
+                    'departureTime': f'{hour:02d}:{minute:02d}:00',
+                    'arrivalTime': f'{arrival // 3600:02d}:{arrival % 3600 // 60:02d}:00',
+                    'duration': duration,
+                    'transfers': 0,
+                    'hasExpress': minute == 10,
+                    'legs': [{
+                        'senkuName': '常磐線', 'isExpress': minute == 10,
+                        'from': {'name': '水戸'}, 'to': {'name': destination},
+                    }],
+                })
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(routes, f, ensure_ascii=False)
+
+
+async def run(calls: int, kiosk_delay: float):
+    """上流 → プロキシ → キオスクを接続し、toolCall ごとの応答時間（ミリ秒）を返す"""
+    latencies = []
+    done = asyncio.Event()
+
+    async def upstream(websocket):
+        await websocket.recv()  # setup
+        await websocket.send(json.dumps({'setupComplete': {}}).encode())
+        for i in range(calls):
+            name, args = CALLS[i % len(CALLS)]
+            started = time.perf_counter()
+            await websocket.send(json.dumps(
+                {'toolCall': {'functionCalls': [{'id': str(i), 'name': name, 'args': args}]}}, ensure_ascii=False
+            ).encode())
+            while True:
+                reply = json.loads(await websocket.recv())
+                if 'tool_response' in reply or 'toolResponse' in reply:
+                    break
+            latencies.append((time.perf_counter() - started) * 1000)
+        done.set()
+        await websocket.wait_closed()
+
+    async def handle_client(websocket):
+        await main.create_proxy(websocket, 'token')
+
+    async def kiosk(url: str):
+        async with websockets.connect(url) as websocket:
+            await websocket.send(json.dumps({'setup': {'model': 'gemini'}}))
+            async for message in websocket:
+                data = json.loads(message)
+                if 'toolCall' not in data:
+                    continue
+                await asyncio.sleep(kiosk_delay)
+                await websocket.send(json.dumps({'toolResponse': {'functionResponses': [
+                    {'id': call['id'], 'name': call['name'], 'response': {}}
+                    for call in data['toolCall']['functionCalls']
+                ]}}))
+
+    async with websockets.serve(upstream, '127.0.0.1', 0) as upstream_server, \
+            websockets.serve(handle_client, '127.0.0.1', 0) as proxy_server:
+        upstream_url = f"ws://127.0.0.1:{upstream_server.sockets[0].getsockname()[1]}"
+        main.open_upstream = lambda bearer_token: websockets.connect(upstream_url)
+        kiosk_task = asyncio.create_task(kiosk(f"ws://127.0.0.1:{proxy_server.sockets[0].getsockname()[1]}"))
+        await done.wait()
+        kiosk_task.cancel()
+        await asyncio.gather(kiosk_task, return_exceptions=True)
+    return latencies
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=100)
+    parser.add_argument('--kiosk-rtt-ms', type=float, default=30)
+    parser.add_argument('--lookup-ms', type=float, default=40)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        routes_path = os.path.join(tmp, 'routes.json')
+        write_routes(routes_path)
+        registry = create_default_registry(routes_path=routes_path)
+        kiosk_delay = (args.kiosk_rtt_ms + args.lookup_ms) / 1000
+
+        print(f"{args.calls} tool calls, kiosk round trip {args.kiosk_rtt_ms:.0f} ms + lookup {args.lookup_ms:.0f} ms")
+        print(f"{'mode':<8} {'mean ms':>8} {'p50 ms':>7} {'p95 ms':>7} {'max ms':>7}")
+        for mode, tools in (('kiosk', None), ('proxy', registry)):
+            main.tool_registry = tools
+            latencies = sorted(asyncio.run(run(args.calls, kiosk_delay)))
+            print(
+                f"{mode:<8} {statistics.mean(latencies):>8.2f} {latencies[len(latencies) // 2]:>7.2f} "
+                f"{latencies[int(len(latencies) * 0.95)]:>7.2f} {latencies[-1]:>7.2f}"
+            )
+        print(f"registry: {registry.get_stats()}")
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,145 @@
+"""
+TTS合成中のWebSocket中継レイテンシ計測
+同期呼び出し（従来）とAsyncTTSService経由（スレッドプール）で、TTSリクエスト処理中に
+/ws の往復レイテンシがどう変化するかを比較する
+
+実行方法:
+    python benchmarks/bench_tts_event_loop.py [--tts-delay 0.3] [--tts-requests 8]
+
+サーバーとクライアントは同じイベントループで動くため、ループが止まっている時間は
+往復レイテンシではなく「中継の途切れ（pingの間隔 - 送信間隔）」として現れる。
+両方を計測し、AsyncTTSService経由の場合に途切れが閾値を超えたら終了コード1を返す
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+
+from aiohttp import web, ClientSession, WSMsgType
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from async_tts import AsyncTTSService
+
+
+class SlowFakeTTSService:
+    """Chirp3呼び出しの代わりにスレッドをブロックする偽TTSサービス"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def cache_key(self, text, voice_name='Kore', language_code='ja-JP', audio_format='wav', sample_rate=24000):
+        return f"{voice_name}:{language_code}:{audio_format}:{sample_rate}:{text}"
+
+    def get_cached_speech(self, text, voice_name='Kore', language_code='ja-JP', audio_format='wav', sample_rate=24000):
+        return None
+
+    def synthesize_speech(self, text, voice_name='Kore', language_code='ja-JP', audio_format='wav', sample_rate=24000):
+        time.sleep(self.delay)
+        return b'RIFF' + b'\x00' * 1024
+
+
+def build_app(mode: str, tts_delay: float) -> web.Application:
+    fake_service = SlowFakeTTSService(tts_delay)
+    async_service = AsyncTTSService(fake_service, max_concurrency=4)
+
+    async def tts_handler(request):
+        data = await request.json()
+        if mode == 'blocking':
+            audio = fake_service.synthesize_speech(data['text'])
+        else:
+            audio = await async_service.synthesize_speech(data['text'])
+        return web.Response(body=audio, content_type='audio/wav')
+
+    async def ws_handler(request):
+        # Geminiプロキシの代わりに受け取ったフレームをそのまま返す中継
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        async for msg in ws:
+            if msg.type == WSMsgType.TEXT:
+                await ws.send_str(msg.data)
+        return ws
+
+    app = web.Application()
+    app.router.add_post('/api/tts/synthesize', tts_handler)
+    app.router.add_get('/ws', ws_handler)
+    return app
+
+
+async def measure(mode: str, tts_delay: float, tts_requests: int, ping_interval: float):
+    app = build_app(mode, tts_delay)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    base = f'http://127.0.0.1:{port}'
+
+    latencies = []
+    arrivals = []
+    stop = asyncio.Event()
+
+    async with ClientSession() as session:
+        async with session.ws_connect(f'{base}/ws') as ws:
+
+            async def pinger():
+                while not stop.is_set():
+                    sent = time.perf_counter()
+                    await ws.send_str('ping')
+                    await ws.receive()
+                    received = time.perf_counter()
+                    latencies.append((received - sent) * 1000)
+                    arrivals.append(received)
+                    await asyncio.sleep(ping_interval)
+
+            async def tts_load():
+                await asyncio.sleep(0.1)
+                await asyncio.gather(*[
+                    session.post(f'{base}/api/tts/synthesize', json={'text': f'テスト{i}'})
+                    for i in range(tts_requests)
+                ])
+                await asyncio.sleep(0.1)
+                stop.set()
+
+            await asyncio.gather(pinger(), tts_load())
+
+    await runner.cleanup()
+    latencies.sort()
+    gaps = [
+        max(0.0, (b - a - ping_interval) * 1000)
+        for a, b in zip(arrivals, arrivals[1:])
+    ]
+    return {
+        'samples': len(latencies),
+        'p50': statistics.median(latencies),
+        'p99': latencies[int(len(latencies) * 0.99) - 1],
+        'max_gap': max(gaps),
+    }
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tts-delay', type=float, default=0.3, help='1回の合成でブロックする秒数')
+    parser.add_argument('--tts-requests', type=int, default=8, help='同時に投げるTTSリクエスト数')
+    parser.add_argument('--ping-interval', type=float, default=0.005)
+    parser.add_argument('--max-gap-ms', type=float, default=50.0, help='非同期経路で許容する中継の途切れ')
+    args = parser.parse_args()
+
+    results = {}
+    for mode in ('blocking', 'async'):
+        results[mode] = await measure(mode, args.tts_delay, args.tts_requests, args.ping_interval)
+        r = results[mode]
+        print(f"[{mode:8}] samples={r['samples']:4d}  p50={r['p50']:7.2f}ms  "
+              f"p99={r['p99']:7.2f}ms  max_gap={r['max_gap']:8.2f}ms")
+
+    if results['async']['max_gap'] > args.max_gap_ms:
+        print(f"NG: async max gap {results['async']['max_gap']:.2f}ms > {args.max_gap_ms}ms")
+        return 1
+    print("OK: WebSocket relay latency stays flat while TTS requests are in flight")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
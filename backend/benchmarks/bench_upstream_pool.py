@@ -0,0 +1,119 @@
+"""
+上流接続プールのベンチマーク
+ローカルの疑似Gemini Liveサーバー（ハンドシェイクに遅延を入れてTLS・認証を模擬）に対し、
+セッション開始から setupComplete を受け取るまでの時間を、
+毎回接続する場合（従来）と UpstreamConnectionPool を使う場合で比較する
+
+実行方法:
+    python benchmarks/bench_upstream_pool.py [--sessions 20] [--handshake-ms 150] [--interval 0.3]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+
+import websockets
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from upstream_pool import UpstreamConnectionPool
+
+SETUP_MESSAGE = json.dumps({'setup': {'model': 'projects/p/locations/us-central1/publishers/google/models/gemini'}})
+
+
+async def start_stand_in_upstream(handshake_ms: float):
+    """ハンドシェイクに遅延を入れ、setup に setupComplete を返す疑似上流サーバー"""
+
+    async def process_request(connection, request):
+        await asyncio.sleep(handshake_ms / 1000)
+        return None
+
+    async def handler(websocket):
+        async for message in websocket:
+            if 'setup' in json.loads(message):
+                await websocket.send(json.dumps({'setupComplete': {}}).encode())
+
+    server = await websockets.serve(handler, '127.0.0.1', 0, process_request=process_request)
+    port = server.sockets[0].getsockname()[1]
+    return server, f'ws://127.0.0.1:{port}'
+
+
+async def run_session(get_connection) -> float:
+    """セッション開始から setupComplete までの時間（ミリ秒）"""
+    started = time.perf_counter()
+    upstream = await get_connection()
+    try:
+        await upstream.send(SETUP_MESSAGE)
+        while True:
+            message = await upstream.recv()
+            if b'setupComplete' in message:
+                return (time.perf_counter() - started) * 1000
+    finally:
+        await upstream.close()
+
+
+async def bench(mode: str, url: str, sessions: int, interval: float, pool_size: int):
+    async def connect():
+        return await websockets.connect(url)
+
+    pool = None
+    if mode == 'pool':
+        pool = UpstreamConnectionPool(connect, size=pool_size, ttl=60)
+        pool.start()
+        # 起動直後の補充を待つ（サーバー起動時に補充を始めるのと同じ状態）
+        await asyncio.sleep(0.5)
+        get_connection = pool.acquire
+    else:
+        get_connection = connect
+
+    latencies = []
+    for _ in range(sessions):
+        latencies.append(await run_session(get_connection))
+        # 利用者の入れ替わり（次のセッションまでの間隔）
+        await asyncio.sleep(interval)
+
+    stats = pool.get_stats() if pool else None
+    if pool:
+        await pool.close()
+    return latencies, stats
+
+
+def summarize(latencies):
+    ordered = sorted(latencies)
+    return {
+        'p50': statistics.median(ordered),
+        'p95': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        'max': ordered[-1],
+    }
+
+
+async def main_async(args):
+    server, url = await start_stand_in_upstream(args.handshake_ms)
+    try:
+        print(f"stand-in upstream: {url} (handshake delay {args.handshake_ms:.0f} ms)")
+        print(f"{'mode':<10} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+        for mode in ('connect', 'pool'):
+            latencies, stats = await bench(mode, url, args.sessions, args.interval, args.pool_size)
+            s = summarize(latencies)
+            print(f"{mode:<10} {s['p50']:>8.1f} {s['p95']:>8.1f} {s['max']:>8.1f}")
+            if stats:
+                print(f"  pool stats: {stats}")
+    finally:
+        server.close()
+        await server.wait_closed()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sessions', type=int, default=20)
+    parser.add_argument('--handshake-ms', type=float, default=150)
+    parser.add_argument('--interval', type=float, default=0.3)
+    parser.add_argument('--pool-size', type=int, default=2)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+入力音声のVADゲート（VoiceActivityGate）のベンチマーク
+駅の環境音（低域寄りの雑音）の中に数回の発話を含む、キオスクからの連続したマイク入力を再現し、
+上流に送らずに済んだフレーム数・バイト数、発話の開始が切れていないか、
+1フレームあたりの処理時間を確認する
+
+実行方法:
+    python benchmarks/bench_vad_gate.py [--seconds 60] [--chunk-ms 100] [--noise-db -45]
+"""
+import os
+import sys
+import json
+import time
+import base64
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from vad_gate import VoiceActivityGate
+from synthetic_audio import speech_like
+
+SAMPLE_RATE = 16000
+
+
+def station_noise(duration: float, level_db: float, seed: int = 1) -> np.ndarray:
+    """低域寄りの雑音（アナウンス・走行音などの環境音の代わり）"""
+    rng = np.random.default_rng(seed)
+    white = rng.standard_normal(int(duration * SAMPLE_RATE))
+    brown = np.cumsum(white)
+    brown -= np.convolve(brown, np.ones(400) / 400, mode='same')
+    noise = 0.5 * white / np.std(white) + brown / np.std(brown)
+    noise *= 10 ** (level_db / 20) * 32768 / np.sqrt(np.mean(noise ** 2))
+    return noise
+
+
+def build_stream(seconds: float, noise_db: float, utterances: int):
+    """環境音＋発話の連続したPCMと、発話の区間（秒）"""
+    audio = station_noise(seconds, noise_db)
+    spans = []
+    for i in range(utterances):
+        start = (i + 0.5) * seconds / utterances
+        speech = speech_like(3.0, SAMPLE_RATE, seed=i).astype(np.float64) * 0.5
+        begin = int(start * SAMPLE_RATE)
+        audio[begin:begin + len(speech)] += speech
+        spans.append((start, start + 3.0))
+    return np.clip(audio, -32768, 32767).astype(np.int16), spans
+
+
+def to_frames(samples: np.ndarray, chunk_ms: float):
+    """ブラウザと同じ形の realtime_input フレームに分割"""
+    chunk = int(SAMPLE_RATE * chunk_ms / 1000)
+    frames = []
+    for begin in range(0, len(samples), chunk):
+        pcm = samples[begin:begin + chunk].tobytes()
+        frames.append(json.dumps({
+            'realtime_input': {'media_chunks': [{'mime_type': 'audio/pcm', 'data': base64.b64encode(pcm).decode('ascii')}]}
+        }))
+    return frames
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seconds', type=float, default=60)
+    parser.add_argument('--chunk-ms', type=float, default=100)
+    parser.add_argument('--noise-db', type=float, default=-45)
+    parser.add_argument('--utterances', type=int, default=4)
+    args = parser.parse_args()
+
+    samples, spans = build_stream(args.seconds, args.noise_db, args.utterances)
+    frames = to_frames(samples, args.chunk_ms)
+    gate = VoiceActivityGate()
+
+    forwarded = set()
+    index_of = {id(frame): i for i, frame in enumerate(frames)}
+    started = time.perf_counter()
+    for frame in frames:
+        for sent in gate.process(frame):
+            forwarded.add(index_of[id(sent)])
+    elapsed = time.perf_counter() - started
+
+    stats = gate.get_stats()
+    print(f"{args.seconds:.0f} s at {SAMPLE_RATE} Hz, {args.chunk_ms:.0f} ms chunks, "
+          f"noise {args.noise_db:.0f} dBFS, {args.utterances} utterances of 3 s")
+    print(f"frames: {stats['frames_in']} in, {stats['frames_out']} out "
+          f"({stats['frames_saved'] / stats['frames_in']:.0%} saved)")
+    print(f"bytes:  {stats['bytes_in'] / 1024:.0f} KB in, {stats['bytes_out'] / 1024:.0f} KB out "
+          f"({stats['bytes_saved'] / stats['bytes_in']:.0%} saved)")
+    print(f"speech onsets detected: {stats['speech_onsets']}, keepalives: {stats['keepalives']}, "
+          f"noise floor: {stats['noise_floor_db']} dBFS")
+    for start, end in spans:
+        first = int(start * 1000 / args.chunk_ms)
+        last = int(end * 1000 / args.chunk_ms)
+        covered = sum(1 for i in range(first, last + 1) if i in forwarded)
+        preroll = first - 1 in forwarded
+        print(f"  utterance {start:5.1f}-{end:5.1f} s: {covered}/{last - first + 1} chunks forwarded, "
+              f"pre-roll {'yes' if preroll else 'no'}")
+    print(f"CPU: {elapsed / len(frames) * 1e6:.1f} us per frame")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""
+ベンチマーク用の合成音声データ
+TTSの出力に近い、有声音（倍音＋音節ごとの包絡）と無音区間を含むPCMを生成する
+"""
+import numpy as np
+
+
+def speech_like(duration: float, sample_rate: int = 24000, seed: int = 0) -> np.ndarray:
+    """
+    音声に似た信号（int16）を生成
+
+    Args:
+        duration: 長さ（秒）
+        sample_rate: サンプリングレート
+        seed: 乱数シード
+
+    Returns:
+        int16のPCMサンプル
+    """
+    rng = np.random.default_rng(seed)
+    n = int(duration * sample_rate)
+    t = np.arange(n) / sample_rate
+
+    # 基本周波数をゆっくり揺らした倍音列
+    f0 = 180 + 30 * np.sin(2 * np.pi * 0.7 * t + rng.uniform(0, 2 * np.pi))
+    phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 8))
+
+    # 約150msごとの音節包絡（ところどころ無音）
+    syllable = int(0.15 * sample_rate)
+    gains = rng.uniform(0.2, 1.0, n // syllable + 1)
+    gains[rng.random(len(gains)) < 0.15] = 0.0
+    envelope = np.repeat(gains, syllable)[:n]
+    envelope = np.convolve(envelope, np.hanning(441) / np.hanning(441).sum(), mode='same')
+
+    audio = voiced * envelope + rng.normal(0, 0.01, n)
+    audio *= 20000 / max(np.max(np.abs(audio)), 1e-9)
+    return audio.astype(np.int16)
+
+
+def wav_bytes(samples: np.ndarray, sample_rate: int = 24000) -> bytes:
+    """LINEAR16応答と同じくWAVヘッダー付きのバイト列にする"""
+    import struct
+    data = samples.astype('<i2').tobytes()
+    header = (b'RIFF' + struct.pack('<I', len(data) + 36) + b'WAVE' + b'fmt ' +
+              struct.pack('<IHHIIHH', 16, 1, 1, sample_rate, sample_rate * 2, 2, 16) +
+              b'data' + struct.pack('<I', len(data)))
+    return header + data
@@ -5,11 +5,19 @@ WebSocketサーバーと同じプロセスで動作可能
 import os
 import json
 import struct
-import numpy as np
-from scipy import signal
 from google.cloud import texttospeech
 from google.oauth2 import service_account
-from typing import Optional
+from typing import Optional, Dict, Any
+from tts_cache import TTSAudioCache
+from audio_postprocess import AudioPostProcessor, resample_pcm
+from tts_formats import AUDIO_FORMATS, COMPRESSED_AUDIO_FORMATS, DEFAULT_SAMPLE_RATE, encode_audio, is_format_available, supported_sample_rates
+
+# 音声の後処理（重複除去・フェード・フィルタ）のバージョン
+# 後処理の内容を変更した場合は必ず上げること（古いキャッシュを無効化するため）
+POSTPROCESS_VERSION = 3
+
+# WAVヘッダーの長さ（_create_wav_header）
+WAV_HEADER_SIZE = 44
 
 class GoogleCloudTTSService:
     """Google Cloud Text-to-Speech サービス"""
@@ -26,12 +34,21 @@ class GoogleCloudTTSService:
         'Zephyr': 'female'
     }
     
-    def __init__(self, credentials_path: Optional[str] = None):
+    def __init__(self, credentials_path: Optional[str] = None, cache: Optional[TTSAudioCache] = None):
         """
         初期化
         Args:
             credentials_path: 認証情報JSONファイルのパス（オプション）
+            cache: 合成済み音声のキャッシュ（省略時は環境変数の設定で作成）
         """
+        # TTS_CACHE_ENABLED=false の場合はキャッシュを使わない
+        if cache is None and os.getenv('TTS_CACHE_ENABLED', 'true').lower() == 'true':
+            cache = TTSAudioCache.from_env()
+        self.cache = cache
+        
+        # 音声の後処理エンジン（フィルタ係数・フェードカーブは事前計算済み）
+        self.postprocessor = AudioPostProcessor(sample_rate=24000)
+
         # 環境変数からJSON文字列として認証情報を取得
         if os.environ.get('GOOGLE_CREDENTIALS_JSON'):
             # 環境変数からJSON文字列を読み込み
@@ -64,7 +81,9 @@ class GoogleCloudTTSService:
         self, 
         text: str, 
         voice_name: str = 'Kore',
-        language_code: str = 'ja-JP'
+        language_code: str = 'ja-JP',
+        audio_format: str = 'wav',
+        sample_rate: int = DEFAULT_SAMPLE_RATE
     ) -> bytes:
         """
         テキストから音声を合成
@@ -73,13 +92,187 @@ class GoogleCloudTTSService:
             text: 合成するテキスト
             voice_name: 音声の名前（Chirp3 HD）
             language_code: 言語コード
+            audio_format: 出力フォーマット（wav / pcm / ogg_opus / mp3）
+            sample_rate: 出力のサンプリングレート
             
         Returns:
-            WAV形式の音声データ（bytes）
+            指定フォーマットの音声データ（bytes）
         """
         if voice_name not in self.CHIRP3_HD_VOICES:
             raise ValueError(f"Invalid voice name. Available: {list(self.CHIRP3_HD_VOICES.keys())}")
+        if audio_format not in AUDIO_FORMATS:
+            raise ValueError(f"Invalid audio format. Available: {list(AUDIO_FORMATS.keys())}")
+        if not is_format_available(audio_format):
+            raise ValueError(f"Audio format '{audio_format}' is not available on this server")
+        if sample_rate not in supported_sample_rates(audio_format):
+            raise ValueError(f"Invalid sample rate for {audio_format}. Available: {list(supported_sample_rates(audio_format))}")
+        
+        # PCMはWAVからヘッダーを除くだけなので、WAVのキャッシュを共有する
+        if audio_format == 'pcm':
+            return self.synthesize_speech(text, voice_name, language_code, 'wav', sample_rate)[WAV_HEADER_SIZE:]
+        
+        # キャッシュにあればTTSクライアントを呼ばずに返す
+        cache_key = self.cache_key(text, voice_name, language_code, audio_format, sample_rate)
+        if self.cache:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        if audio_format in COMPRESSED_AUDIO_FORMATS:
+            # 後処理済みのPCM（キャッシュ済みならそれ）をエンコードする。TTS APIは呼び直さない
+            audio_data = encode_audio(
+                self.synthesize_speech(text, voice_name, language_code, 'pcm', sample_rate),
+                sample_rate,
+                audio_format
+            )
+        elif sample_rate != DEFAULT_SAMPLE_RATE:
+            # 後処理済みの24kHzの音声（キャッシュ済みならそれ）からリサンプリングする
+            pcm_data = resample_pcm(
+                self.synthesize_speech(text, voice_name, language_code)[WAV_HEADER_SIZE:],
+                DEFAULT_SAMPLE_RATE,
+                sample_rate
+            )
+            audio_data = self._create_wav_header(pcm_data, sample_rate) + pcm_data
+        else:
+            audio_data = self._synthesize_uncached(text, voice_name, language_code)
+        
+        if self.cache:
+            self.cache.put(cache_key, audio_data)
+        return audio_data
+    
+    def cache_key(
+        self,
+        text: str,
+        voice_name: str = 'Kore',
+        language_code: str = 'ja-JP',
+        audio_format: str = 'wav',
+        sample_rate: int = DEFAULT_SAMPLE_RATE
+    ) -> str:
+        """
+        キャッシュキーを作成
+        
+        Args:
+            text: 合成するテキスト
+            voice_name: 音声の名前
+            language_code: 言語コード
+            audio_format: 出力フォーマット
+            sample_rate: 出力のサンプリングレート
+            
+        Returns:
+            キャッシュキー（SHA-256）
+        """
+        params = {'text': text, 'voice': voice_name, 'language': language_code, 'postprocess': POSTPROCESS_VERSION}
+        # PCMはWAVのキャッシュを共有する
+        if audio_format not in ('wav', 'pcm'):
+            params['format'] = audio_format
+        # 24kHz（既定）のキーは変えない（既存のキャッシュを有効なままにする）
+        if sample_rate != DEFAULT_SAMPLE_RATE:
+            params['sample_rate'] = sample_rate
+        return TTSAudioCache.make_key(**params)
+    
+    def content_hash(
+        self,
+        text: str,
+        voice_name: str = 'Kore',
+        language_code: str = 'ja-JP',
+        audio_format: str = 'wav',
+        sample_rate: int = DEFAULT_SAMPLE_RATE
+    ) -> str:
+        """
+        返却する音声の合成の条件を表すハッシュ（HTTPの弱いETag用）
+        合成せずに求められるため、304応答にTTS APIもキャッシュも使わない。
+        音声のバイト列のハッシュではないため、強いETagには使わない
+        
+        Args:
+            text: 合成するテキスト
+            voice_name: 音声の名前
+            language_code: 言語コード
+            audio_format: 出力フォーマット
+            sample_rate: 出力のサンプリングレート
+            
+        Returns:
+            ハッシュ値（SHA-256）
+        """
+        # WAVとPCMはキャッシュキーが同じため、フォーマットも含める
+        return TTSAudioCache.make_key(
+            key=self.cache_key(text, voice_name, language_code, audio_format, sample_rate),
+            format=audio_format
+        )
+    
+    def get_cached_speech(
+        self,
+        text: str,
+        voice_name: str = 'Kore',
+        language_code: str = 'ja-JP',
+        audio_format: str = 'wav',
+        sample_rate: int = DEFAULT_SAMPLE_RATE
+    ) -> Optional[bytes]:
+        """
+        メモリキャッシュ済みの音声のみを返す（TTS APIもディスクも参照しない）
         
+        Args:
+            text: 合成するテキスト
+            voice_name: 音声の名前
+            language_code: 言語コード
+            audio_format: 出力フォーマット
+            sample_rate: 出力のサンプリングレート
+            
+        Returns:
+            指定フォーマットの音声データ（キャッシュにない場合はNone）
+        """
+        if not self.cache:
+            return None
+        cached = self.cache.get(
+            self.cache_key(text, voice_name, language_code, audio_format, sample_rate),
+            memory_only=True
+        )
+        if cached is not None and audio_format == 'pcm':
+            return cached[WAV_HEADER_SIZE:]
+        return cached
+
+    def is_cached(
+        self,
+        text: str,
+        voice_name: str = 'Kore',
+        language_code: str = 'ja-JP',
+        audio_format: str = 'wav',
+        sample_rate: int = DEFAULT_SAMPLE_RATE
+    ) -> bool:
+        """
+        メモリキャッシュから返せるか（音声は取り出さない）
+        
+        Args:
+            text: 合成するテキスト
+            voice_name: 音声の名前
+            language_code: 言語コード
+            audio_format: 出力フォーマット
+            sample_rate: 出力のサンプリングレート
+            
+        Returns:
+            メモリキャッシュにある場合はTrue
+        """
+        if not self.cache:
+            return False
+        return self.cache.contains(self.cache_key(text, voice_name, language_code, audio_format, sample_rate))
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """キャッシュの統計情報を取得"""
+        if not self.cache:
+            return {'enabled': False}
+        return {'enabled': True, **self.cache.get_stats()}
+    
+    def _synthesize_uncached(self, text: str, voice_name: str, language_code: str) -> bytes:
+        """
+        TTS APIを呼び出して音声を合成し、後処理を行う
+        
+        Args:
+            text: 合成するテキスト
+            voice_name: 音声の名前（Chirp3 HD）
+            language_code: 言語コード
+            
+        Returns:
+            WAV形式の音声データ（bytes）
+        """
         # 入力テキストの設定
         synthesis_input = texttospeech.SynthesisInput(text=text)
         
@@ -104,27 +297,24 @@ class GoogleCloudTTSService:
             audio_config=audio_config
         )
         
-        # 重複を検出して削除
-        cleaned_audio = self._remove_duplicate_audio(response.audio_content)
-        
-        # フェードイン/アウトを適用してポップノイズを除去
-        faded_audio = self._apply_fade_in_out(cleaned_audio)
+        # 重複を検出して削除し、フェードイン/アウトを適用してポップノイズを除去
+        processed_audio = self.postprocessor.process(response.audio_content)
         
         # PCMデータをWAV形式に変換
-        wav_data = self._create_wav_header(faded_audio) + faded_audio
+        wav_data = self._create_wav_header(processed_audio) + processed_audio
         return wav_data
     
-    def _create_wav_header(self, pcm_data: bytes) -> bytes:
+    def _create_wav_header(self, pcm_data: bytes, sample_rate: int = DEFAULT_SAMPLE_RATE) -> bytes:
         """
         PCMデータ用のWAVヘッダーを作成
         
         Args:
             pcm_data: PCM音声データ
+            sample_rate: サンプリングレート（既定はGoogle Cloud TTSの24kHz）
             
         Returns:
             WAVヘッダー（44バイト）
         """
-        sample_rate = 24000  # Google Cloud TTSのデフォルト
         num_channels = 1  # モノラル
         bits_per_sample = 16  # LINEAR16
         
@@ -150,143 +340,6 @@ class GoogleCloudTTSService:
         
         return header
     
-    def _apply_fade_in_out(self, pcm_data: bytes, fade_duration: float = 0.05, sample_rate: int = 24000) -> bytes:
-        """
-        音声データの開始と終了部分にフェードイン/アウトを適用してポップノイズを防ぐ
-        
-        Args:
-            pcm_data: PCM音声データ（16ビット、モノラル）
-            fade_duration: フェードイン/アウトの長さ（秒）
-            sample_rate: サンプリングレート
-            
-        Returns:
-            フェードイン/アウトを適用したPCM音声データ
-        """
-        try:
-            # PCMデータをnumpy配列に変換（16ビット整数）
-            audio_array = np.frombuffer(pcm_data, dtype=np.int16).astype(np.float32)
-            
-            # DCオフセット（直流成分）を除去
-            audio_array = audio_array - np.mean(audio_array)
-            
-            # 開始部分に短い無音を追加（10ms）
-            silence_duration = 0.01
-            silence_samples = int(silence_duration * sample_rate)
-            silence = np.zeros(silence_samples, dtype=np.float32)
-            audio_array = np.concatenate([silence, audio_array])
-            
-            # フェードのサンプル数を計算（50ms）
-            fade_samples = int(fade_duration * sample_rate)
-            
-            if fade_samples > 0 and len(audio_array) > fade_samples * 2:
-                # より滑らかなフェードインカーブ（S字カーブ）
-                t = np.linspace(0, 1, fade_samples)
-                fade_in_curve = t * t * (3.0 - 2.0 * t)  # スムーズステップ関数
-                fade_out_curve = 1.0 - (1.0 - t) * (1.0 - t) * (3.0 - 2.0 * (1.0 - t))
-                
-                # フェードインを適用（無音部分の後から）
-                audio_array[silence_samples:silence_samples + fade_samples] *= fade_in_curve
-                
-                # フェードアウトを適用
-                audio_array[-fade_samples:] *= fade_out_curve
-            
-            # ハイパスフィルタでDC成分と低周波ノイズを除去（20Hz以下をカット）
-            nyquist = sample_rate / 2
-            cutoff = 20  # Hz
-            b, a = signal.butter(2, cutoff / nyquist, btype='high')
-            audio_array = signal.filtfilt(b, a, audio_array)
-            
-            # クリッピングを防ぐために正規化（音量を95%に抑える）
-            max_val = np.max(np.abs(audio_array))
-            if max_val > 0:
-                audio_array = audio_array * (32767 * 0.95 / max_val)
-            
-            # int16に戻す
-            return audio_array.astype(np.int16).tobytes()
-            
-        except Exception as e:
-            print(f"[GoogleCloudTTS] フェード処理中にエラーが発生しました: {e}")
-            return pcm_data
-    
-    def _remove_duplicate_audio(self, pcm_data: bytes, sample_rate: int = 24000) -> bytes:
-        """
-        音声データから重複部分を検出して削除
-        
-        Args:
-            pcm_data: PCM音声データ（16ビット、モノラル）
-            sample_rate: サンプリングレート
-            
-        Returns:
-            重複を削除したPCM音声データ
-        """
-        try:
-            # PCMデータをnumpy配列に変換（16ビット整数）
-            audio_array = np.frombuffer(pcm_data, dtype=np.int16)
-            
-            # 音声の長さを確認
-            total_samples = len(audio_array)
-            if total_samples == 0:
-                return pcm_data
-            
-            # 最小検出単位（0.5秒分のサンプル数）
-            min_chunk_samples = int(sample_rate * 0.5)
-            
-            # 音声を3分割して、各部分が同じかどうかをチェック
-            third_length = total_samples // 3
-            
-            # 3分割がほぼ同じ長さで、かつ十分な長さがある場合のみチェック
-            if third_length > min_chunk_samples and total_samples % 3 < sample_rate * 0.1:
-                part1 = audio_array[:third_length]
-                part2 = audio_array[third_length:2*third_length]
-                part3 = audio_array[2*third_length:3*third_length]
-                
-                # 各部分の類似度を計算（相関係数を使用）
-                # 音声の振幅を正規化
-                def normalize_audio(audio):
-                    if np.std(audio) > 0:
-                        return (audio - np.mean(audio)) / np.std(audio)
-                    return audio
-                
-                part1_norm = normalize_audio(part1.astype(np.float32))
-                part2_norm = normalize_audio(part2.astype(np.float32))
-                part3_norm = normalize_audio(part3.astype(np.float32))
-                
-                # 相関係数を計算
-                corr_12 = np.corrcoef(part1_norm, part2_norm)[0, 1]
-                corr_23 = np.corrcoef(part2_norm, part3_norm)[0, 1]
-                corr_13 = np.corrcoef(part1_norm, part3_norm)[0, 1]
-                
-                # 高い相関（0.95以上）があれば重複と判定
-                if corr_12 > 0.95 and corr_23 > 0.95 and corr_13 > 0.95:
-                    print(f"[GoogleCloudTTS] 音声の重複を検出しました（相関係数: {corr_12:.3f}, {corr_23:.3f}, {corr_13:.3f}）")
-                    print(f"[GoogleCloudTTS] 元の長さ: {total_samples/sample_rate:.2f}秒 → 削除後: {third_length/sample_rate:.2f}秒")
-                    # 最初の1/3だけを返す
-                    return part1.tobytes()
-            
-            # 2分割チェック（2回の重複の場合）
-            half_length = total_samples // 2
-            if half_length > min_chunk_samples and total_samples % 2 < sample_rate * 0.1:
-                part1 = audio_array[:half_length]
-                part2 = audio_array[half_length:2*half_length]
-                
-                part1_norm = normalize_audio(part1.astype(np.float32))
-                part2_norm = normalize_audio(part2.astype(np.float32))
-                
-                corr = np.corrcoef(part1_norm, part2_norm)[0, 1]
-                
-                if corr > 0.95:
-                    print(f"[GoogleCloudTTS] 音声の重複（2回）を検出しました（相関係数: {corr:.3f}）")
-                    print(f"[GoogleCloudTTS] 元の長さ: {total_samples/sample_rate:.2f}秒 → 削除後: {half_length/sample_rate:.2f}秒")
-                    return part1.tobytes()
-            
-            # 重複が検出されなかった場合は元のデータを返す
-            return pcm_data
-            
-        except Exception as e:
-            print(f"[GoogleCloudTTS] 重複検出中にエラーが発生しました: {e}")
-            # エラーが発生した場合は元のデータをそのまま返す
-            return pcm_data
-    
     def get_available_voices(self):
         """利用可能な音声のリストを取得"""
         return [
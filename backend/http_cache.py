@@ -0,0 +1,54 @@
+"""
+HTTPキャッシュ（ETag / Cache-Control）のヘルパー
+TTSの応答は (テキスト, 音声, 言語, フォーマット, 後処理バージョン) の合成の条件で決まるため、
+条件のハッシュをETagとして使い、ブラウザやリバースプロキシにキャッシュさせる。
+同じ条件でもワーカーごと・キャッシュから追い出された後の再合成でバイト列が同じとは限らないため、
+強いETagではなく弱いETag（W/"..."、意味として同じ内容）にする
+"""
+import os
+from typing import Optional
+
+# ブラウザ・リバースプロキシがTTSの応答を再検証せずに使う時間（秒）
+TTS_HTTP_MAX_AGE = int(os.getenv('TTS_HTTP_MAX_AGE', '3600'))
+
+# URL（/api/tts/synthesize?text=...）には後処理バージョンが含まれないため、後処理を変更すると
+# 同じURLの内容が変わる。immutable にはせず、期限が切れたらETagで再検証させる（一致すれば304）
+TTS_CACHE_CONTROL = f'public, max-age={TTS_HTTP_MAX_AGE}, must-revalidate'
+
+
+def weak_etag(digest: str) -> str:
+    """
+    ハッシュ値から弱いETagを作成
+
+    Args:
+        digest: 合成の条件のハッシュ値
+
+    Returns:
+        W/ を付けてダブルクォートで囲んだETag
+    """
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    If-None-Match ヘッダーがETagに一致するか判定（弱い比較、RFC 9110）
+
+    Args:
+        if_none_match: If-None-Match ヘッダーの値
+        etag: 現在のETag
+
+    Returns:
+        一致する場合はTrue（304を返してよい）
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    opaque = etag[2:] if etag.startswith('W/') else etag
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
@@ -6,11 +6,17 @@ Azure App Service用
 import os
 import asyncio
 from typing import Optional
-from fastapi import FastAPI, WebSocket, HTTPException
+from fastapi import FastAPI, WebSocket, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
 from google_cloud_tts import GoogleCloudTTSService
+from async_tts import AsyncTTSService
+from tts_streaming import open_pcm_stream
+from tts_warmup import run_startup_warmup
+from tts_formats import AUDIO_FILE_EXTENSIONS, negotiate_audio_format, parse_sample_rate, audio_content_type
+from tts_batch import BATCH_CONTENT_TYPE, parse_batch_items, synthesize_batch
+from http_cache import TTS_CACHE_CONTROL, weak_etag, etag_matches
 from routers import storage
 
 # FastAPIアプリケーション
@@ -27,10 +33,18 @@ app.add_middleware(
 
 # Google Cloud TTSサービスのインスタンス
 tts_service = GoogleCloudTTSService()
+# 合成はスレッドプールで実行してイベントループを止めない
+async_tts_service = AsyncTTSService(tts_service)
 
 # ルーターを登録
 app.include_router(storage.router, prefix="/api/storage", tags=["storage"])
 
+
+@app.on_event("startup")
+async def start_tts_warmup():
+    """固定案内文の事前合成をバックグラウンドで開始（TTS_WARMUP_ON_START=true の場合）"""
+    app.state.tts_warmup_task = asyncio.create_task(run_startup_warmup(async_tts_service))
+
 # =====================================
 # データモデル
 # =====================================
@@ -39,6 +53,8 @@ class TTSSynthesizeRequest(BaseModel):
     text: str
     voiceName: Optional[str] = 'Kore'
     languageCode: Optional[str] = 'ja-JP'
+    audioFormat: Optional[str] = None  # wav / pcm / ogg_opus / mp3（省略時はAcceptヘッダーで決定）
+    sampleRate: Optional[int] = None  # 8000 / 16000 / 22050 / 24000 / 48000（省略時は24000）
 
 # =====================================
 # HTTP エンドポイント
@@ -54,30 +70,40 @@ async def health_check():
     }
 
 @app.post("/api/tts/synthesize")
-async def synthesize_speech(request: TTSSynthesizeRequest):
+async def synthesize_speech(request: TTSSynthesizeRequest, http_request: Request):
     """
     テキストから音声を合成
     
     Args:
         request: 音声合成リクエスト
+        http_request: HTTPリクエスト（Acceptヘッダーの参照用）
         
     Returns:
-        WAV形式の音声データ
+        指定フォーマット（既定はWAV）の音声データ
     """
     try:
-        # 音声合成
-        audio_data = tts_service.synthesize_speech(
+        # 出力フォーマット（audioFormat 指定 > Acceptヘッダー > WAV）
+        audio_format = negotiate_audio_format(
+            http_request.headers.get("accept"),
+            request.audioFormat
+        )
+        sample_rate = parse_sample_rate(request.sampleRate, audio_format)
+        
+        # 音声合成（キャッシュ済みの場合はTTS APIを呼ばずに返る）
+        audio_data = await async_tts_service.synthesize_speech(
             text=request.text,
             voice_name=request.voiceName,
-            language_code=request.languageCode
+            language_code=request.languageCode,
+            audio_format=audio_format,
+            sample_rate=sample_rate
         )
         
-        # WAVファイルとして返す
         return Response(
             content=audio_data,
-            media_type="audio/wav",
+            media_type=audio_content_type(audio_format, sample_rate),
             headers={
-                "Content-Disposition": "inline; filename=speech.wav"
+                "Content-Disposition": f"inline; filename=speech.{AUDIO_FILE_EXTENSIONS[audio_format]}",
+                "Vary": "Accept"
             }
         )
     except ValueError as e:
@@ -85,6 +111,149 @@ async def synthesize_speech(request: TTSSynthesizeRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Speech synthesis failed: {str(e)}")
 
+@app.get("/api/tts/synthesize")
+async def synthesize_speech_get(
+    http_request: Request,
+    text: str = "",
+    voiceName: str = "Kore",
+    languageCode: str = "ja-JP",
+    audioFormat: Optional[str] = None,
+    sampleRate: Optional[int] = None
+):
+    """
+    テキストから音声を合成（GET版、ブラウザ・リバースプロキシでキャッシュ可能）
+    
+    Args:
+        http_request: HTTPリクエスト（Accept / If-None-Match の参照用）
+        text: 合成するテキスト
+        voiceName: 音声の名前
+        languageCode: 言語コード
+        audioFormat: 出力フォーマット（省略時はAcceptヘッダーで決定）
+        sampleRate: 出力のサンプリングレート（省略時は24000）
+        
+    Returns:
+        音声データ（ETagが一致する場合は304）
+    """
+    if not text:
+        raise HTTPException(status_code=400, detail="Text is required")
+    if voiceName not in tts_service.CHIRP3_HD_VOICES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid voice name. Available: {list(tts_service.CHIRP3_HD_VOICES.keys())}"
+        )
+    try:
+        audio_format = negotiate_audio_format(http_request.headers.get("accept"), audioFormat)
+        sample_rate = parse_sample_rate(sampleRate, audio_format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # ETagは合成の条件のハッシュ（合成しなくても決まる）ため、一致すれば何もせずに304を返す
+    etag = weak_etag(tts_service.content_hash(text, voiceName, languageCode, audio_format, sample_rate))
+    cache_headers = {
+        "ETag": etag,
+        "Cache-Control": TTS_CACHE_CONTROL,
+        "Vary": "Accept"
+    }
+    if etag_matches(http_request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=cache_headers)
+    
+    try:
+        audio_data = await async_tts_service.synthesize_speech(
+            text=text,
+            voice_name=voiceName,
+            language_code=languageCode,
+            audio_format=audio_format,
+            sample_rate=sample_rate
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Speech synthesis failed: {str(e)}")
+    
+    return Response(
+        content=audio_data,
+        media_type=audio_content_type(audio_format, sample_rate),
+        headers={
+            "Content-Disposition": f"inline; filename=speech.{AUDIO_FILE_EXTENSIONS[audio_format]}",
+            **cache_headers
+        }
+    )
+
+@app.post("/api/tts/stream")
+async def stream_speech(request: TTSSynthesizeRequest):
+    """
+    テキストを文単位で合成し、合成できた順にPCMをストリーミングで返す
+    
+    Args:
+        request: 音声合成リクエスト
+        
+    Returns:
+        16bit モノラルのPCM（チャンク転送、既定は24kHz）
+    """
+    if not request.text:
+        raise HTTPException(status_code=400, detail="Text is required")
+    if request.voiceName not in tts_service.CHIRP3_HD_VOICES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid voice name. Available: {list(tts_service.CHIRP3_HD_VOICES.keys())}"
+        )
+    try:
+        sample_rate = parse_sample_rate(request.sampleRate, 'pcm')
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # 先頭の区間の合成を待ってからヘッダーを送る（失敗した場合は500を返せるように）
+    try:
+        segments = await open_pcm_stream(
+            async_tts_service,
+            text=request.text,
+            voice_name=request.voiceName,
+            language_code=request.languageCode,
+            sample_rate=sample_rate
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Speech synthesis failed: {str(e)}")
+    
+    return StreamingResponse(
+        segments,
+        media_type=audio_content_type("pcm", sample_rate),
+        headers={
+            "X-Audio-Sample-Rate": str(sample_rate),
+            "X-Audio-Channels": "1",
+            "Cache-Control": "no-cache"
+        }
+    )
+
+@app.post("/api/tts/batch")
+async def synthesize_batch_speech(http_request: Request):
+    """
+    複数のテキストを並行に合成し、合成できた順に長さ付きのバイナリで返す
+    
+    Args:
+        http_request: HTTPリクエスト（{"items": [...], "voiceName", "languageCode", "audioFormat", "sampleRate"}）
+        
+    Returns:
+        アイテムごとの [ヘッダー長][ヘッダーJSON][音声データ]（チャンク転送）
+    """
+    try:
+        data = await http_request.json()
+        items = parse_batch_items(data)
+        audio_format = negotiate_audio_format(None, data.get("audioFormat"))
+        sample_rate = parse_sample_rate(data.get("sampleRate"), audio_format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid JSON")
+    
+    return StreamingResponse(
+        synthesize_batch(async_tts_service, items, audio_format, sample_rate),
+        media_type=BATCH_CONTENT_TYPE,
+        headers={
+            "X-TTS-Batch-Items": str(len(items)),
+            "Cache-Control": "no-cache"
+        }
+    )
+
 @app.get("/api/tts/voices")
 async def get_voices():
     """利用可能な音声のリストを取得"""
@@ -92,6 +261,14 @@ async def get_voices():
         "voices": tts_service.get_available_voices()
     }
 
+@app.get("/api/tts/cache/stats")
+async def get_cache_stats():
+    """TTSキャッシュの統計情報を取得"""
+    return {
+        "cache": tts_service.get_cache_stats(),
+        "executor": async_tts_service.get_stats()
+    }
+
 # =====================================
 # WebSocket エンドポイント
 # =====================================
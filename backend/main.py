@@ -1,15 +1,30 @@
 import asyncio
+import itertools
 import json
 import os
-from typing import Optional
+from typing import Optional, Callable, Union, Dict, Any, List, Set
 import logging
 
 import websockets
+from websockets.exceptions import ConnectionClosed
 from websockets.legacy.protocol import WebSocketCommonProtocol
 from websockets.legacy.server import WebSocketServerProtocol
 from google.oauth2 import service_account
 from google.auth.transport.requests import Request
 
+from upstream_pool import UpstreamConnectionPool, UPSTREAM_POOL_SIZE
+from token_manager import AccessTokenManager
+from relay_queue import RelayQueue, RELAY_MAX_AUDIO_AGE_MS, is_audio_input
+from proxy_metrics import SessionMetrics
+from audio_coalescer import AudioCoalescer, PROXY_COALESCE_MS
+from pcm_protocol import PCM_SUBPROTOCOL, client_to_server_frames, server_to_client_frames
+from setup_profiles import SetupProfileRegistry, SetupProfileError, is_setup_profile_request
+from vad_gate import VoiceActivityGate, PROXY_VAD_ENABLED
+from pcm_rechunker import FramedAudioOutput, PROXY_OUTPUT_FRAME_MS
+from tool_registry import ToolRegistry, create_default_registry, is_tool_call, PROXY_TOOLS_ENABLED
+from session_recorder import create_session_recorder, finish_recording, conversation_id_from_path, PROXY_RECORDING_ENABLED
+from admission import ws_sessions, BUSY_CLOSE_CODE
+
 # ログ設定
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -20,9 +35,24 @@ SERVICE_URL = f"wss://{HOST}/ws/google.cloud.aiplatform.v1beta1.LlmBidiService/B
 PORT = int(os.getenv("PORT", "8080"))
 PROJECT_ID = os.getenv("GOOGLE_CLOUD_PROJECT", "")
 SERVICE_ACCOUNT_FILE = os.getenv("GOOGLE_APPLICATION_CREDENTIALS", "")
+# setupプロファイルの model を展開するリージョン（既定はGEMINI_HOSTのリージョン）
+LOCATION = os.getenv("GEMINI_LOCATION", HOST.split("-aiplatform")[0])
 
 DEBUG = os.getenv("DEBUG", "false").lower() == "true"
 
+# プロキシの転送方式
+#   passthrough: フレームをデコードせずにそのまま転送（既定）
+#   json: フレームごとに json.loads → json.dumps して転送（従来の方式）
+PROXY_MODE = os.getenv("PROXY_MODE", "passthrough").lower()
+
+# passthrough 時に検査する制御メッセージのキー
+# Geminiの制御メッセージはキーがフレームの先頭（serverContentのturnCompleteは末尾）に
+# 来るため、音声フレームを全体走査しないよう先頭と末尾の一定バイトだけを検査する
+CONTROL_MARKERS = ("setupComplete", "toolCall", "turnComplete")
+INSPECT_WINDOW = 256
+
+Message = Union[str, bytes]
+
 
 class GeminiProxy:
     """Gemini Live APIへのプロキシクラス"""
@@ -30,6 +60,7 @@ class GeminiProxy:
     def __init__(self):
         self.credentials = None
         self.access_token = None
+        self.token_manager: Optional[AccessTokenManager] = None
         self._init_credentials()
     
     def _init_credentials(self):
@@ -44,11 +75,23 @@ class GeminiProxy:
                 scopes=["https://www.googleapis.com/auth/cloud-platform"]
             )
             logger.info("Service account credentials loaded")
+            # トークンは期限前にバックグラウンドで更新する（接続時に同期更新しない）
+            self.token_manager = AccessTokenManager(self.credentials)
         else:
             logger.warning("No service account file found. Using default credentials.")
     
+    async def get_access_token_async(self) -> str:
+        """アクセストークンを取得（バックグラウンドで更新済みのトークンを待たずに返す）"""
+        if self.token_manager:
+            return await self.token_manager.get_token()
+        return ""
+    
     def get_access_token(self) -> str:
-        """アクセストークンを取得（必要に応じてリフレッシュ）"""
+        """
+        アクセストークンを取得（必要に応じてリフレッシュ）
+        期限切れの場合はイベントループ上で同期的に更新するため、非同期の処理からは
+        get_access_token_async を使うこと
+        """
         if self.credentials:
             if not self.credentials.valid:
                 self.credentials.refresh(Request())
@@ -58,14 +101,83 @@ class GeminiProxy:
 
 proxy = GeminiProxy()
 
+# 実行中のセッション（セッションID → 方向ごとの送信キューと計測）
+active_sessions: Dict[int, Dict[str, Any]] = {}
+_session_ids = itertools.count(1)
+# 終了したセッションの録音のアップロード（完了までタスクを保持する）
+_recording_uploads = set()
+
+# プロキシで処理するツール（登録されていないツールの toolCall はクライアントに転送する）
+tool_registry: Optional[ToolRegistry] = create_default_registry() if PROXY_TOOLS_ENABLED else None
+
+# クライアントが setupProfile で指定するsetupプロファイル（プロキシで処理するツールの宣言を tools に加える）
+setup_profiles = SetupProfileRegistry(
+    PROJECT_ID, LOCATION, tool_declarations=tool_registry.declarations() if tool_registry else None
+)
+
+# 接続済み・認証済みの上流接続のプール（ワーカーごと、イベントループ上で作成する）
+upstream_pool: Optional[UpstreamConnectionPool] = None
+
+
+def upstream_headers(bearer_token: str) -> dict:
+    """上流接続のリクエストヘッダー"""
+    return {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {bearer_token}",
+    }
+
+
+async def connect_upstream():
+    """現在のアクセストークンで上流に接続（トークンがなければ接続しない）"""
+    bearer_token = await proxy.get_access_token_async()
+    if not bearer_token:
+        raise ConnectionError("No access token for the upstream connection")
+    return await websockets.connect(SERVICE_URL, additional_headers=upstream_headers(bearer_token))
+
+
+def get_upstream_pool() -> Optional[UpstreamConnectionPool]:
+    """上流接続のプールを取得（UPSTREAM_POOL_SIZE=0 の場合はNone）"""
+    global upstream_pool
+    if upstream_pool is None and UPSTREAM_POOL_SIZE > 0:
+        upstream_pool = UpstreamConnectionPool(connect_upstream)
+    return upstream_pool
+
+
+async def start_upstream_pool(app=None) -> None:
+    """サーバー起動時にトークンの更新・上流接続の補充・setupプロファイルの確認を開始（aiohttpのon_startupにも登録できる）"""
+    # setupプロファイルのファイルはスレッドで確認する（イベントループ上で読まない）
+    setup_profiles.start()
+    # トークンの更新はプールの補充より先に始める
+    if proxy.token_manager:
+        proxy.token_manager.start()
+    # 認証情報がなければ上流に接続できないため、プールの補充は始めない
+    pool = get_upstream_pool()
+    if pool and PROJECT_ID and proxy.token_manager:
+        pool.start()
+
+
+async def close_upstream_pool(app=None) -> None:
+    """サーバー終了時にアイドルの上流接続を閉じ、トークンの更新とsetupプロファイルの確認を止める"""
+    await setup_profiles.stop()
+    if upstream_pool:
+        await upstream_pool.close()
+    if proxy.token_manager:
+        await proxy.token_manager.stop()
+
 
 async def handle_client(client_websocket: WebSocketServerProtocol) -> None:
     """クライアント接続を処理"""
     logger.info("New client connection...")
     
+    # ワーカーのセッション数が上限に達していれば、上流に接続せずにすぐ断る
+    if not ws_sessions.try_acquire():
+        logger.warning(f"Rejected client connection: {ws_sessions.active} sessions on this worker")
+        await client_websocket.close(code=BUSY_CLOSE_CODE, reason="Server busy, retry later")
+        return
+    
     try:
         # サーバー側でアクセストークンを取得
-        access_token = proxy.get_access_token()
+        access_token = await proxy.get_access_token_async()
         if not access_token:
             logger.error("Failed to get access token")
             await client_websocket.close(code=1008, reason="Authentication failed")
@@ -77,6 +189,8 @@ async def handle_client(client_websocket: WebSocketServerProtocol) -> None:
     except Exception as e:
         logger.error(f"Error handling client: {e}")
         await client_websocket.close(code=1011, reason="Internal server error")
+    finally:
+        ws_sessions.release()
 
 
 async def create_proxy(
@@ -85,21 +199,192 @@ async def create_proxy(
     """
     サンプルと同じプロキシ実装
     """
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {bearer_token}",
+    if PROXY_MODE == "json":
+        async with await open_upstream(bearer_token) as server_websocket:
+            client_to_server_task = asyncio.create_task(
+                proxy_task(client_websocket, server_websocket)
+            )
+            server_to_client_task = asyncio.create_task(
+                proxy_task(server_websocket, client_websocket)
+            )
+            await asyncio.gather(client_to_server_task, server_to_client_task)
+        return
+
+    # 方向ごとの送信キュー（入力音声は古くなったら捨てる。サーバーからの音声は捨てない）
+    session_id = next(_session_ids)
+    session_metrics = SessionMetrics(speech_from_vad=PROXY_VAD_ENABLED)
+    client_to_server_queue = RelayQueue(
+        "client_to_server",
+        max_audio_age=RELAY_MAX_AUDIO_AGE_MS / 1000 if RELAY_MAX_AUDIO_AGE_MS > 0 else None
+    )
+    server_to_client_queue = RelayQueue("server_to_client")
+    active_sessions[session_id] = {
+        "client_to_server": client_to_server_queue,
+        "server_to_client": server_to_client_queue,
+        "metrics": session_metrics,
     }
+    # 短い入力音声チャンクはまとめてから上流に送る
+    coalescer = None
+    if PROXY_COALESCE_MS > 0:
+        coalescer = AudioCoalescer(client_to_server_queue.put, PROXY_COALESCE_MS)
+        active_sessions[session_id]["coalescer"] = coalescer
+    # 発話でない区間の入力音声は上流に送らない（PROXY_VAD_ENABLED=true の場合）
+    vad_gate = None
+    if PROXY_VAD_ENABLED:
+        vad_gate = VoiceActivityGate(on_speech=session_metrics.user_speech)
+        active_sessions[session_id]["vad"] = vad_gate
+    # 両方向の音声をステレオWAVに録音する（PROXY_RECORDING_ENABLED=true の場合）
+    recorder = None
+    recording_id = f"proxy-{os.getpid()}-{session_id}"
+    # Blob名はクライアントが渡した会話記録のID（ローカルのファイル名はセッションごとに一意のまま）
+    conversation_id = conversation_id_from_path(client_request_path(client_websocket)) or recording_id
+    if PROXY_RECORDING_ENABLED:
+        try:
+            recorder = create_session_recorder(recording_id)
+            active_sessions[session_id]["recording"] = recorder
+        except OSError as e:
+            logger.error(f"[Recording] Failed to start recording: {e}")
+
+    # jre-pcm16.v1 のクライアントとは音声をバイナリPCMでやり取りする
+    binary_pcm = getattr(client_websocket, "subprotocol", None) == PCM_SUBPROTOCOL
+    transform_audio_frame = None
+    if binary_pcm:
+        logger.info(f"Client uses {PCM_SUBPROTOCOL}")
+        # モデルの音声は PROXY_OUTPUT_FRAME_MS ごとの固定長のフレームに分け直す
+        if PROXY_OUTPUT_FRAME_MS > 0:
+            transform_audio_frame = FramedAudioOutput(PROXY_OUTPUT_FRAME_MS).process
+        else:
+            transform_audio_frame = server_to_client_frames
+
+    # セッション中に起動したタスク（ツールの応答・クライアントの切断）。終了時に取り消す
+    session_tasks: Set[asyncio.Task] = set()
+
+    def spawn(coroutine) -> None:
+        task = asyncio.ensure_future(coroutine)
+        session_tasks.add(task)
+        task.add_done_callback(on_session_task_done)
+
+    def on_session_task_done(task: asyncio.Task) -> None:
+        session_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Session {session_id} task failed: {task.exception()}")
+
+    async def answer_tool_calls(calls: List[Dict[str, Any]]) -> None:
+        """プロキシで処理するツールを実行し、tool_response を上流に送る"""
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(None, tool_registry.execute, calls)
+        if coalescer is not None:
+            await coalescer.push(response, False)
+        else:
+            await client_to_server_queue.put(response)
+
+    def transform_server_frame(message: Message) -> List[Message]:
+        """登録済みのツールの呼び出しをプロキシで処理し、音声をバイナリPCMに変換"""
+        if tool_registry is not None and is_tool_call(message):
+            calls, message = tool_registry.split_tool_call(message)
+            if calls:
+                spawn(answer_tool_calls(calls))
+            if message is None:
+                return []
+        if transform_audio_frame is None:
+            return [message]
+        frames = transform_audio_frame(message)
+        if recorder is not None:
+            # クライアント向けにデコードしたPCMを録音にも使う
+            recorder.submit(recorder.record_server_frame, message, frames)
+        return frames
+
+    def transform_client_frame(message: Message) -> List[Message]:
+        """バイナリPCMの包み直し、setupProfile のsetupへの置き換え、VADによる無音の間引き"""
+        frames = client_to_server_frames(message) if binary_pcm else [message]
+        if frames and is_setup_profile_request(frames[0]):
+            try:
+                return [setup_profiles.resolve(frames[0])]
+            except SetupProfileError as e:
+                logger.warning(f"Rejected setup profile request: {e}")
+                spawn(client_websocket.close(code=1008, reason=str(e)[:120]))
+                return []
+        if vad_gate is not None:
+            return [gated for frame in frames for gated in vad_gate.process(frame)]
+        return frames
+
+    def on_server_control(marker: str, message: Message) -> None:
+        log_control_frame(marker, message)
+        session_metrics.control_frame(marker)
+
+    def on_client_frame(message: Message) -> None:
+        session_metrics.client_frame(message)
+        if recorder is not None:
+            recorder.submit(recorder.record_client_frame, message)
+
+    def on_server_frame(message: Message) -> None:
+        session_metrics.server_frame(message)
+        # バイナリPCMのクライアントでは transform_server_frame で録音する
+        if recorder is not None and transform_audio_frame is None:
+            recorder.submit(recorder.record_server_frame, message)
 
-    async with websockets.connect(
-        SERVICE_URL, additional_headers=headers
-    ) as server_websocket:
-        client_to_server_task = asyncio.create_task(
-            proxy_task(client_websocket, server_websocket)
-        )
-        server_to_client_task = asyncio.create_task(
-            proxy_task(server_websocket, client_websocket)
-        )
-        await asyncio.gather(client_to_server_task, server_to_client_task)
+    try:
+        server_websocket = await open_upstream(bearer_token)
+        session_metrics.upstream_connected()
+        async with server_websocket:
+            client_to_server_task = asyncio.create_task(
+                passthrough_task(
+                    client_websocket,
+                    server_websocket,
+                    relay_queue=client_to_server_queue,
+                    audio_classifier=is_audio_input,
+                    on_frame=on_client_frame,
+                    coalescer=coalescer,
+                    transform=transform_client_frame
+                )
+            )
+            # ブラウザは event.data を JSON.parse するため、クライアントへはテキストで送る
+            # （jre-pcm16.v1 では音声だけバイナリで送る）
+            server_to_client_task = asyncio.create_task(
+                passthrough_task(
+                    server_websocket,
+                    client_websocket,
+                    as_text=not binary_pcm,
+                    transform=transform_server_frame if binary_pcm or tool_registry is not None else None,
+                    on_control=on_server_control,
+                    relay_queue=server_to_client_queue,
+                    on_frame=on_server_frame
+                )
+            )
+            await asyncio.gather(client_to_server_task, server_to_client_task)
+    finally:
+        for task in list(session_tasks):
+            task.cancel()
+        session_metrics.finish()
+        active_sessions.pop(session_id, None)
+        if vad_gate is not None:
+            vad_stats = vad_gate.get_stats()
+            logger.info(
+                f"[VAD] Session {session_id}: saved {vad_stats['frames_saved']}/{vad_stats['frames_in']} frames, "
+                f"{vad_stats['bytes_saved']}/{vad_stats['bytes_in']} bytes"
+            )
+        if recorder is not None:
+            # WAVの仕上げとアップロードはセッションの終了を待たせずにスレッドで行う
+            upload = asyncio.ensure_future(finish_recording(recorder, conversation_id))
+            _recording_uploads.add(upload)
+            upload.add_done_callback(_on_recording_uploaded)
+
+
+def _on_recording_uploaded(upload: asyncio.Future) -> None:
+    """録音のアップロードの完了（失敗した場合はファイルを残してログに出す）"""
+    _recording_uploads.discard(upload)
+    if not upload.cancelled() and upload.exception() is not None:
+        logger.error(f"[Recording] Failed to upload recording: {upload.exception()}")
+
+
+async def open_upstream(bearer_token: str):
+    """上流接続を取得（プールがあれば接続済みの上流を使い、なければその場で接続する）"""
+    pool = get_upstream_pool()
+    if pool:
+        return await pool.acquire()
+    return await websockets.connect(
+        SERVICE_URL, additional_headers=upstream_headers(bearer_token)
+    )
 
 
 async def proxy_task(
@@ -120,6 +405,176 @@ async def proxy_task(
     await server_websocket.close()
 
 
+def client_request_path(client_websocket: WebSocketCommonProtocol) -> str:
+    """クライアントの接続のリクエストのパス（クエリ文字列を含む。websockets / aiohttp のアダプター共通）"""
+    request = getattr(client_websocket, "request", None)
+    return getattr(request, "path", None) or getattr(client_websocket, "path", "") or ""
+
+
+def find_control_marker(message: Message) -> Optional[str]:
+    """
+    フレームの先頭と末尾だけを見て、制御メッセージのキーを探す（デコードしない）
+
+    Args:
+        message: 転送するフレーム
+
+    Returns:
+        見つかったキー（CONTROL_MARKERS のいずれか）。なければNone
+    """
+    if len(message) <= INSPECT_WINDOW * 2:
+        windows = (message,)
+    else:
+        windows = (message[:INSPECT_WINDOW], message[-INSPECT_WINDOW:])
+    for window in windows:
+        for marker in CONTROL_MARKERS:
+            key = marker.encode() if isinstance(window, bytes) else marker
+            if key in window:
+                return marker
+    return None
+
+
+def log_control_frame(marker: str, message: Message) -> None:
+    """制御メッセージをログに出力（DEBUG時のみ中身をデコードする）"""
+    if DEBUG:
+        logger.debug(f"control frame ({marker}): {json.loads(message)}")
+    else:
+        logger.info(f"control frame: {marker}")
+
+
+async def passthrough_task(
+    source_websocket: WebSocketCommonProtocol,
+    destination_websocket: WebSocketCommonProtocol,
+    as_text: bool = False,
+    on_control: Optional[Callable[[str, Message], None]] = None,
+    relay_queue: Optional[RelayQueue] = None,
+    audio_classifier: Optional[Callable[[Message], bool]] = None,
+    on_frame: Optional[Callable[[Message], None]] = None,
+    coalescer: Optional[AudioCoalescer] = None,
+    transform: Optional[Callable[[Message], List[Message]]] = None
+) -> None:
+    """
+    フレームをデコード・再シリアライズせずにそのまま転送
+
+    Args:
+        source_websocket: 受信側のWebSocket
+        destination_websocket: 送信側のWebSocket
+        as_text: バイナリフレームをテキストフレームとして送る（UTF-8のデコードのみ）
+        on_control: 制御メッセージ（setupComplete / toolCall / turnComplete）を受け取るコールバック
+        relay_queue: 送信キュー（指定した場合は受信と送信を別タスクで行う）
+        audio_classifier: 捨ててよい音声フレームか判定する関数（relay_queue 使用時）
+        on_frame: 受信したフレームごとに呼ぶコールバック（計測用）
+        coalescer: 入力音声をまとめてから relay_queue に入れる（relay_queue 使用時）
+        transform: 受信したフレームを送るフレームのリストに変換する関数（jre-pcm16.v1・setupProfile・ツール用）
+    """
+    writer_task = None
+    if relay_queue is not None:
+        writer_task = asyncio.create_task(drain_relay_queue(relay_queue, destination_websocket))
+
+    async def forward(frame: Message) -> bool:
+        """1フレームを送る（キューが閉じられていたらFalse）"""
+        if as_text and isinstance(frame, bytes):
+            frame = frame.decode("utf-8")
+        if relay_queue is None:
+            await destination_websocket.send(frame)
+            return True
+        is_audio = audio_classifier is not None and audio_classifier(frame)
+        if coalescer is not None:
+            return await coalescer.push(frame, is_audio)
+        return await relay_queue.put(frame, is_audio=is_audio)
+
+    try:
+        async for message in source_websocket:
+            # 検査・計測に失敗しても転送は止めない
+            try:
+                if on_frame is not None:
+                    on_frame(message)
+                if on_control is not None:
+                    marker = find_control_marker(message)
+                    if marker:
+                        on_control(marker, message)
+            except Exception as e:
+                logger.error(f"Error inspecting message: {e}")
+            try:
+                accepted = True
+                for frame in (transform(message) if transform is not None else (message,)):
+                    accepted = await forward(frame)
+                    if not accepted:
+                        break
+                if not accepted:
+                    # 送信先が閉じてキューが閉じられた
+                    logger.info("Destination closed. Stop forwarding.")
+                    break
+            except (ConnectionResetError, ConnectionClosed):
+                # 送信先が閉じたら転送をやめる（送信先の終了はもう一方のタスクが処理する）
+                logger.info("Destination closed. Stop forwarding.")
+                break
+            except Exception as e:
+                logger.error(f"Error forwarding message: {e}")
+    except ConnectionClosed as e:
+        logger.info(f"Source connection closed: {e}")
+
+    if writer_task is not None:
+        # 溜めた音声とキューに残ったフレームを送り切ってから閉じる
+        if coalescer is not None:
+            await coalescer.flush()
+        await relay_queue.close()
+        await writer_task
+
+    # 受信側のクローズコードを送信側にも伝えて閉じる
+    await destination_websocket.close(*close_args(source_websocket))
+
+
+async def drain_relay_queue(
+    relay_queue: RelayQueue, destination_websocket: WebSocketCommonProtocol
+) -> None:
+    """送信キューのフレームを順に送信先へ送る（送信先が閉じたらキューを閉じる）"""
+    while True:
+        message = await relay_queue.get()
+        if message is None:
+            return
+        try:
+            await destination_websocket.send(message)
+        except (ConnectionResetError, ConnectionClosed):
+            logger.info("Destination closed. Stop forwarding.")
+            await relay_queue.close()
+            return
+        except Exception as e:
+            logger.error(f"Error forwarding message: {e}")
+
+
+def get_proxy_stats() -> Dict[str, Any]:
+    """プロキシの状態（セッションごとの送信キューと計測、上流接続のプール、トークン）を取得"""
+    return {
+        "mode": PROXY_MODE,
+        "sessions": [
+            {
+                "session_id": session_id,
+                **{name: item.get_stats() for name, item in session.items()},
+            }
+            for session_id, session in active_sessions.items()
+        ],
+        "upstream_pool": upstream_pool.get_stats() if upstream_pool else None,
+        "token": proxy.token_manager.get_stats() if proxy.token_manager else None,
+        "setup_profiles": setup_profiles.get_stats(),
+        "tools": tool_registry.get_stats() if tool_registry else None,
+    }
+
+
+def close_args(websocket) -> tuple:
+    """
+    閉じたWebSocketのクローズコードと理由を、もう一方の close に渡せる形で取得
+
+    1005（コードなし）/ 1006（異常終了）などは送信できないため、1000 / 1011 に置き換える
+    """
+    code = getattr(websocket, "close_code", None)
+    reason = getattr(websocket, "close_reason", None) or ""
+    if code is None or code == 1005:
+        return 1000, reason
+    if code in (1006, 1015) or not (1000 <= code <= 4999):
+        return 1011, reason
+    return code, reason
+
+
 async def main() -> None:
     """WebSocketサーバーを起動"""
     if not PROJECT_ID:
@@ -129,7 +584,8 @@ async def main() -> None:
     logger.info(f"Project ID: {PROJECT_ID}")
     logger.info(f"Starting WebSocket server on port {PORT}...")
     
-    async with websockets.serve(handle_client, "0.0.0.0", PORT):
+    async with websockets.serve(handle_client, "0.0.0.0", PORT, subprotocols=[PCM_SUBPROTOCOL]):
+        await start_upstream_pool()
         logger.info(f"WebSocket server running on ws://localhost:{PORT}")
         await asyncio.Future()  # 永続的に実行
 
@@ -0,0 +1,112 @@
+"""
+/ws のバイナリPCMサブプロトコル（jre-pcm16.v1）
+通常のクライアントはマイクのPCMをbase64にしてJSON（realtime_input）で包んで送るため、
+上りのバイト数が約33%増え、性能の低いキオスク端末ではエンコードのCPUもかかる。
+このサブプロトコルでは音声をバイナリフレームのままやり取りし、
+Geminiとの間のJSON・base64への変換はプロキシ側で行う
+
+接続:
+    new WebSocket(url, 'jre-pcm16.v1')
+    （Sec-WebSocket-Protocol: jre-pcm16.v1。サーバーが応じなければ従来のJSONのまま）
+
+クライアント → サーバー:
+    バイナリフレーム: 16kHz / 16bit リトルエンディアン / モノラルのPCM（長さは任意、偶数バイト）
+                      プロキシが realtime_input.media_chunks（audio/pcm;rate=16000）に包んで送る
+    テキストフレーム: 従来どおりのJSON（setup / client_content / tool_response など）をそのまま送る
+
+サーバー → クライアント:
+    バイナリフレーム: モデルの音声（serverContent.modelTurn.parts[].inlineData）を
+                      base64デコードしたPCM（Geminiの出力は24kHz / 16bit / モノラル）
+    テキストフレーム: 音声以外のJSON。音声と同じメッセージに含まれていた内容
+                      （テキスト・turnComplete など）は、音声のバイナリフレームの後に
+                      inlineData を除いたJSONとして送る
+"""
+import json
+import base64
+from typing import List, Union
+
+Message = Union[str, bytes]
+
+PCM_SUBPROTOCOL = 'jre-pcm16.v1'
+
+# クライアントから受け取るPCMの形式
+CLIENT_PCM_MIME_TYPE = 'audio/pcm;rate=16000'
+
+# サーバーからの音声フレームを判定するキー（serverContent.modelTurn.parts の先頭に来る）
+SERVER_AUDIO_MARKER = 'inlineData'
+SERVER_AUDIO_INSPECT_WINDOW = 128
+
+
+def wrap_client_audio(pcm: bytes) -> str:
+    """
+    クライアントからのPCMを realtime_input のJSONに包む
+
+    Args:
+        pcm: 16kHz / 16bit モノラルのPCM
+
+    Returns:
+        Geminiに送るJSON文字列
+    """
+    return json.dumps({
+        'realtime_input': {
+            'media_chunks': [{
+                'mime_type': CLIENT_PCM_MIME_TYPE,
+                'data': base64.b64encode(pcm).decode('ascii'),
+            }]
+        }
+    })
+
+
+def client_to_server_frames(message: Message) -> List[Message]:
+    """
+    クライアントからのフレームを上流に送るフレームに変換
+
+    Args:
+        message: クライアントからのフレーム
+
+    Returns:
+        上流に送るフレームのリスト（空のバイナリフレームは捨てる）
+    """
+    if isinstance(message, bytes):
+        return [wrap_client_audio(message)] if message else []
+    return [message]
+
+
+def server_to_client_frames(message: Message) -> List[Message]:
+    """
+    上流からのフレームをクライアントに送るフレームに変換
+    音声を含むメッセージだけデコードし、それ以外はテキストにするだけで中身は変えない
+
+    Args:
+        message: 上流からのフレーム
+
+    Returns:
+        クライアントに送るフレームのリスト（音声はbytes、それ以外はstr）
+    """
+    text = message.decode('utf-8') if isinstance(message, bytes) else message
+    if SERVER_AUDIO_MARKER not in text[:SERVER_AUDIO_INSPECT_WINDOW]:
+        return [text]
+
+    data = json.loads(text)
+    model_turn = data.get('serverContent', {}).get('modelTurn', {})
+    frames: List[Message] = []
+    rest = []
+    for part in model_turn.get('parts', []):
+        inline_data = part.get('inlineData') if isinstance(part, dict) else None
+        if inline_data and str(inline_data.get('mimeType', '')).startswith('audio/pcm'):
+            frames.append(base64.b64decode(inline_data.get('data', '')))
+        else:
+            rest.append(part)
+    if not frames:
+        return [text]
+
+    # 音声以外の内容が残っていれば、音声の後にJSONで送る
+    if rest:
+        model_turn['parts'] = rest
+    else:
+        del data['serverContent']['modelTurn']
+    if not data['serverContent']:
+        del data['serverContent']
+    if data:
+        frames.append(json.dumps(data))
+    return frames
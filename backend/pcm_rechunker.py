@@ -0,0 +1,186 @@
+"""
+モデルの音声を一定の長さのPCMフレームに分け直す（サーバー → クライアント）
+Geminiの音声チャンクは長さがまちまち（数十ms〜数百ms）なため、クライアントの再生用の
+ワークレットは最大のチャンクに合わせてバッファを持つ必要がある。jre-pcm16.v1 のクライアントに、
+PROXY_OUTPUT_FRAME_MS ごとの同じ長さのバイナリフレームで送り、固定長のフレームのリングバッファで
+受けられるようにする
+
+- 使い回すリングバッファに溜め、フレームの長さに達した分だけ送る
+- turnComplete では端数を無音で埋めて1フレームとして送る（どのフレームも同じ長さ）
+- interrupted（ユーザーの割り込み）では端数を捨てる
+- turnComplete / interrupted は serverContent のキーで判定する（書き起こしの本文では反応しない）
+"""
+import os
+import json
+from typing import List, Optional, Tuple, Union
+
+from pcm_protocol import server_to_client_frames
+
+Message = Union[str, bytes]
+
+# 送るフレームの長さ（ミリ秒、0で分け直さない）
+PROXY_OUTPUT_FRAME_MS = float(os.getenv('PROXY_OUTPUT_FRAME_MS', '0'))
+
+# Geminiの出力音声（24kHz / 16bit / モノラル）
+OUTPUT_SAMPLE_RATE = 24000
+OUTPUT_BYTES_PER_SAMPLE = 2
+
+# 溜めた音声を捨てる・送り切る serverContent のキー
+INTERRUPTED_KEY = 'interrupted'
+TURN_COMPLETE_KEY = 'turnComplete'
+
+
+def server_content_signal(frame: Union[str, bytes], keys: Tuple[str, ...]) -> Optional[str]:
+    """
+    音声以外のフレームの serverContent に、指定したキーのどれかがあるか判定
+
+    キー名を含まないフレームはデコードせず、含む場合だけ serverContent のキーを確認する
+
+    Args:
+        frame: 上流からの音声以外のフレーム
+        keys: 確認するキー（先に書いたものを優先）
+
+    Returns:
+        値が空でない最初のキー（どれもなければNone）
+    """
+    quoted = [f'"{key}"' for key in keys]
+    if isinstance(frame, bytes):
+        quoted = [key.encode() for key in quoted]
+    if not any(key in frame for key in quoted):
+        return None
+    try:
+        content = json.loads(frame).get('serverContent')
+    except (ValueError, AttributeError):
+        return None
+    if not isinstance(content, dict):
+        return None
+    for key in keys:
+        if content.get(key):
+            return key
+    return None
+
+
+def turn_signal(frame: Union[str, bytes]) -> Optional[str]:
+    """
+    音声以外のフレームが割り込み・ターンの終了か判定
+
+    Args:
+        frame: 上流からの音声以外のフレーム
+
+    Returns:
+        INTERRUPTED_KEY / TURN_COMPLETE_KEY（どちらでもなければNone）
+    """
+    return server_content_signal(frame, (INTERRUPTED_KEY, TURN_COMPLETE_KEY))
+
+
+class PcmRingBuffer:
+    """固定長のフレームを取り出すためのリングバッファ（足りなければ倍に広げる）"""
+
+    def __init__(self, frame_bytes: int, capacity: int = 0):
+        """
+        初期化
+        Args:
+            frame_bytes: 取り出すフレームのバイト数
+            capacity: 最初の容量（バイト、省略時は64フレーム分）
+        """
+        self.frame_bytes = frame_bytes
+        self._ring = bytearray(capacity or frame_bytes * 64)
+        self._start = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def push(self, pcm: bytes) -> List[bytes]:
+        """
+        PCMを書き込み、そろったフレームを取り出す
+
+        Args:
+            pcm: 追加するPCM
+
+        Returns:
+            frame_bytes ずつのフレームのリスト
+        """
+        if self._size + len(pcm) > len(self._ring):
+            self._grow(self._size + len(pcm))
+        capacity = len(self._ring)
+        end = (self._start + self._size) % capacity
+        first = min(len(pcm), capacity - end)
+        self._ring[end:end + first] = pcm[:first]
+        self._ring[:len(pcm) - first] = pcm[first:]
+        self._size += len(pcm)
+
+        frames = []
+        while self._size >= self.frame_bytes:
+            frames.append(self._read(self.frame_bytes))
+        return frames
+
+    def flush(self) -> List[bytes]:
+        """端数を無音で埋めて1フレームとして取り出す（空なら何も返さない）"""
+        if not self._size:
+            return []
+        rest = self._read(self._size)
+        return [rest + bytes(self.frame_bytes - len(rest))]
+
+    def clear(self) -> None:
+        """端数を捨てる"""
+        self._start = 0
+        self._size = 0
+
+    def _read(self, length: int) -> bytes:
+        capacity = len(self._ring)
+        first = min(length, capacity - self._start)
+        data = bytes(self._ring[self._start:self._start + first])
+        if first < length:
+            data += bytes(self._ring[:length - first])
+        self._start = (self._start + length) % capacity
+        self._size -= length
+        return data
+
+    def _grow(self, required: int) -> None:
+        capacity = len(self._ring)
+        while capacity < required:
+            capacity *= 2
+        pending = self._read(self._size) if self._size else b''
+        self._ring = bytearray(capacity)
+        self._ring[:len(pending)] = pending
+        self._start = 0
+        self._size = len(pending)
+
+
+class FramedAudioOutput:
+    """上流からのフレームを、jre-pcm16.v1 の固定長の音声フレームとJSONに変換する"""
+
+    def __init__(self, frame_ms: float = PROXY_OUTPUT_FRAME_MS, sample_rate: int = OUTPUT_SAMPLE_RATE):
+        """
+        初期化
+        Args:
+            frame_ms: フレームの長さ（ミリ秒）
+            sample_rate: 出力音声のサンプリングレート
+        """
+        samples = int(sample_rate * frame_ms / 1000)
+        self.buffer = PcmRingBuffer(samples * OUTPUT_BYTES_PER_SAMPLE)
+
+    def process(self, message: Message) -> List[Message]:
+        """
+        上流からのフレームを、クライアントに送るフレームに変換
+
+        Args:
+            message: 上流からのフレーム
+
+        Returns:
+            クライアントに送るフレームのリスト（音声は固定長のbytes、それ以外はstr）
+        """
+        frames: List[Message] = []
+        for frame in server_to_client_frames(message):
+            if isinstance(frame, bytes):
+                frames.extend(self.buffer.push(frame))
+                continue
+            # interrupted では溜めた音声を捨て、turnComplete ではそれより前に送り切る
+            signal = turn_signal(frame)
+            if signal == INTERRUPTED_KEY:
+                self.buffer.clear()
+            elif signal == TURN_COMPLETE_KEY:
+                frames.extend(self.buffer.flush())
+            frames.append(frame)
+        return frames
@@ -0,0 +1,240 @@
+"""
+Geminiプロキシのセッションごとの計測
+会話の1ターンのどこで時間がかかっているかを見るため、セッションごとに
+接続時間・setupComplete までの時間・ターンの応答時間・転送量を記録し、
+ワーカー全体でヒストグラムに集計する（Prometheusのテキスト形式で取得できる）
+
+ターンの応答時間は、お客様の発話の終わりから、サーバーからの最初の音声（inlineData）を
+受け取るまでの時間とする。キオスクは無音の間もマイクの音声を送り続けるため、入力音声の
+フレームではなく、次のどちらかを発話の終わりとする
+- VAD（PROXY_VAD_ENABLED=true）: 最後に発話と判定した入力音声のフレームを受け取った時点
+- VADなし: 最後に inputTranscription（入力音声の文字起こし）を受け取った時点
+  （文字起こしの遅れの分だけ実際より短くなる）
+turnComplete までの時間も同じ時点を起点にする。turnComplete / interrupted は
+serverContent のキーで判定する（pcm_rechunker.turn_signal と同じ）
+
+集計はワーカー（プロセス）ごと。gunicornで複数ワーカーを動かす場合、取得した値は
+リクエストを受けたワーカーの分だけになる
+"""
+import time
+import bisect
+from typing import Dict, Any, List, Optional, Sequence, Tuple, Union
+
+from pcm_protocol import SERVER_AUDIO_MARKER, SERVER_AUDIO_INSPECT_WINDOW
+from pcm_rechunker import INTERRUPTED_KEY, TURN_COMPLETE_KEY, server_content_signal
+
+Message = Union[str, bytes]
+
+# ヒストグラムのバケット上限
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+DURATION_BUCKETS_S = (10, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+BYTES_BUCKETS = (1e4, 1e5, 1e6, 5e6, 1e7, 5e7, 1e8)
+FRAMES_BUCKETS = (10, 100, 500, 1000, 5000, 10000, 50000)
+
+DIRECTIONS = ('client_to_server', 'server_to_client')
+
+# 発話の終わりの目安にする serverContent のキー（VADなしの場合）
+INPUT_TRANSCRIPTION_KEY = 'inputTranscription'
+
+
+class Histogram:
+    """累積バケットのヒストグラム（Prometheusのhistogramと同じ形）"""
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float]):
+        """
+        初期化
+        Args:
+            name: メトリクス名
+            help_text: 説明
+            buckets: バケットの上限（昇順）
+        """
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """値を1つ記録"""
+        self._counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """バケットごとの累積件数（最後は +Inf）"""
+        result = []
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self._counts):
+            total += count
+            result.append(('+Inf' if bound == float('inf') else f'{bound:g}', total))
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        """件数・平均・累積バケットを取得"""
+        return {
+            'count': self.count,
+            'mean': round(self.sum / self.count, 1) if self.count else None,
+            'buckets': dict(self.cumulative()),
+        }
+
+
+class ProxyMetrics:
+    """ワーカー全体の集計"""
+
+    def __init__(self):
+        self.histograms: Dict[str, Histogram] = {}
+        for name, help_text, buckets in (
+            ('connect_ms', 'Time to obtain a connected upstream WebSocket', LATENCY_BUCKETS_MS),
+            ('setup_complete_ms', 'Time from session start to setupComplete', LATENCY_BUCKETS_MS),
+            ('turn_latency_ms', 'End of user speech to first server audio chunk', LATENCY_BUCKETS_MS),
+            ('turn_complete_ms', 'End of user speech to turnComplete', LATENCY_BUCKETS_MS),
+            ('session_duration_seconds', 'Session duration', DURATION_BUCKETS_S),
+        ):
+            self.histograms[name] = Histogram(name, help_text, buckets)
+        for direction in DIRECTIONS:
+            self.histograms[f'{direction}_bytes'] = Histogram(
+                f'{direction}_bytes', f'Bytes per session ({direction})', BYTES_BUCKETS
+            )
+            self.histograms[f'{direction}_frames'] = Histogram(
+                f'{direction}_frames', f'Frames per session ({direction})', FRAMES_BUCKETS
+            )
+        self.sessions_started = 0
+        self.active_sessions = 0
+
+    def observe(self, name: str, value: float) -> None:
+        self.histograms[name].observe(value)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """JSON用の集計結果"""
+        return {
+            'sessions_started': self.sessions_started,
+            'active_sessions': self.active_sessions,
+            **{name: histogram.get_stats() for name, histogram in self.histograms.items()},
+        }
+
+    def render_prometheus(self, prefix: str = 'gemini_proxy') -> str:
+        """Prometheusのテキスト形式で出力"""
+        lines = [
+            f'# HELP {prefix}_sessions_started_total Sessions started',
+            f'# TYPE {prefix}_sessions_started_total counter',
+            f'{prefix}_sessions_started_total {self.sessions_started}',
+            f'# HELP {prefix}_active_sessions Sessions in progress',
+            f'# TYPE {prefix}_active_sessions gauge',
+            f'{prefix}_active_sessions {self.active_sessions}',
+        ]
+        for histogram in self.histograms.values():
+            name = f'{prefix}_{histogram.name}'
+            lines.append(f'# HELP {name} {histogram.help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for bound, count in histogram.cumulative():
+                lines.append(f'{name}_bucket{{le="{bound}"}} {count}')
+            lines.append(f'{name}_sum {histogram.sum:g}')
+            lines.append(f'{name}_count {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+# ワーカーごとの集計
+proxy_metrics = ProxyMetrics()
+
+
+class SessionMetrics:
+    """1セッションの計測（終了時に proxy_metrics へ集計する）"""
+
+    def __init__(self, registry: ProxyMetrics = proxy_metrics, speech_from_vad: bool = False):
+        """
+        初期化
+        Args:
+            registry: 集計先
+            speech_from_vad: 発話の終わりを VoiceActivityGate から受け取る（user_speech）。
+                Falseの場合は inputTranscription を受け取った時点を使う
+        """
+        self.registry = registry
+        self.speech_from_vad = speech_from_vad
+        self.started_at = time.monotonic()
+        self.connect_ms: Optional[float] = None
+        self.setup_complete_ms: Optional[float] = None
+        self.turns = 0
+        self.bytes = {direction: 0 for direction in DIRECTIONS}
+        self.frames = {direction: 0 for direction in DIRECTIONS}
+        # 直近の発話の終わり（応答の最初の音声を受け取ったら、そのターンの起点にする）
+        self._speech_ended_at: Optional[float] = None
+        # 応答中のターンの起点
+        self._turn_anchor: Optional[float] = None
+        self._finished = False
+        registry.sessions_started += 1
+        registry.active_sessions += 1
+
+    def upstream_connected(self) -> None:
+        """上流接続を取得した"""
+        self.connect_ms = self._elapsed_ms(self.started_at)
+        self.registry.observe('connect_ms', self.connect_ms)
+
+    def client_frame(self, message: Message) -> None:
+        """クライアントからフレームを受け取った"""
+        self.bytes['client_to_server'] += len(message)
+        self.frames['client_to_server'] += 1
+
+    def user_speech(self) -> None:
+        """VADが入力音声のフレームを発話と判定した（VoiceActivityGate の on_speech）"""
+        self._speech_ended_at = time.monotonic()
+
+    def server_frame(self, message: Message) -> None:
+        """サーバーからフレームを受け取った"""
+        self.bytes['server_to_client'] += len(message)
+        self.frames['server_to_client'] += 1
+        head = message[:SERVER_AUDIO_INSPECT_WINDOW]
+        marker = SERVER_AUDIO_MARKER.encode() if isinstance(head, bytes) else SERVER_AUDIO_MARKER
+        if marker in head:
+            if self._turn_anchor is None and self._speech_ended_at is not None:
+                # 発話の後の最初の音声。起点は使い切る（発話のない次の応答は計測しない）
+                self._turn_anchor = self._speech_ended_at
+                self._speech_ended_at = None
+                self.registry.observe('turn_latency_ms', self._elapsed_ms(self._turn_anchor))
+            return
+        keys = (TURN_COMPLETE_KEY, INTERRUPTED_KEY)
+        if not self.speech_from_vad:
+            keys += (INPUT_TRANSCRIPTION_KEY,)
+        signal = server_content_signal(message, keys)
+        if signal == INPUT_TRANSCRIPTION_KEY:
+            self._speech_ended_at = time.monotonic()
+        elif signal == TURN_COMPLETE_KEY:
+            if self._turn_anchor is not None:
+                self.registry.observe('turn_complete_ms', self._elapsed_ms(self._turn_anchor))
+            self._turn_anchor = None
+            self.turns += 1
+        elif signal == INTERRUPTED_KEY:
+            # 割り込まれた応答は turnComplete までの時間を計測しない
+            self._turn_anchor = None
+
+    def control_frame(self, marker: str) -> None:
+        """サーバーからの制御メッセージ（setupComplete など。ターンの終了は server_frame で判定する）"""
+        if marker == 'setupComplete' and self.setup_complete_ms is None:
+            self.setup_complete_ms = self._elapsed_ms(self.started_at)
+            self.registry.observe('setup_complete_ms', self.setup_complete_ms)
+
+    def finish(self) -> None:
+        """セッション終了時に集計する（2回目以降は何もしない）"""
+        if self._finished:
+            return
+        self._finished = True
+        self.registry.active_sessions -= 1
+        self.registry.observe('session_duration_seconds', time.monotonic() - self.started_at)
+        for direction in DIRECTIONS:
+            self.registry.observe(f'{direction}_bytes', self.bytes[direction])
+            self.registry.observe(f'{direction}_frames', self.frames[direction])
+
+    def get_stats(self) -> Dict[str, Any]:
+        """実行中のセッションの状態"""
+        return {
+            'duration_seconds': round(time.monotonic() - self.started_at, 1),
+            'connect_ms': self.connect_ms,
+            'setup_complete_ms': self.setup_complete_ms,
+            'turns': self.turns,
+            'bytes': dict(self.bytes),
+            'frames': dict(self.frames),
+        }
+
+    @staticmethod
+    def _elapsed_ms(since: float) -> float:
+        return round((time.monotonic() - since) * 1000, 1)
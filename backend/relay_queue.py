@@ -0,0 +1,148 @@
+"""
+プロキシの方向ごとの上限付き送信キュー
+受信と送信を分け、送信先が遅い場合でも受信側を止めずに済むようにする
+
+- 入力音声（realtime_input）は、キューに入ってから max_audio_age 秒を超えたものを
+  送らずに捨てる（遅れた音声を送って会話の遅延を増やすより、捨てる方がよい）
+- キューが満杯の場合、音声なら最も古い音声を捨てて空ける。制御メッセージ
+  （setup / client_content / toolResponse など）は捨てずに空きを待つ
+- max_audio_age が None のキューは何も捨てない（満杯の間は受信側が待つ）
+"""
+import os
+import time
+import asyncio
+from collections import deque
+from typing import Deque, Dict, Any, Optional, Tuple, Union
+
+Message = Union[str, bytes]
+
+# キューの上限（フレーム数）と、入力音声を捨てるまでの時間（ミリ秒）
+RELAY_QUEUE_SIZE = int(os.getenv('RELAY_QUEUE_SIZE', '32'))
+RELAY_MAX_AUDIO_AGE_MS = float(os.getenv('RELAY_MAX_AUDIO_AGE_MS', '2000'))
+
+# 入力音声のフレームの最上位のキー（フレームの先頭だけを見る）
+AUDIO_INPUT_KEYS = ('"realtime_input"', '"realtimeInput"')
+AUDIO_INPUT_KEYS_BYTES = tuple(key.encode() for key in AUDIO_INPUT_KEYS)
+AUDIO_INSPECT_WINDOW = 64
+
+
+def is_audio_input(message: Message) -> bool:
+    """
+    クライアントからの入力音声フレームか判定（デコードしない）
+
+    最初のキーが realtime_input のフレームだけを音声とする（キュー・VAD・録音で捨ててよい）。
+    setup の realtime_input_config など、キー名を含むだけのフレームは音声としない
+
+    Args:
+        message: クライアントからのフレーム
+
+    Returns:
+        realtime_input のフレームならTrue
+    """
+    head = message[:AUDIO_INSPECT_WINDOW].lstrip()
+    if head[:1] not in ('{', b'{'):
+        return False
+    keys = AUDIO_INPUT_KEYS_BYTES if isinstance(head, bytes) else AUDIO_INPUT_KEYS
+    return head[1:].lstrip().startswith(keys)
+
+
+class RelayQueue:
+    """音声だけを捨てられる上限付きのFIFOキュー"""
+
+    def __init__(
+        self,
+        name: str,
+        max_frames: int = RELAY_QUEUE_SIZE,
+        max_audio_age: Optional[float] = None
+    ):
+        """
+        初期化
+        Args:
+            name: 方向の名前（統計情報用）
+            max_frames: キューの上限（フレーム数）
+            max_audio_age: 音声を捨てるまでの秒数（Noneの場合は何も捨てない）
+        """
+        self.name = name
+        self.max_frames = max_frames
+        self.max_audio_age = max_audio_age
+        self._frames: Deque[Tuple[Message, bool, float]] = deque()
+        self._condition = asyncio.Condition()
+        self._closed = False
+        self._stats = {
+            'enqueued': 0,
+            'sent': 0,
+            'dropped_stale': 0,
+            'dropped_overflow': 0,
+            'max_depth': 0,
+        }
+
+    async def put(self, message: Message, is_audio: bool = False) -> bool:
+        """
+        フレームをキューに入れる
+
+        Args:
+            message: フレーム
+            is_audio: 捨ててよい音声フレームか
+
+        Returns:
+            キューに入れた場合はTrue（閉じられていた場合はFalse）
+        """
+        async with self._condition:
+            while len(self._frames) >= self.max_frames and not self._closed:
+                if self.max_audio_age is not None and is_audio and self._drop_oldest_audio():
+                    break
+                await self._condition.wait()
+            if self._closed:
+                return False
+            self._frames.append((message, is_audio, time.monotonic()))
+            self._stats['enqueued'] += 1
+            self._stats['max_depth'] = max(self._stats['max_depth'], len(self._frames))
+            self._condition.notify_all()
+            return True
+
+    async def get(self) -> Optional[Message]:
+        """
+        次に送るフレームを取り出す（古くなった音声は飛ばす）
+
+        Returns:
+            フレーム（閉じられて空になった場合はNone）
+        """
+        async with self._condition:
+            while True:
+                while not self._frames and not self._closed:
+                    await self._condition.wait()
+                if not self._frames:
+                    return None
+                message, is_audio, enqueued_at = self._frames.popleft()
+                self._condition.notify_all()
+                if (
+                    is_audio
+                    and self.max_audio_age is not None
+                    and time.monotonic() - enqueued_at > self.max_audio_age
+                ):
+                    self._stats['dropped_stale'] += 1
+                    continue
+                self._stats['sent'] += 1
+                return message
+
+    async def close(self) -> None:
+        """新しいフレームを受け付けないようにする（残りのフレームは get で取り出せる）"""
+        async with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """キューの深さとカウンタを取得"""
+        return {
+            'depth': len(self._frames),
+            **self._stats,
+        }
+
+    def _drop_oldest_audio(self) -> bool:
+        """キュー内の最も古い音声フレームを捨てる（音声がなければFalse）"""
+        for index, (_, is_audio, _) in enumerate(self._frames):
+            if is_audio:
+                del self._frames[index]
+                self._stats['dropped_overflow'] += 1
+                return True
+        return False
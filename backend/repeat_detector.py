@@ -0,0 +1,179 @@
+"""
+TTS音声の繰り返し検出
+Chirp3が同じ発話を2回以上続けて返すことがあるため、FFTによる自己相関で
+繰り返しの周期を求め、1周期分だけを残す（O(n log n)）
+
+- 繰り返し回数は2回/3回に限らない
+- 末尾が周期の途中で終わる（部分的な繰り返し）場合も検出する
+"""
+from dataclasses import dataclass, asdict
+from typing import Tuple, Dict, Any
+
+import numpy as np
+from scipy import fft as sp_fft
+
+
+@dataclass
+class RepeatDetection:
+    """繰り返し検出の診断情報"""
+    detected: bool
+    period_samples: int
+    total_samples: int
+    repeat_count: float
+    correlation: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class RepeatDetector:
+    """FFT自己相関による繰り返し検出"""
+
+    def __init__(
+        self,
+        sample_rate: int = 24000,
+        min_period: float = 0.5,
+        min_tail_ratio: float = 0.5,
+        threshold: float = 0.95,
+        decimation: int = 8
+    ):
+        """
+        初期化
+        Args:
+            sample_rate: サンプリングレート
+            min_period: 繰り返しとみなす最短の周期（秒）
+            min_tail_ratio: 2回目以降の長さが周期に対してこの比率以上なら繰り返しとみなす
+                （0.5の場合、1.5回分以上続いていれば検出する）
+            threshold: 繰り返しと判定する正規化相互相関のしきい値
+            decimation: 粗い探索で使う間引き率（探索後に元のレートで周期を補正する）
+        """
+        self.sample_rate = sample_rate
+        self.min_period_samples = int(min_period * sample_rate)
+        self.min_tail_ratio = min_tail_ratio
+        self.threshold = threshold
+        self.decimation = max(1, decimation)
+
+    def detect(self, samples: np.ndarray) -> RepeatDetection:
+        """
+        繰り返しの周期を検出
+
+        Args:
+            samples: 音声データ（float32推奨）
+
+        Returns:
+            検出結果
+        """
+        total = len(samples)
+        not_found = RepeatDetection(False, total, total, 1.0, 0.0)
+        # 最短周期 + その min_tail_ratio 分の長さがなければ繰り返しになり得ない
+        if total < self.min_period_samples * (1 + self.min_tail_ratio):
+            return not_found
+
+        # 1. 間引いた信号の正規化自己相関から周期の候補を求める
+        q = self.decimation
+        coarse = _decimate(samples, q)
+        n = len(coarse)
+        # 重なり（周期以降の長さ）が周期 × min_tail_ratio 以上あるラグだけを対象にする
+        min_lag = max(1, self.min_period_samples // q)
+        max_lag = int(n / (1 + self.min_tail_ratio))
+        if max_lag < min_lag:
+            return not_found
+        ncc = _normalized_autocorrelation(coarse, min_lag, max_lag)
+
+        # 粗い探索のしきい値は間引きによる誤差を見込んで緩めにしている
+        candidates = np.flatnonzero(ncc >= self.threshold * 0.9) + min_lag
+        if len(candidates) == 0:
+            return not_found
+
+        # 2. 候補のうち最短の周期（周期の整数倍も相関が高くなるため）を元のレートで補正する
+        for coarse_lag in _first_peaks(candidates, ncc, min_lag, limit=3):
+            lag, correlation = self._refine(samples, coarse_lag * q, q)
+            if correlation >= self.threshold and (total - lag) >= lag * self.min_tail_ratio:
+                return RepeatDetection(
+                    detected=True,
+                    period_samples=lag,
+                    total_samples=total,
+                    repeat_count=total / lag,
+                    correlation=correlation
+                )
+        return not_found
+
+    def trim(self, samples: np.ndarray) -> Tuple[np.ndarray, RepeatDetection]:
+        """
+        繰り返しを除いた1周期分の音声と診断情報を返す
+
+        Args:
+            samples: 音声データ
+
+        Returns:
+            (1周期分の音声（ビュー）, 検出結果)
+        """
+        detection = self.detect(samples)
+        if detection.detected:
+            return samples[:detection.period_samples], detection
+        return samples, detection
+
+    def _refine(self, samples: np.ndarray, approx_lag: int, radius: int) -> Tuple[int, float]:
+        """
+        粗い周期の前後を元のレートで調べ、相関が最大のラグとその相関係数を返す
+        ラグの選択は重なりの先頭1秒分だけで行い、相関係数は重なり全体で計算する
+        """
+        total = len(samples)
+        lags = range(max(1, approx_lag - radius), min(total - 1, approx_lag + radius) + 1)
+        window = min(self.sample_rate, total - lags[-1])
+        best_lag = max(lags, key=lambda lag: _pearson(samples[:window], samples[lag:lag + window]))
+        return best_lag, _pearson(samples[:total - best_lag], samples[best_lag:])
+
+
+def _decimate(samples: np.ndarray, q: int) -> np.ndarray:
+    """q サンプルごとの和で間引く（簡易なローパスを兼ねる）。平均は0に揃える"""
+    n = len(samples) // q
+    coarse = samples[0:n * q:q].astype(np.float32)
+    for offset in range(1, q):
+        coarse += samples[offset:n * q:q]
+    coarse -= coarse.mean(dtype=np.float64)
+    return coarse
+
+
+def _normalized_autocorrelation(x: np.ndarray, min_lag: int, max_lag: int) -> np.ndarray:
+    """
+    FFTでラグ min_lag〜max_lag の正規化自己相関を計算
+    ラグkでは x[:n-k] と x[k:] の重なり部分のエネルギーで正規化する
+    """
+    n = len(x)
+    # 巡回相関の折り返しが max_lag までに届かない長さにゼロ詰めする
+    size = sp_fft.next_fast_len(n + max_lag + 1, real=True)
+    spectrum = sp_fft.rfft(x, size)
+    spectrum *= spectrum.conj()
+    acf = sp_fft.irfft(spectrum, size)[min_lag:max_lag + 1]
+
+    # 重なり部分のエネルギー（累積和から O(n) で求める）
+    energy = np.empty(n + 1, dtype=np.float64)
+    energy[0] = 0.0
+    np.cumsum(np.square(x, dtype=np.float64), out=energy[1:])
+    lags = np.arange(min_lag, max_lag + 1)
+    denominator = energy[n - lags]            # sum(x[:n-k]^2)
+    denominator *= energy[n] - energy[lags]   # sum(x[k:]^2)
+    np.sqrt(denominator, out=denominator)
+    denominator[denominator <= 0] = np.inf
+    acf /= denominator
+    return acf
+
+
+def _first_peaks(candidates: np.ndarray, ncc: np.ndarray, offset: int, limit: int):
+    """しきい値を超えた連続区間ごとに相関が最大のラグを、短い順に最大 limit 個返す"""
+    breaks = np.flatnonzero(np.diff(candidates) > 1) + 1
+    for group in np.split(candidates, breaks)[:limit]:
+        yield int(group[np.argmax(ncc[group - offset])])
+
+
+def _pearson(a: np.ndarray, b: np.ndarray) -> float:
+    """同じ長さの2区間の相関係数（一時配列を作らずに内積で計算）"""
+    n = len(a)
+    sum_a = float(a.sum(dtype=np.float64))
+    sum_b = float(b.sum(dtype=np.float64))
+    var_a = float(np.dot(a, a)) - sum_a * sum_a / n
+    var_b = float(np.dot(b, b)) - sum_b * sum_b / n
+    if var_a <= 0 or var_b <= 0:
+        return 0.0
+    return (float(np.dot(a, b)) - sum_a * sum_b / n) / float(np.sqrt(var_a * var_b))
@@ -0,0 +1,337 @@
+"""
+プロキシでの会話音声の録音（セッションごとのステレオWAV）
+これまではブラウザが webm で録音し、base64 のJSONで /api/storage/upload-recording に送り直していた。
+プロキシは両方向の音声を中継しているため、セッションごとに左 = お客様（マイク）、
+右 = 駅員（モデル）のステレオWAVをディスクに少しずつ書き出し、終了時に Azure Storage に
+アップロードする（PROXY_RECORDING_ENABLED=true の場合）
+
+- 24kHz / 16bit / 2ch。マイクの音声（16kHz）は24kHzに線形補間する
+- マイクの音声は届いた時刻に合わせて置く（VADで間引く前の音声を録る）
+- モデルの音声は実時間より速く届くため、ブラウザの再生と同じく前の音声の後ろに続けて置き、
+  interrupted（ユーザーの割り込み）では再生されなかった分を消す
+- メモリ上には「書き出し待ち（RECORDING_WRITE_LAG 秒）＋先に届いたモデルの音声
+  （PROXY_RECORDING_MAX_AHEAD_S 秒）」の固定長の窓だけを持ち、それより先の音声は捨てる
+- リサンプリングとWAVの書き出しは録音用のスレッド（ワーカーで1本）で行い、イベントループでは
+  フレームが届いた時刻を記録して渡すだけにする（submit）。スレッドが1本のためフレームの順序は保たれる
+- jre-pcm16.v1 のクライアントには、クライアント向けに変換したPCMを受け取って録音する（base64を2回デコードしない）
+- アップロードには /api/storage と同じ StorageService（AZURE_STORAGE_CONNECTION_STRING）を使う。
+  未設定またはアップロードに失敗した場合はファイルを PROXY_RECORDING_DIR に残す
+- クライアントが /ws?conversation_id=... で会話記録のIDを渡した場合は、ブラウザからの
+  アップロードと同じ {conversation_id}_{時刻}.wav のBlob名にする（渡さない場合は proxy-{pid}-{セッション}）
+"""
+import os
+import re
+import time
+import wave
+import base64
+import asyncio
+import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Union
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from audio_coalescer import parse_audio_frame
+from relay_queue import is_audio_input
+from pcm_protocol import CLIENT_PCM_MIME_TYPE, server_to_client_frames
+from vad_gate import sample_rate_of
+
+try:
+    from services.storage_service import StorageService
+except ImportError:  # azure-storage-blob がない環境では録音をローカルに残すだけにする
+    StorageService = None
+
+logger = logging.getLogger(__name__)
+
+Message = Union[str, bytes]
+
+PROXY_RECORDING_ENABLED = os.getenv('PROXY_RECORDING_ENABLED', 'false').lower() == 'true'
+PROXY_RECORDING_DIR = os.getenv('PROXY_RECORDING_DIR') or os.path.join(tempfile.gettempdir(), 'proxy-recordings')
+PROXY_RECORDING_MAX_AHEAD_S = float(os.getenv('PROXY_RECORDING_MAX_AHEAD_S', '30'))
+PROXY_RECORDING_KEEP_FILES = os.getenv('PROXY_RECORDING_KEEP_FILES', 'false').lower() == 'true'
+AZURE_STORAGE_CONNECTION_STRING = os.getenv('AZURE_STORAGE_CONNECTION_STRING', '')
+AZURE_STORAGE_CONTAINER = os.getenv('AZURE_STORAGE_CONTAINER', 'recordings')
+
+# 録音のBlob名に使う会話記録のID（/ws のクエリパラメーター）と、受け付ける形式
+CONVERSATION_ID_PARAM = 'conversation_id'
+CONVERSATION_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+# 録音の形式（Geminiの出力音声に合わせる）
+RECORDING_SAMPLE_RATE = 24000
+CUSTOMER_CHANNEL = 0
+AGENT_CHANNEL = 1
+
+# 書き出すまで待つ時間（秒）。マイクのチャンクは録音された後に届くため、この分だけ遅らせて確定する
+RECORDING_WRITE_LAG = 1.0
+# ディスクへの書き出しの最小単位（秒）
+RECORDING_FLUSH_INTERVAL = 0.5
+
+# interrupted を判定するキー（フレームの先頭だけを見る）
+INTERRUPTED_MARKER = '"interrupted"'
+INTERRUPTED_INSPECT_WINDOW = 64
+
+_storage_service = None
+
+# 録音の処理を行うスレッド（セッションをまたいで1本にし、フレームの順序を保つ）
+RECORDING_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix='recording')
+
+
+def resample_pcm(pcm: bytes, source_rate: int, target_rate: int = RECORDING_SAMPLE_RATE) -> np.ndarray:
+    """16bit PCMをサンプリングレート変換（線形補間）"""
+    samples = np.frombuffer(pcm[:len(pcm) - len(pcm) % 2], dtype='<i2')
+    if source_rate == target_rate or len(samples) == 0:
+        return samples
+    count = int(len(samples) * target_rate / source_rate)
+    positions = np.arange(count) * (source_rate / target_rate)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.int16)
+
+
+class SessionRecorder:
+    """1セッションの両方向の音声を、ステレオWAVに少しずつ書き出す"""
+
+    def __init__(
+        self,
+        path: str,
+        max_ahead: float = PROXY_RECORDING_MAX_AHEAD_S,
+        sample_rate: int = RECORDING_SAMPLE_RATE,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        初期化
+        Args:
+            path: 書き出すWAVファイル
+            max_ahead: 実時間より先に届いたモデルの音声を保持する長さ（秒）
+            sample_rate: 録音のサンプリングレート
+            clock: 時刻を返す関数（秒）
+        """
+        self.path = path
+        self.sample_rate = sample_rate
+        self._clock = clock
+        self._started = clock()
+        self._wav = wave.open(path, 'wb')
+        self._wav.setnchannels(2)
+        self._wav.setsampwidth(2)
+        self._wav.setframerate(sample_rate)
+        # 書き出し待ちの窓（先頭が self._written の位置）
+        self._window = np.zeros((int((RECORDING_WRITE_LAG + max_ahead) * sample_rate), 2), dtype=np.int16)
+        self._written = 0
+        self._end = 0
+        self._cursors = [0, 0]
+        self._closed = False
+        # 録音用のスレッドで処理中のフレームが届いた時刻（submit で渡す）
+        self._frame_time: Optional[float] = None
+        self._stats = {
+            'customer_samples': 0,
+            'agent_samples': 0,
+            'dropped_samples': 0,
+            'interruptions': 0,
+        }
+
+    def submit(self, method: Callable[..., None], *args) -> None:
+        """
+        録音の処理を録音用のスレッドで行う（イベントループ上で呼ぶ）
+
+        Args:
+            method: record_client_frame / record_server_frame など
+            *args: method の引数
+        """
+        RECORDING_EXECUTOR.submit(self._run_at, self._clock(), method, args)
+
+    def record_client_frame(self, message: Message) -> None:
+        """クライアントからのフレームのうち、マイクの音声を録音する"""
+        if isinstance(message, bytes):
+            # jre-pcm16.v1 のバイナリフレーム
+            self.customer_audio(message, sample_rate_of(CLIENT_PCM_MIME_TYPE))
+            return
+        if not is_audio_input(message):
+            return
+        parsed = parse_audio_frame(message)
+        if parsed is None:
+            return
+        for chunk in parsed[2]:
+            mime_type = str(chunk.get('mime_type', chunk.get('mimeType', '')))
+            if mime_type.startswith('audio/pcm'):
+                self.customer_audio(base64.b64decode(chunk['data']), sample_rate_of(mime_type))
+
+    def record_server_frame(self, message: Message, frames: Optional[List[Message]] = None) -> None:
+        """
+        上流からのフレームのうち、モデルの音声と割り込みを録音に反映する
+
+        Args:
+            message: 上流からのフレーム
+            frames: message をクライアント向けに変換したフレーム（jre-pcm16.v1）。
+                    あればそのPCMを使い、base64をデコードし直さない
+        """
+        head = message[:INTERRUPTED_INSPECT_WINDOW]
+        if (INTERRUPTED_MARKER.encode() if isinstance(head, bytes) else INTERRUPTED_MARKER) in head:
+            self.agent_interrupted()
+            return
+        for frame in server_to_client_frames(message) if frames is None else frames:
+            if isinstance(frame, bytes):
+                self.agent_audio(frame)
+
+    def customer_audio(self, pcm: bytes, sample_rate: int) -> None:
+        """マイクの音声を、届いた時刻に録音し終わったものとして置く"""
+        samples = resample_pcm(pcm, sample_rate, self.sample_rate)
+        now = self._now()
+        self._place(CUSTOMER_CHANNEL, samples, max(self._cursors[CUSTOMER_CHANNEL], now - len(samples)))
+        self._stats['customer_samples'] += len(samples)
+        self._flush(now)
+
+    def agent_audio(self, pcm: bytes, sample_rate: int = RECORDING_SAMPLE_RATE) -> None:
+        """モデルの音声を、前の音声の再生が終わった時刻（過ぎていれば今）から置く"""
+        samples = resample_pcm(pcm, sample_rate, self.sample_rate)
+        now = self._now()
+        self._place(AGENT_CHANNEL, samples, max(self._cursors[AGENT_CHANNEL], now))
+        self._stats['agent_samples'] += len(samples)
+        self._flush(now)
+
+    def agent_interrupted(self) -> None:
+        """割り込みで再生されなかったモデルの音声を消す"""
+        now = max(self._now(), self._written)
+        if self._cursors[AGENT_CHANNEL] > now:
+            self._window[now - self._written:self._cursors[AGENT_CHANNEL] - self._written, AGENT_CHANNEL] = 0
+            self._cursors[AGENT_CHANNEL] = now
+        self._stats['interruptions'] += 1
+
+    def close(self) -> str:
+        """残りの音声を書き出してWAVを閉じる（書き出したファイルのパスを返す）"""
+        if not self._closed:
+            self._closed = True
+            self._write(max(self._end, self._now()) - self._written)
+            self._wav.close()
+        return self.path
+
+    def get_stats(self) -> Dict[str, Any]:
+        """録音した長さ（秒）、窓に収まらず捨てたサンプル数、メモリ上の窓の大きさ"""
+        return {
+            'path': self.path,
+            'seconds': round(max(self._end, self._written) / self.sample_rate, 1),
+            'customer_seconds': round(self._stats['customer_samples'] / self.sample_rate, 1),
+            'agent_seconds': round(self._stats['agent_samples'] / self.sample_rate, 1),
+            'dropped_samples': self._stats['dropped_samples'],
+            'interruptions': self._stats['interruptions'],
+            'window_bytes': self._window.nbytes,
+        }
+
+    def _run_at(self, at: float, method: Callable[..., None], args: tuple) -> None:
+        """フレームが届いた時刻を現在時刻として method を実行する（録音用のスレッド）"""
+        self._frame_time = at
+        try:
+            method(*args)
+        except Exception as e:
+            logger.error(f"[Recording] Failed to record frame: {e}")
+        finally:
+            self._frame_time = None
+
+    def _now(self) -> int:
+        now = self._clock() if self._frame_time is None else self._frame_time
+        return int((now - self._started) * self.sample_rate)
+
+    def _place(self, channel: int, samples: np.ndarray, position: int) -> None:
+        """サンプルを窓に書き込む（書き出し済みより前・窓より先の分は捨てる）"""
+        start = max(position, self._written)
+        end = min(position + len(samples), self._written + len(self._window))
+        if end > start:
+            self._window[start - self._written:end - self._written, channel] = samples[start - position:end - position]
+            self._end = max(self._end, end)
+        self._stats['dropped_samples'] += len(samples) - max(0, end - start)
+        self._cursors[channel] = position + len(samples)
+
+    def _flush(self, now: int) -> None:
+        """確定した（RECORDING_WRITE_LAG より前の）分を書き出す"""
+        count = now - int(RECORDING_WRITE_LAG * self.sample_rate) - self._written
+        if count >= RECORDING_FLUSH_INTERVAL * self.sample_rate:
+            self._write(count)
+
+    def _write(self, count: int) -> None:
+        """窓の先頭から count サンプル分を書き出し、窓を進める"""
+        while count > 0:
+            step = min(count, len(self._window))
+            self._wav.writeframesraw(self._window[:step].tobytes())
+            # 音声を書き込んだ範囲（self._end まで）だけを詰める。その先はすでに無音
+            used = max(step, self._end - self._written)
+            self._window[:used - step] = self._window[step:used]
+            self._window[used - step:used] = 0
+            self._written += step
+            count -= step
+
+
+def get_storage_service():
+    """録音のアップロード先（未設定・利用できない場合はNone）"""
+    global _storage_service
+    if _storage_service is None and StorageService is not None and AZURE_STORAGE_CONNECTION_STRING:
+        _storage_service = StorageService(
+            connection_string=AZURE_STORAGE_CONNECTION_STRING,
+            container_name=AZURE_STORAGE_CONTAINER
+        )
+    return _storage_service
+
+
+def conversation_id_from_path(path: str) -> Optional[str]:
+    """
+    /ws のリクエストのパスから会話記録のIDを取り出す
+
+    Args:
+        path: クエリ文字列を含むリクエストのパス
+
+    Returns:
+        会話記録のID（指定がない、または形式が不正な場合はNone）
+    """
+    values = parse_qs(urlsplit(path or '').query).get(CONVERSATION_ID_PARAM)
+    if not values:
+        return None
+    if not CONVERSATION_ID_PATTERN.match(values[0]):
+        logger.warning(f"[Recording] Ignored invalid {CONVERSATION_ID_PARAM}: {values[0][:80]!r}")
+        return None
+    return values[0]
+
+
+def create_session_recorder(name: str) -> SessionRecorder:
+    """PROXY_RECORDING_DIR にセッションの録音を作成"""
+    os.makedirs(PROXY_RECORDING_DIR, exist_ok=True)
+    return SessionRecorder(os.path.join(PROXY_RECORDING_DIR, f"{name}.wav"))
+
+
+async def finish_recording(recorder: SessionRecorder, conversation_id: str) -> Optional[str]:
+    """
+    録音用のスレッドで残りのフレームを処理してからWAVを閉じ、スレッドプールでアップロードする
+
+    Args:
+        recorder: セッションの録音
+        conversation_id: Blob名に使うID
+
+    Returns:
+        アップロードしたBlobのURL（アップロードしなかった場合はNone）
+    """
+    loop = asyncio.get_running_loop()
+    # submit したフレームの後に閉じる（録音用のスレッドは1本のため順番に処理される）
+    await loop.run_in_executor(RECORDING_EXECUTOR, recorder.close)
+    return await loop.run_in_executor(None, finalize_recording, recorder, conversation_id)
+
+
+def finalize_recording(recorder: SessionRecorder, conversation_id: str) -> Optional[str]:
+    """
+    録音を閉じてアップロードする（ブロッキングするためスレッドプールで実行する）
+
+    Args:
+        recorder: セッションの録音
+        conversation_id: Blob名に使うID
+
+    Returns:
+        アップロードしたBlobのURL（アップロードしなかった場合はNone）
+    """
+    path = recorder.close()
+    storage = get_storage_service()
+    if storage is None:
+        logger.info(f"[Recording] Saved {path} (storage not configured)")
+        return None
+    # ファイルのまま渡して、録音全体をメモリに読み込まない
+    with open(path, 'rb') as f:
+        blob_url, _ = storage.upload_recording(audio_data=f, conversation_id=conversation_id, file_extension='wav')
+    logger.info(f"[Recording] Uploaded {path} to {blob_url}")
+    if not PROXY_RECORDING_KEEP_FILES:
+        os.remove(path)
+    return blob_url
@@ -0,0 +1,310 @@
+"""
+Gemini Live のsetupプロファイル（サーバー側でのsetupの差し込み）
+キオスクは接続のたびに同じ長いシステムプロンプトを含むsetupを送っているため、
+setup_profiles.json に名前とバージョン付きのプロファイルを置き、読み込み時に1回だけ
+シリアライズしておく。クライアントはプロファイルIDと少しの上書きだけを送る
+
+クライアント → プロキシ（setup の代わりに送る。テキストフレーム）:
+    {"setupProfile": {
+        "id": "ticket-flow",
+        "version": 1,                                  # 省略可。指定した場合は一致しないと拒否する
+        "variables": {"departure_station": "上野"},     # 省略可。文字列中の ${name} を置き換える
+        "overrides": {"generation_config": {...}}      # 省略可。setupに再帰的にマージする（model は不可）
+    }}
+
+- model が短い名前の場合は projects/{PROJECT_ID}/locations/{location}/publishers/google/models/{model} に展開する
+- プロキシで処理するツール（tool_registry）がある場合は、その function_declarations を tools に加える
+- variables / overrides の組み合わせごとに、シリアライズ済みのsetupをキャッシュする
+- ファイルの更新は SETUP_PROFILES_RELOAD_INTERVAL 秒ごとに確認して読み込み直す
+  （読み込みに失敗した場合は前のプロファイルを使い続ける。一度も読み込めていなければ拒否する）
+- start() の後は、ファイルの確認・読み込み（os.stat / json.load）をスレッドで行い、
+  resolve ではイベントループ上でファイルを読まない
+"""
+import os
+import copy
+import json
+import time
+import string
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+Message = Union[str, bytes]
+
+DEFAULT_PROFILES_PATH = os.path.join(os.path.dirname(__file__), 'setup_profiles.json')
+SETUP_PROFILES_FILE = os.getenv('SETUP_PROFILES_FILE') or DEFAULT_PROFILES_PATH
+SETUP_PROFILES_RELOAD_INTERVAL = float(os.getenv('SETUP_PROFILES_RELOAD_INTERVAL', '5'))
+
+# setupProfile のメッセージを判定するキー（フレームの先頭だけを見る）
+SETUP_PROFILE_KEY = 'setupProfile'
+SETUP_PROFILE_INSPECT_WINDOW = 32
+
+# variables / overrides の組み合わせごとのシリアライズ済みsetupの上限
+SETUP_CACHE_SIZE = 64
+
+
+class SetupProfileError(ValueError):
+    """プロファイルが見つからない、またはリクエストが不正"""
+
+
+def is_setup_profile_request(message: Message) -> bool:
+    """setupProfile のメッセージか判定（デコードしない）"""
+    if not isinstance(message, str):
+        return False
+    return SETUP_PROFILE_KEY in message[:SETUP_PROFILE_INSPECT_WINDOW]
+
+
+def merge_overrides(base: Dict[str, Any], overrides: Dict[str, Any]) -> Dict[str, Any]:
+    """dict同士は再帰的にマージし、それ以外は上書きする（base を変更する）"""
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(base.get(key), dict):
+            merge_overrides(base[key], value)
+        else:
+            base[key] = value
+    return base
+
+
+def add_function_declarations(setup: Dict[str, Any], declarations: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """setup の tools に function_declarations を加える（同じ名前の宣言はsetup側を優先。setup を変更する）"""
+    declared = {
+        declaration.get('name')
+        for tool in setup.get('tools', [])
+        for declaration in tool.get('function_declarations', tool.get('functionDeclarations', []))
+    }
+    missing = [declaration for declaration in declarations if declaration['name'] not in declared]
+    if missing:
+        setup.setdefault('tools', []).append({'function_declarations': missing})
+    return setup
+
+
+def substitute_variables(value: Any, variables: Dict[str, str]) -> Any:
+    """文字列中の ${name} を置き換える（未定義の変数はそのまま残す）"""
+    if isinstance(value, str):
+        return string.Template(value).safe_substitute(variables) if '$' in value else value
+    if isinstance(value, dict):
+        return {k: substitute_variables(v, variables) for k, v in value.items()}
+    if isinstance(value, list):
+        return [substitute_variables(v, variables) for v in value]
+    return value
+
+
+class SetupProfileRegistry:
+    """setupプロファイルの読み込み・展開・キャッシュ"""
+
+    def __init__(
+        self,
+        project_id: str,
+        location: str,
+        path: str = SETUP_PROFILES_FILE,
+        reload_interval: float = SETUP_PROFILES_RELOAD_INTERVAL,
+        tool_declarations: Optional[List[Dict[str, Any]]] = None
+    ):
+        """
+        初期化
+        Args:
+            project_id: model を展開するプロジェクトID
+            location: model を展開するリージョン
+            path: プロファイルのJSONファイル
+            reload_interval: ファイルの更新を確認する間隔（秒）
+            tool_declarations: すべてのsetupの tools に加える function_declarations（プロキシで処理するツール）
+        """
+        self.project_id = project_id
+        self.location = location
+        self.path = path
+        self.reload_interval = reload_interval
+        self.tool_declarations = tool_declarations or []
+        self._profiles: Dict[str, Dict[str, Any]] = {}
+        self._cache: 'OrderedDict[str, str]' = OrderedDict()
+        # 読み込みに成功したファイルの更新時刻（一度も読み込めていなければNone）
+        self._mtime: Optional[float] = None
+        # 読み込みに失敗したファイルの更新時刻（同じ内容を読み込み直さない）
+        self._failed_mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self._watch_task: Optional[asyncio.Task] = None
+        self._stats = {
+            'loads': 0,
+            'load_errors': 0,
+            'requests': 0,
+            'cache_hits': 0,
+            'rejected': 0,
+        }
+
+    def start(self) -> None:
+        """ファイルの更新の確認をバックグラウンドで開始（実行中のイベントループ上で呼ぶ）"""
+        if self._watch_task is None or self._watch_task.done():
+            self._watch_task = asyncio.create_task(self._watch_loop())
+
+    async def stop(self) -> None:
+        """ファイルの更新の確認を停止"""
+        if self._watch_task:
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except asyncio.CancelledError:
+                pass
+            self._watch_task = None
+
+    def resolve(self, message: Message) -> str:
+        """
+        setupProfile のメッセージを、上流に送るsetupメッセージに変換
+
+        Args:
+            message: クライアントからの setupProfile メッセージ
+
+        Returns:
+            シリアライズ済みのsetupメッセージ
+
+        Raises:
+            SetupProfileError: プロファイルが見つからない、バージョンが一致しない、リクエストが不正
+        """
+        self._stats['requests'] += 1
+        try:
+            request = json.loads(message).get(SETUP_PROFILE_KEY)
+            if not isinstance(request, dict) or not isinstance(request.get('id'), str):
+                raise SetupProfileError('setupProfile.id is required')
+            return self._resolve(request)
+        except (SetupProfileError, ValueError, TypeError, AttributeError) as e:
+            self._stats['rejected'] += 1
+            raise SetupProfileError(str(e)) from e
+
+    def get_stats(self) -> Dict[str, Any]:
+        """読み込み済みのプロファイルとカウンタを取得"""
+        return {
+            'path': self.path,
+            'profiles': {name: profile['version'] for name, profile in self._profiles.items()},
+            'cached_setups': len(self._cache),
+            **self._stats,
+        }
+
+    def _resolve(self, request: Dict[str, Any]) -> str:
+        # バックグラウンドで確認している場合は、まだ一度も読み込めていないときだけここで読む
+        if self._watch_task is None or self._mtime is None:
+            self._reload_if_changed()
+        profile = self._profiles.get(request['id'])
+        if profile is None:
+            raise SetupProfileError(f"Unknown setup profile: {request['id']}")
+        version = request.get('version')
+        if version is not None and version != profile['version']:
+            raise SetupProfileError(
+                f"Setup profile {request['id']} version {version} is not available (current: {profile['version']})"
+            )
+        variables = request.get('variables') or {}
+        overrides = request.get('overrides') or {}
+        if not isinstance(variables, dict) or not isinstance(overrides, dict):
+            raise SetupProfileError('variables and overrides must be objects')
+        if 'model' in overrides:
+            raise SetupProfileError('model cannot be overridden')
+
+        # 変数・上書きがなければ読み込み時にシリアライズしたものをそのまま返す
+        if not variables and not overrides:
+            self._stats['cache_hits'] += 1
+            return profile['serialized']
+
+        cache_key = json.dumps(
+            [request['id'], profile['version'], variables, overrides], sort_keys=True, ensure_ascii=False
+        )
+        serialized = self._cache.get(cache_key)
+        if serialized is not None:
+            self._cache.move_to_end(cache_key)
+            self._stats['cache_hits'] += 1
+            return serialized
+
+        setup = copy.deepcopy(profile['setup'])
+        merge_overrides(setup, overrides)
+        # overrides で tools を置き換えた場合もプロキシで処理するツールを宣言する
+        if self.tool_declarations:
+            add_function_declarations(setup, self.tool_declarations)
+        serialized = json.dumps({'setup': substitute_variables(setup, {**profile['variables'], **variables})})
+        self._cache[cache_key] = serialized
+        if len(self._cache) > SETUP_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return serialized
+
+    def _reload_if_changed(self) -> None:
+        """一定間隔でファイルの更新を確認し、変わっていれば読み込み直す"""
+        now = time.monotonic()
+        if self._mtime is not None and now - self._checked_at < self.reload_interval:
+            return
+        self._checked_at = now
+        self._apply(*self._read_if_changed())
+        if self._mtime is None:
+            raise SetupProfileError(f"Setup profiles are not available: {self.path}")
+
+    async def _watch_loop(self) -> None:
+        """reload_interval 秒ごとにスレッドでファイルを確認し、読み込んだプロファイルを反映する"""
+        loop = asyncio.get_running_loop()
+        while True:
+            self._apply(*await loop.run_in_executor(None, self._read_if_changed))
+            await asyncio.sleep(self.reload_interval)
+
+    def _read_if_changed(self) -> Tuple[Optional[float], Optional[Dict[str, Dict[str, Any]]], Optional[Exception]]:
+        """
+        ファイルが更新されていれば読み込む（ブロッキング。プロファイルの状態は変更しない）
+
+        Returns:
+            (更新時刻, 読み込んだプロファイル, 読み込みのエラー)。変わっていなければすべてNone
+        """
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError as e:
+            return None, None, e
+        if mtime == self._mtime or mtime == self._failed_mtime:
+            return None, None, None
+        try:
+            return mtime, self._load(), None
+        except Exception as e:
+            return mtime, None, e
+
+    def _apply(
+        self,
+        mtime: Optional[float],
+        profiles: Optional[Dict[str, Dict[str, Any]]],
+        error: Optional[Exception]
+    ) -> None:
+        """読み込んだプロファイルを反映する（失敗した場合は前のプロファイルを使い続ける）"""
+        if error is not None:
+            if mtime is None:
+                # ファイルがない（読み込み済みなら前のプロファイルを使い続ける）
+                return
+            self._failed_mtime = mtime
+            self._stats['load_errors'] += 1
+            logger.error(f"[Setup Profiles] Failed to load {self.path}: {error}")
+            return
+        if profiles is None:
+            return
+        # 読み込みに成功した場合だけ更新時刻を記録する
+        self._profiles = profiles
+        self._mtime = mtime
+        self._failed_mtime = None
+        self._cache.clear()
+        self._stats['loads'] += 1
+        logger.info(
+            "[Setup Profiles] Loaded "
+            + ', '.join(f"{name} v{profile['version']}" for name, profile in self._profiles.items())
+        )
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        """プロファイルを読み込み、model を展開してシリアライズしておく"""
+        with open(self.path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        profiles = {}
+        for name, entry in data.get('profiles', {}).items():
+            setup = copy.deepcopy(entry['setup'])
+            model = setup.get('model', '')
+            if model and not model.startswith('projects/'):
+                setup['model'] = (
+                    f"projects/{self.project_id}/locations/{self.location}/publishers/google/models/{model}"
+                )
+            if self.tool_declarations:
+                add_function_declarations(setup, self.tool_declarations)
+            variables = entry.get('variables', {})
+            profiles[name] = {
+                'version': entry.get('version', 1),
+                'variables': variables,
+                'setup': setup,
+                'serialized': json.dumps({'setup': substitute_variables(setup, variables)}),
+            }
+        return profiles
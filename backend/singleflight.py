@@ -0,0 +1,57 @@
+"""
+同一キーの非同期処理の重複実行を防ぐ（singleflight）
+同じキーで同時に呼ばれた処理は1回だけ実行し、その結果（または例外）を全員で共有する
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+
+class AsyncSingleFlight:
+    """同一キーの同時呼び出しを1回の実行にまとめる"""
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self._stats = {
+            'executed': 0,
+            'coalesced': 0,
+        }
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        キーごとに処理を1回だけ実行して結果を返す
+
+        Args:
+            key: 重複判定に使うキー
+            func: 実行する処理（コルーチンを返す関数）
+
+        Returns:
+            処理の結果（実行中の同一キーがあればその結果）
+        """
+        future = self._calls.get(key)
+        if future is not None:
+            self._stats['coalesced'] += 1
+        else:
+            self._stats['executed'] += 1
+            future = asyncio.ensure_future(func())
+            self._calls[key] = future
+            future.add_done_callback(lambda f: self._forget(key, f))
+        # 呼び出し元の1人がキャンセルされても、共有している処理は止めない
+        return await asyncio.shield(future)
+
+    def in_flight(self) -> int:
+        """実行中のキーの数"""
+        return len(self._calls)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """実行数と、まとめられた（重複を省いた）呼び出し数を取得"""
+        return {
+            'in_flight': len(self._calls),
+            **self._stats,
+        }
+
+    def _forget(self, key: str, future: asyncio.Future) -> None:
+        if self._calls.get(key) is future:
+            del self._calls[key]
+        # 待っている呼び出し元が全員キャンセルされた場合の「未取得の例外」警告を防ぐ
+        if not future.cancelled():
+            future.exception()
@@ -0,0 +1,9 @@
+"""
+backend のモジュールとベンチマークを tests から import できるようにする
+"""
+import os
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'benchmarks'))
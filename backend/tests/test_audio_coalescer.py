@@ -0,0 +1,112 @@
+import json
+import base64
+import asyncio
+
+from audio_coalescer import AudioCoalescer, merge_audio_frames, parse_audio_frame
+
+
+def audio_frame(pcm: bytes, key: str = 'realtime_input') -> str:
+    chunk = {'mime_type': 'audio/pcm;rate=16000', 'data': base64.b64encode(pcm).decode('ascii')}
+    return json.dumps({key: {'media_chunks': [chunk]}})
+
+
+def decoded_pcm(message: str) -> bytes:
+    chunks = json.loads(message)['realtime_input']['media_chunks']
+    assert len(chunks) == 1
+    return base64.b64decode(chunks[0]['data'])
+
+
+class Recorder:
+    """emit に渡されたフレームを記録する"""
+
+    def __init__(self, accept: bool = True):
+        self.accept = accept
+        self.sent = []
+
+    async def __call__(self, message, is_audio):
+        self.sent.append((message, is_audio))
+        return self.accept
+
+
+def test_parse_audio_frame():
+    assert parse_audio_frame(audio_frame(b'\x01\x02'))[:2] == ('realtime_input', 'media_chunks')
+    assert parse_audio_frame('{"setup": {}}') is None
+    assert parse_audio_frame('{"realtime_input": {"media_chunks": []}}') is None
+    assert parse_audio_frame('not json') is None
+
+
+def test_merge_audio_frames_concatenates_pcm():
+    frames = [parse_audio_frame(audio_frame(pcm)) for pcm in (b'\x01\x02', b'\x03\x04')]
+    assert decoded_pcm(merge_audio_frames(frames)) == b'\x01\x02\x03\x04'
+
+
+def test_window_timer_merges_frames():
+    async def run():
+        emit = Recorder()
+        coalescer = AudioCoalescer(emit, window_ms=20)
+        for pcm in (b'\x01\x02', b'\x03\x04', b'\x05\x06'):
+            assert await coalescer.push(audio_frame(pcm), True)
+        assert emit.sent == []
+        await asyncio.sleep(0.05)
+        return emit, coalescer.get_stats()
+
+    emit, stats = asyncio.run(run())
+    assert len(emit.sent) == 1
+    message, is_audio = emit.sent[0]
+    assert is_audio
+    assert decoded_pcm(message) == b'\x01\x02\x03\x04\x05\x06'
+    assert stats['frames_in'] == 3
+    assert stats['frames_out'] == 1
+
+
+def test_control_frame_flushes_audio_first():
+    async def run():
+        emit = Recorder()
+        coalescer = AudioCoalescer(emit, window_ms=1000)
+        first = audio_frame(b'\x01\x02')
+        await coalescer.push(first, True)
+        await coalescer.push('{"client_content": {}}', False)
+        return emit, first
+
+    emit, first = asyncio.run(run())
+    # 1フレームだけなら作り直さずにそのまま送り、その後に制御フレームを送る
+    assert emit.sent == [(first, True), ('{"client_content": {}}', False)]
+
+
+def test_full_window_flushes_without_timer():
+    async def run():
+        emit = Recorder()
+        coalescer = AudioCoalescer(emit, window_ms=10)
+        # 10ms = 320バイトのPCM。半分ずつ2回で窓に達する
+        await coalescer.push(audio_frame(bytes(160)), True)
+        await coalescer.push(audio_frame(bytes(160)), True)
+        return emit
+
+    emit = asyncio.run(run())
+    assert len(emit.sent) == 1
+    assert decoded_pcm(emit.sent[0][0]) == bytes(320)
+
+
+def test_large_frame_is_sent_as_is():
+    async def run():
+        emit = Recorder()
+        coalescer = AudioCoalescer(emit, window_ms=10)
+        large = audio_frame(bytes(640))
+        await coalescer.push(large, True)
+        return emit, large
+
+    emit, large = asyncio.run(run())
+    assert emit.sent == [(large, True)]
+
+
+def test_rejected_emit_closes_coalescer():
+    async def run():
+        emit = Recorder(accept=False)
+        coalescer = AudioCoalescer(emit, window_ms=1000)
+        first = await coalescer.push('{"client_content": {}}', False)
+        second = await coalescer.push(audio_frame(b'\x01\x02'), True)
+        return first, second, emit
+
+    first, second, emit = asyncio.run(run())
+    assert (first, second) == (False, False)
+    assert len(emit.sent) == 1
@@ -0,0 +1,26 @@
+from http_cache import etag_matches, weak_etag
+
+
+def test_weak_etag():
+    assert weak_etag('abc') == 'W/"abc"'
+
+
+def test_etag_matches_weak_comparison():
+    etag = weak_etag('abc')
+    assert etag_matches('W/"abc"', etag)
+    assert etag_matches('"abc"', etag)
+    assert etag_matches('"abc"', '"abc"')
+
+
+def test_etag_matches_list_and_wildcard():
+    etag = weak_etag('abc')
+    assert etag_matches('"xyz", W/"abc"', etag)
+    assert etag_matches(' * ', etag)
+
+
+def test_etag_matches_rejects_other_tags():
+    etag = weak_etag('abc')
+    assert not etag_matches(None, etag)
+    assert not etag_matches('', etag)
+    assert not etag_matches('W/"abcd"', etag)
+    assert not etag_matches('abc', etag)
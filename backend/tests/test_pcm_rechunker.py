@@ -0,0 +1,84 @@
+import json
+import base64
+
+from pcm_rechunker import (
+    INTERRUPTED_KEY,
+    TURN_COMPLETE_KEY,
+    FramedAudioOutput,
+    PcmRingBuffer,
+    turn_signal,
+)
+
+# 10ms @ 24kHz / 16bit = 480バイト
+FRAME_MS = 10
+FRAME_BYTES = 480
+
+
+def audio_message(pcm: bytes) -> str:
+    part = {'inlineData': {'mimeType': 'audio/pcm;rate=24000', 'data': base64.b64encode(pcm).decode('ascii')}}
+    return json.dumps({'serverContent': {'modelTurn': {'parts': [part]}}})
+
+
+def server_content(**content) -> str:
+    return json.dumps({'serverContent': content})
+
+
+def test_turn_signal():
+    assert turn_signal(server_content(turnComplete=True)) == TURN_COMPLETE_KEY
+    assert turn_signal(server_content(interrupted=True)) == INTERRUPTED_KEY
+    assert turn_signal(server_content(turnComplete=True).encode()) == TURN_COMPLETE_KEY
+    assert turn_signal(server_content(turnComplete=False)) is None
+
+
+def test_turn_signal_ignores_transcription_text():
+    text = server_content(outputTranscription={'text': '"turnComplete" "interrupted"'})
+    assert turn_signal(text) is None
+    assert turn_signal('{"turnComplete": true}') is None
+
+
+def test_ring_buffer_wraps_and_grows():
+    buffer = PcmRingBuffer(4, capacity=6)
+    assert buffer.push(b'abc') == []
+    assert buffer.push(b'defgh') == [b'abcd', b'efgh']
+    # 端をまたいで書き込み、容量を超えたら広げる
+    assert buffer.push(b'ijklmnopq') == [b'ijkl', b'mnop']
+    assert len(buffer) == 1
+    assert buffer.flush() == [b'q\x00\x00\x00']
+    assert buffer.flush() == []
+
+
+def test_audio_is_rechunked_to_fixed_frames():
+    output = FramedAudioOutput(frame_ms=FRAME_MS)
+    frames = output.process(audio_message(bytes(700)))
+    assert frames == [bytes(FRAME_BYTES)]
+    frames = output.process(audio_message(bytes(300)))
+    assert frames == [bytes(FRAME_BYTES)]
+    assert len(output.buffer) == 40
+
+
+def test_turn_complete_flushes_padded_remainder():
+    output = FramedAudioOutput(frame_ms=FRAME_MS)
+    output.process(audio_message(b'\x01' * 100))
+    message = server_content(turnComplete=True)
+    frames = output.process(message)
+    # 端数は無音で埋めて、turnComplete より前に送る
+    assert frames == [b'\x01' * 100 + bytes(FRAME_BYTES - 100), message]
+    assert len(output.buffer) == 0
+
+
+def test_interrupted_drops_remainder():
+    output = FramedAudioOutput(frame_ms=FRAME_MS)
+    output.process(audio_message(b'\x01' * 100))
+    message = server_content(interrupted=True)
+    assert output.process(message) == [message]
+    assert len(output.buffer) == 0
+    # 次のターンは新しいフレームから始まる
+    assert output.process(audio_message(b'\x02' * FRAME_BYTES)) == [b'\x02' * FRAME_BYTES]
+
+
+def test_other_frames_pass_through():
+    output = FramedAudioOutput(frame_ms=FRAME_MS)
+    output.process(audio_message(b'\x01' * 100))
+    message = server_content(outputTranscription={'text': 'こんにちは'})
+    assert output.process(message) == [message]
+    assert len(output.buffer) == 100
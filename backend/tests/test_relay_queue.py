@@ -0,0 +1,101 @@
+import asyncio
+
+from relay_queue import RelayQueue, is_audio_input
+
+
+def test_is_audio_input_top_level_key():
+    assert is_audio_input('{"realtime_input": {"media_chunks": []}}')
+    assert is_audio_input('  {\n  "realtimeInput": {}}')
+    assert is_audio_input(b'{"realtime_input": {}}')
+
+
+def test_is_audio_input_other_messages():
+    assert not is_audio_input('{"setup": {"realtime_input_config": {}}}')
+    assert not is_audio_input('{"client_content": {"turns": [{"parts": [{"text": "\\"realtime_input\\""}]}]}}')
+    assert not is_audio_input('"realtime_input"')
+    assert not is_audio_input(b'{"toolResponse": {}}')
+    assert not is_audio_input('')
+
+
+def test_fifo_order():
+    async def run():
+        queue = RelayQueue('test', max_frames=4)
+        for message in ('a', 'b', 'c'):
+            assert await queue.put(message, is_audio=message != 'b')
+        return [await queue.get() for _ in range(3)]
+
+    assert asyncio.run(run()) == ['a', 'b', 'c']
+
+
+def test_overflow_drops_oldest_audio_only():
+    async def run():
+        queue = RelayQueue('test', max_frames=3, max_audio_age=10)
+        await queue.put('control-1')
+        await queue.put('audio-1', is_audio=True)
+        await queue.put('audio-2', is_audio=True)
+        # 満杯のときの音声は、最も古い音声を捨てて入る（制御フレームは残す）
+        await asyncio.wait_for(queue.put('audio-3', is_audio=True), 1)
+        await queue.close()
+        frames = []
+        while (message := await queue.get()) is not None:
+            frames.append(message)
+        return frames, queue.get_stats()
+
+    frames, stats = asyncio.run(run())
+    assert frames == ['control-1', 'audio-2', 'audio-3']
+    assert stats['dropped_overflow'] == 1
+
+
+def test_overflow_waits_for_control_frames():
+    async def run():
+        queue = RelayQueue('test', max_frames=1, max_audio_age=10)
+        await queue.put('audio-1', is_audio=True)
+        # 制御フレームは音声を捨てずに空くまで待つ
+        put = asyncio.create_task(queue.put('control-1'))
+        await asyncio.sleep(0.01)
+        assert not put.done()
+        assert await queue.get() == 'audio-1'
+        assert await asyncio.wait_for(put, 1)
+        return await queue.get(), queue.get_stats()
+
+    message, stats = asyncio.run(run())
+    assert message == 'control-1'
+    assert stats['dropped_overflow'] == 0
+
+
+def test_stale_audio_is_skipped():
+    async def run():
+        queue = RelayQueue('test', max_frames=4, max_audio_age=0.05)
+        await queue.put('audio-old', is_audio=True)
+        await queue.put('control-1')
+        await asyncio.sleep(0.1)
+        await queue.put('audio-new', is_audio=True)
+        return [await queue.get(), await queue.get()], queue.get_stats()
+
+    frames, stats = asyncio.run(run())
+    assert frames == ['control-1', 'audio-new']
+    assert stats['dropped_stale'] == 1
+
+
+def test_no_drop_without_max_audio_age():
+    async def run():
+        queue = RelayQueue('test', max_frames=1)
+        await queue.put('audio-1', is_audio=True)
+        put = asyncio.create_task(queue.put('audio-2', is_audio=True))
+        await asyncio.sleep(0.01)
+        assert not put.done()
+        await queue.close()
+        return await put, await queue.get()
+
+    accepted, message = asyncio.run(run())
+    assert accepted is False
+    assert message == 'audio-1'
+
+
+def test_closed_queue_returns_none():
+    async def run():
+        queue = RelayQueue('test')
+        await queue.close()
+        return await queue.put('late'), await queue.get()
+
+    assert asyncio.run(run()) == (False, None)
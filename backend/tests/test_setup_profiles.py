@@ -0,0 +1,105 @@
+import json
+
+import pytest
+
+from setup_profiles import SetupProfileError, SetupProfileRegistry, is_setup_profile_request
+
+PROFILES = {
+    'profiles': {
+        'ticket-flow': {
+            'version': 2,
+            'variables': {'departure_station': '水戸'},
+            'setup': {
+                'model': 'gemini-live-test',
+                'generation_config': {'response_modalities': ['AUDIO'], 'temperature': 0.5},
+                'system_instruction': {'parts': [{'text': '${departure_station}の駅員です'}]},
+            },
+        },
+    },
+}
+
+TOOL_DECLARATIONS = [{'name': 'normalize_station', 'description': '駅名の正規化'}]
+
+
+@pytest.fixture
+def profiles_path(tmp_path):
+    path = tmp_path / 'setup_profiles.json'
+    path.write_text(json.dumps(PROFILES, ensure_ascii=False), encoding='utf-8')
+    return str(path)
+
+
+def request(**profile) -> str:
+    return json.dumps({'setupProfile': profile}, ensure_ascii=False)
+
+
+def resolve(registry, **profile):
+    return json.loads(registry.resolve(request(**profile)))['setup']
+
+
+def test_is_setup_profile_request():
+    assert is_setup_profile_request(request(id='ticket-flow'))
+    assert not is_setup_profile_request('{"setup": {}}')
+    assert not is_setup_profile_request(b'{"setupProfile": {}}')
+
+
+def test_resolve_expands_model_and_variables(profiles_path):
+    registry = SetupProfileRegistry('proj', 'us-central1', path=profiles_path)
+    setup = resolve(registry, id='ticket-flow')
+    assert setup['model'] == 'projects/proj/locations/us-central1/publishers/google/models/gemini-live-test'
+    assert setup['system_instruction']['parts'][0]['text'] == '水戸の駅員です'
+    assert 'tools' not in setup
+
+
+def test_resolve_applies_variables_and_overrides(profiles_path):
+    registry = SetupProfileRegistry('proj', 'us-central1', path=profiles_path)
+    setup = resolve(
+        registry,
+        id='ticket-flow',
+        version=2,
+        variables={'departure_station': '上野'},
+        overrides={'generation_config': {'temperature': 0.2}},
+    )
+    assert setup['system_instruction']['parts'][0]['text'] == '上野の駅員です'
+    assert setup['generation_config'] == {'response_modalities': ['AUDIO'], 'temperature': 0.2}
+    # 同じ組み合わせはキャッシュから返す
+    hits = registry.get_stats()['cache_hits']
+    resolve(registry, id='ticket-flow', variables={'departure_station': '上野'},
+            overrides={'generation_config': {'temperature': 0.2}})
+    assert registry.get_stats()['cache_hits'] == hits + 1
+
+
+@pytest.mark.parametrize('profile', [
+    {'id': 'unknown'},
+    {'id': 'ticket-flow', 'version': 1},
+    {'id': 'ticket-flow', 'overrides': {'model': 'other'}},
+    {'id': 'ticket-flow', 'variables': ['x']},
+    {'version': 2},
+])
+def test_resolve_rejects_invalid_requests(profiles_path, profile):
+    registry = SetupProfileRegistry('proj', 'us-central1', path=profiles_path)
+    with pytest.raises(SetupProfileError):
+        registry.resolve(request(**profile))
+    assert registry.get_stats()['rejected'] == 1
+
+
+def test_resolve_rejects_when_file_is_missing(tmp_path):
+    registry = SetupProfileRegistry('proj', 'us-central1', path=str(tmp_path / 'missing.json'))
+    with pytest.raises(SetupProfileError):
+        registry.resolve(request(id='ticket-flow'))
+
+
+def test_resolve_declares_proxy_tools(profiles_path):
+    registry = SetupProfileRegistry(
+        'proj', 'us-central1', path=profiles_path, tool_declarations=TOOL_DECLARATIONS
+    )
+    assert resolve(registry, id='ticket-flow')['tools'] == [{'function_declarations': TOOL_DECLARATIONS}]
+    # overrides で tools を置き換えても、プロキシのツールは宣言される（同じ名前はsetup側を優先）
+    own = {'name': 'normalize_station', 'description': 'クライアントの宣言'}
+    other = {'name': 'lookup_fare'}
+    setup = resolve(registry, id='ticket-flow', overrides={'tools': [{'function_declarations': [own, other]}]})
+    assert setup['tools'] == [{'function_declarations': [own, other]}]
+    setup = resolve(registry, id='ticket-flow', overrides={'tools': [{'function_declarations': [other]}]})
+    assert setup['tools'] == [
+        {'function_declarations': [other]},
+        {'function_declarations': TOOL_DECLARATIONS},
+    ]
@@ -0,0 +1,51 @@
+import json
+
+from tool_registry import ToolRegistry
+
+
+def tool_call(*names) -> str:
+    calls = [{'id': f'call-{i}', 'name': name, 'args': {}} for i, name in enumerate(names)]
+    return json.dumps({'toolCall': {'functionCalls': calls}})
+
+
+def registry_with(*names) -> ToolRegistry:
+    registry = ToolRegistry()
+    for name in names:
+        registry.register(name, lambda args: {}, {'description': name})
+    return registry
+
+
+def test_all_calls_handled_by_proxy():
+    registry = registry_with('normalize_station')
+    handled, forwarded = registry.split_tool_call(tool_call('normalize_station'))
+    assert [call['name'] for call in handled] == ['normalize_station']
+    assert forwarded is None
+
+
+def test_unknown_calls_are_forwarded_unchanged():
+    registry = registry_with('normalize_station')
+    message = tool_call('lookup_fare')
+    assert registry.split_tool_call(message) == ([], message)
+    assert registry.split_tool_call(message.encode()) == ([], message)
+
+
+def test_mixed_calls_are_split():
+    registry = registry_with('normalize_station')
+    handled, forwarded = registry.split_tool_call(tool_call('normalize_station', 'lookup_fare'))
+    assert [call['id'] for call in handled] == ['call-0']
+    assert json.loads(forwarded) == {
+        'toolCall': {'functionCalls': [{'id': 'call-1', 'name': 'lookup_fare', 'args': {}}]}
+    }
+    assert registry.get_stats()['passed_through'] == 1
+
+
+def test_unparseable_messages_are_forwarded():
+    registry = registry_with('normalize_station')
+    assert registry.split_tool_call('not json') == ([], 'not json')
+    assert registry.split_tool_call('{"toolCall": {}}') == ([], '{"toolCall": {}}')
+
+
+def test_declarations_include_name():
+    registry = registry_with('normalize_station')
+    assert registry.declarations() == [{'name': 'normalize_station', 'description': 'normalize_station'}]
+    assert 'normalize_station' in registry
@@ -0,0 +1,24 @@
+"""
+TTSの合成中もWebSocketの中継が止まらないことの確認（benchmarks/bench_tts_event_loop.py と同じ計測）
+"""
+import asyncio
+
+from bench_tts_event_loop import measure
+
+TTS_DELAY = 0.3
+TTS_REQUESTS = 8
+PING_INTERVAL = 0.005
+# 非同期経路で許容する中継の途切れ（ミリ秒）
+MAX_GAP_MS = 50.0
+
+
+def test_async_tts_keeps_relay_flowing():
+    result = asyncio.run(measure('async', TTS_DELAY, TTS_REQUESTS, PING_INTERVAL))
+    assert result['samples'] > 0
+    assert result['max_gap'] < MAX_GAP_MS
+
+
+def test_blocking_tts_stalls_relay():
+    # 計測で途切れを検出できること（イベントループ上で合成すると1回分以上止まる）
+    result = asyncio.run(measure('blocking', TTS_DELAY, TTS_REQUESTS, PING_INTERVAL))
+    assert result['max_gap'] > TTS_DELAY * 1000 / 2
@@ -0,0 +1,141 @@
+"""
+アクセストークンの非同期管理
+google-auth の credentials.refresh は同期のHTTP呼び出しのため、イベントループ上で
+期限切れのたびに実行するとワーカーの全セッションが止まる。
+期限の少し前にバックグラウンドのスレッドで更新し、接続時にはキャッシュ済みの
+有効なトークンをそのまま返す。同時に更新が必要になった場合も更新は1回だけ行う
+"""
+import os
+import asyncio
+import logging
+import datetime
+from typing import Optional, Dict, Any
+
+from google.auth.transport.requests import Request
+
+from singleflight import AsyncSingleFlight
+
+logger = logging.getLogger(__name__)
+
+# 期限の何秒前に更新するか、更新に失敗した場合に再試行するまでの秒数
+TOKEN_REFRESH_MARGIN = float(os.getenv('TOKEN_REFRESH_MARGIN', '300'))
+TOKEN_RETRY_INTERVAL = float(os.getenv('TOKEN_RETRY_INTERVAL', '10'))
+
+
+class AccessTokenManager:
+    """サービスアカウントのアクセストークンを期限前にバックグラウンドで更新する"""
+
+    def __init__(
+        self,
+        credentials,
+        refresh_margin: float = TOKEN_REFRESH_MARGIN,
+        retry_interval: float = TOKEN_RETRY_INTERVAL
+    ):
+        """
+        初期化
+        Args:
+            credentials: google-auth のクレデンシャル
+            refresh_margin: 期限の何秒前に更新するか
+            retry_interval: 更新に失敗した場合に再試行するまでの秒数
+        """
+        self.credentials = credentials
+        self.refresh_margin = refresh_margin
+        self.retry_interval = retry_interval
+        self._singleflight = AsyncSingleFlight()
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._stats = {
+            'refreshes': 0,
+            'refresh_errors': 0,
+            'waited': 0,
+        }
+
+    def start(self) -> None:
+        """バックグラウンドの更新を開始（実行中のイベントループ上で呼ぶ）"""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        """バックグラウンドの更新を停止"""
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+    def get_cached_token(self) -> str:
+        """
+        キャッシュ済みのトークンを返す（更新はしない）
+
+        Returns:
+            有効なトークン（期限切れ・未取得の場合は空文字）
+        """
+        if self.credentials.token and self._seconds_until_expiry() > 0:
+            return self.credentials.token
+        return ''
+
+    async def get_token(self) -> str:
+        """
+        有効なトークンを返す
+
+        通常はバックグラウンドで更新済みのトークンをすぐに返す。
+        起動直後や更新の失敗が続いた場合のみ更新を待つ（同時に呼ばれても更新は1回）
+
+        Returns:
+            アクセストークン
+        """
+        self.start()
+        token = self.get_cached_token()
+        if token:
+            return token
+        self._stats['waited'] += 1
+        await self._refresh()
+        return self.credentials.token or ''
+
+    def get_stats(self) -> Dict[str, Any]:
+        """更新の状態を取得"""
+        return {
+            'valid': bool(self.get_cached_token()),
+            'seconds_until_expiry': round(self._seconds_until_expiry()),
+            **self._stats,
+        }
+
+    async def _refresh(self) -> None:
+        """スレッドでトークンを更新（同時の呼び出しは1回の更新にまとめる）"""
+        await self._singleflight.do('refresh', self._refresh_in_thread)
+
+    async def _refresh_in_thread(self) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self.credentials.refresh, Request())
+        except Exception:
+            self._stats['refresh_errors'] += 1
+            raise
+        self._stats['refreshes'] += 1
+        logger.info(f"[Token] Access token refreshed (expires in {self._seconds_until_expiry():.0f}s)")
+
+    async def _refresh_loop(self) -> None:
+        """期限の refresh_margin 秒前になるたびに更新する"""
+        while True:
+            delay = self._seconds_until_expiry() - self.refresh_margin
+            if delay > 0:
+                # 待っている間に get_token が更新した場合もあるため、起きたら期限を確認し直す
+                await asyncio.sleep(delay)
+                continue
+            try:
+                await self._refresh()
+            except Exception as e:
+                logger.error(f"[Token] Failed to refresh access token: {e}")
+            # 更新に失敗した場合や、更新直後も期限が近い場合に連続で更新しないよう間隔を空ける
+            if self._seconds_until_expiry() - self.refresh_margin <= 0:
+                await asyncio.sleep(self.retry_interval)
+
+    def _seconds_until_expiry(self) -> float:
+        """トークンの期限までの秒数（未取得の場合は0）"""
+        expiry = self.credentials.expiry
+        if not self.credentials.token or expiry is None:
+            return 0.0
+        # google-auth の expiry はタイムゾーンなしのUTC
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        return (expiry - now).total_seconds()
@@ -0,0 +1,368 @@
+"""
+プロキシでのツール呼び出し（function calling）の実行
+Geminiの toolCall はこれまでブラウザまで届き、ブラウザで処理した toolResponse がプロキシ経由で
+上流に戻っていたため、問い合わせのたびにキオスクとの往復が加わっていた。登録済みのツールは
+プロキシがローカルのデータで処理して上流に直接 tool_response を返し、登録されていない
+ツールの呼び出しだけをクライアントに転送する（PROXY_TOOLS_ENABLED=true の場合）
+
+上流 → プロキシ:
+    {"toolCall": {"functionCalls": [{"id": "1", "name": "normalize_station", "args": {"name": "うえの"}}]}}
+プロキシ → 上流:
+    {"tool_response": {"function_responses": [{"id": "1", "name": "normalize_station", "response": {...}}]}}
+
+組み込みのツール（データがない場合は登録しない）:
+- normalize_station: 駅名辞書（jr-destination-dictionary.csv）で駅名を正式名称に直す
+- search_routes: 経路データ（Cosmos DB の routes コンテナをエクスポートしたJSON）から経路を探す
+
+ツールの宣言（function_declarations）は ToolRegistry.declarations() で取得でき、main.py で
+setupプロファイル（setupProfile）から作るsetupの tools に加える。クライアントがsetupをそのまま
+送る場合は、クライアントが宣言しない限りモデルはツールを呼ばない
+"""
+import os
+import json
+import time
+import difflib
+import logging
+import unicodedata
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+Message = Union[str, bytes]
+ToolHandler = Callable[[Dict[str, Any]], Dict[str, Any]]
+
+PROXY_TOOLS_ENABLED = os.getenv('PROXY_TOOLS_ENABLED', 'false').lower() == 'true'
+DEFAULT_STATION_DICTIONARY_PATH = os.path.normpath(os.path.join(
+    os.path.dirname(__file__), '..', 'frontend', 'public', 'jr-destination-dictionary.csv'
+))
+TOOL_STATION_DICTIONARY = os.getenv('TOOL_STATION_DICTIONARY') or DEFAULT_STATION_DICTIONARY_PATH
+TOOL_ROUTES_FILE = os.getenv('TOOL_ROUTES_FILE', '')
+TOOL_ROUTES_LIMIT = int(os.getenv('TOOL_ROUTES_LIMIT', '5'))
+
+# toolCall のメッセージを判定するキー（フレームの先頭だけを見る）
+TOOL_CALL_KEY = 'toolCall'
+TOOL_CALL_INSPECT_WINDOW = 32
+
+# 辞書に完全一致しない駅名を、近い駅名に直す類似度の下限
+STATION_MATCH_CUTOFF = 0.75
+
+
+def is_tool_call(message: Message) -> bool:
+    """toolCall のメッセージか判定（デコードしない）"""
+    key = TOOL_CALL_KEY.encode() if isinstance(message, bytes) else TOOL_CALL_KEY
+    return key in message[:TOOL_CALL_INSPECT_WINDOW]
+
+
+def to_hiragana(text: str) -> str:
+    """カタカナをひらがなに変換"""
+    return ''.join(chr(ord(c) - 0x60) if 'ァ' <= c <= 'ヶ' else c for c in text)
+
+
+def clean_station_name(name: str) -> str:
+    """駅名の前処理（全角英数の統一、空白・前後の「ー」・末尾の「駅」の除去）"""
+    name = unicodedata.normalize('NFKC', name).strip().strip('ー')
+    if name.endswith('駅') and len(name) > 1:
+        name = name[:-1]
+    return name
+
+
+class StationDictionary:
+    """駅名辞書（駅名,駅名平仮名 のCSV）による駅名の正規化"""
+
+    def __init__(self, path: str):
+        """
+        初期化
+        Args:
+            path: 駅名辞書のCSV（1行目はヘッダー）
+        """
+        self._by_name: Dict[str, Tuple[str, str]] = {}
+        self._by_reading: Dict[str, Tuple[str, str]] = {}
+        with open(path, encoding='utf-8-sig') as f:
+            for line in f.read().splitlines()[1:]:
+                values = line.split(',')
+                if len(values) < 2 or not values[0].strip():
+                    continue
+                entry = (values[0].strip(), values[1].strip())
+                self._by_name.setdefault(clean_station_name(entry[0]), entry)
+                self._by_reading.setdefault(to_hiragana(entry[1]), entry)
+        self._names = list(self._by_name)
+        self._readings = list(self._by_reading)
+
+    def __len__(self) -> int:
+        return len(self._by_name)
+
+    def normalize(self, name: str) -> Dict[str, Any]:
+        """
+        駅名を正式名称に直す
+
+        Args:
+            name: ユーザーの発言の駅名（漢字・ひらがな・カタカナ）
+
+        Returns:
+            {"input", "station", "reading", "confidence"}（見つからない場合 station はNone）
+        """
+        cleaned = clean_station_name(name or '')
+        reading = to_hiragana(cleaned)
+        entry = self._by_name.get(cleaned) or self._by_reading.get(reading)
+        confidence = 1.0
+        if entry is None and cleaned:
+            entry, confidence = self._closest(cleaned, reading)
+        if entry is None:
+            return {'input': name, 'station': None, 'reading': None, 'confidence': 0.0}
+        return {'input': name, 'station': entry[0], 'reading': entry[1], 'confidence': round(confidence, 2)}
+
+    def _closest(self, cleaned: str, reading: str) -> Tuple[Optional[Tuple[str, str]], float]:
+        """駅名と読みのそれぞれで最も近い候補を探し、類似度の高い方を返す"""
+        best: Tuple[Optional[Tuple[str, str]], float] = (None, 0.0)
+        for query, keys, table in ((cleaned, self._names, self._by_name), (reading, self._readings, self._by_reading)):
+            for match in difflib.get_close_matches(query, keys, n=1, cutoff=STATION_MATCH_CUTOFF):
+                ratio = difflib.SequenceMatcher(None, query, match).ratio()
+                if ratio > best[1]:
+                    best = (table[match], ratio)
+        return best
+
+
+class RouteIndex:
+    """経路データ（出発駅・到着駅ごとに到着時刻順）の検索"""
+
+    def __init__(self, path: str):
+        """
+        初期化
+        Args:
+            path: 経路のJSON（routes コンテナのドキュメントの配列、または {"routes": [...]}）
+        """
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        routes = data.get('routes', []) if isinstance(data, dict) else data
+        self._routes: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        for route in routes:
+            key = (route['origin']['name'], route['destination']['name'])
+            self._routes.setdefault(key, []).append(route)
+        for candidates in self._routes.values():
+            candidates.sort(key=lambda route: parse_time(route.get('arrivalTime', '')))
+        self.count = len(routes)
+
+    def search(
+        self, origin: str, destination: str, min_departure: str = '', limit: int = TOOL_ROUTES_LIMIT
+    ) -> List[Dict[str, Any]]:
+        """
+        経路を検索（RouteSearchService.searchRoutesWithMinDeparture と同じく到着時刻順）
+
+        Args:
+            origin: 出発駅
+            destination: 到着駅
+            min_departure: 出発時刻の下限（HH:MM、省略可）
+            limit: 返す経路の上限
+
+        Returns:
+            経路の要約のリスト
+        """
+        candidates = self._routes.get((origin, destination), [])
+        if min_departure:
+            earliest = parse_time(min_departure)
+            candidates = [route for route in candidates if parse_time(route.get('departureTime', '')) >= earliest]
+        return [summarize_route(route) for route in candidates[:limit]]
+
+
+def parse_time(value: str) -> int:
+    """HH:MM または HH:MM:SS を秒に変換（不正な値は0）"""
+    parts = value.split(':')
+    if len(parts) not in (2, 3) or not all(part.isdigit() for part in parts):
+        return 0
+    hours, minutes, seconds = (int(part) for part in (parts + ['0'])[:3])
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def summarize_route(route: Dict[str, Any]) -> Dict[str, Any]:
+    """経路をモデルに返す形に要約（RouteSearchService.generateRouteDescription と同じ説明を付ける）"""
+    legs = route.get('legs') or []
+    description = ''
+    if legs:
+        parts = [legs[0]['from']['name']]
+        for leg in legs:
+            express = '[特急]' if leg.get('isExpress') else ''
+            parts.append(f"（{leg.get('senkuName', '')}{express}）→ {leg['to']['name']}")
+        description = ' '.join(parts)
+    return {
+        'departure_time': route.get('departureTime'),
+        'arrival_time': route.get('arrivalTime'),
+        'duration_seconds': route.get('duration'),
+        'transfers': route.get('transfers'),
+        'has_express': route.get('hasExpress'),
+        'description': description,
+    }
+
+
+class ToolRegistry:
+    """プロキシで処理するツールの登録と、toolCall の振り分け・実行"""
+
+    def __init__(self):
+        self._handlers: Dict[str, ToolHandler] = {}
+        self._declarations: Dict[str, Dict[str, Any]] = {}
+        self._stats: Dict[str, Any] = {
+            'tool_calls': 0,
+            'handled': 0,
+            'passed_through': 0,
+            'errors': 0,
+            'tools': {},
+        }
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._handlers
+
+    def register(self, name: str, handler: ToolHandler, declaration: Dict[str, Any]) -> None:
+        """
+        ツールを登録
+
+        Args:
+            name: 関数名（toolCall の name）
+            handler: args を受け取って response を返す関数
+            declaration: function_declarations に入れる宣言（name 以外）
+        """
+        self._handlers[name] = handler
+        self._declarations[name] = {'name': name, **declaration}
+        self._stats['tools'][name] = {'calls': 0, 'total_ms': 0.0}
+
+    def declarations(self) -> List[Dict[str, Any]]:
+        """setup の tools に入れる function_declarations"""
+        return list(self._declarations.values())
+
+    def split_tool_call(self, message: Message) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        toolCall をプロキシで処理する呼び出しと、クライアントに転送するメッセージに分ける
+
+        Args:
+            message: 上流からの toolCall メッセージ
+
+        Returns:
+            (プロキシで処理する functionCalls, クライアントに転送するメッセージ。なければNone)
+        """
+        text = message if isinstance(message, str) else message.decode('utf-8')
+        try:
+            data = json.loads(text)
+            calls = data[TOOL_CALL_KEY]['functionCalls']
+        except (ValueError, KeyError, TypeError):
+            # 解釈できないものはクライアントに任せる
+            return [], text
+        handled = [call for call in calls if call.get('name') in self._handlers]
+        passed = [call for call in calls if call.get('name') not in self._handlers]
+        self._stats['tool_calls'] += 1
+        self._stats['passed_through'] += len(passed)
+        if not handled:
+            return [], text
+        if not passed:
+            return handled, None
+        data[TOOL_CALL_KEY]['functionCalls'] = passed
+        return handled, json.dumps(data, ensure_ascii=False)
+
+    def execute(self, calls: List[Dict[str, Any]]) -> str:
+        """
+        functionCalls を実行し、上流に送る tool_response を返す（失敗した呼び出しは error を返す）
+
+        Args:
+            calls: split_tool_call で分けた functionCalls
+
+        Returns:
+            シリアライズ済みの tool_response メッセージ
+        """
+        responses = []
+        for call in calls:
+            name = call['name']
+            started = time.perf_counter()
+            try:
+                response = self._handlers[name](call.get('args') or {})
+            except Exception as e:
+                logger.warning(f"Tool {name} failed: {e}")
+                self._stats['errors'] += 1
+                response = {'error': str(e)}
+            tool_stats = self._stats['tools'][name]
+            tool_stats['calls'] += 1
+            tool_stats['total_ms'] += (time.perf_counter() - started) * 1000
+            self._stats['handled'] += 1
+            responses.append({'id': call.get('id'), 'name': name, 'response': response})
+        return json.dumps({'tool_response': {'function_responses': responses}}, ensure_ascii=False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """登録済みのツールと、処理・転送した呼び出しの数"""
+        return {
+            **{key: value for key, value in self._stats.items() if key != 'tools'},
+            'tools': {
+                name: {
+                    'calls': stats['calls'],
+                    'avg_ms': round(stats['total_ms'] / stats['calls'], 3) if stats['calls'] else None,
+                }
+                for name, stats in self._stats['tools'].items()
+            },
+        }
+
+
+def create_default_registry(
+    station_dictionary_path: str = TOOL_STATION_DICTIONARY, routes_path: str = TOOL_ROUTES_FILE
+) -> ToolRegistry:
+    """
+    組み込みのツールを登録したレジストリを作成（データを読み込めないツールは登録しない）
+
+    Args:
+        station_dictionary_path: 駅名辞書のCSV
+        routes_path: 経路のJSON（空の場合は search_routes を登録しない）
+
+    Returns:
+        ToolRegistry
+    """
+    registry = ToolRegistry()
+
+    stations: Optional[StationDictionary] = None
+    try:
+        stations = StationDictionary(station_dictionary_path)
+        logger.info(f"Loaded {len(stations)} stations for tool calls from {station_dictionary_path}")
+    except OSError as e:
+        logger.warning(f"Station dictionary not available, normalize_station is handled by the client: {e}")
+
+    if stations is not None:
+        registry.register(
+            'normalize_station',
+            lambda args: stations.normalize(str(args.get('name', ''))),
+            {
+                'description': 'ユーザーが話した駅名を、駅名辞書の正式な駅名に直す',
+                'parameters': {
+                    'type': 'OBJECT',
+                    'properties': {'name': {'type': 'STRING', 'description': 'ユーザーが話した駅名'}},
+                    'required': ['name'],
+                },
+            }
+        )
+
+    if routes_path:
+        try:
+            routes = RouteIndex(routes_path)
+            logger.info(f"Loaded {routes.count} routes for tool calls from {routes_path}")
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Routes not available, search_routes is handled by the client: {e}")
+        else:
+            def search_routes(args: Dict[str, Any]) -> Dict[str, Any]:
+                origin = clean_station_name(str(args.get('origin', '')))
+                destination = clean_station_name(str(args.get('destination', '')))
+                if stations is not None:
+                    origin = stations.normalize(origin)['station'] or origin
+                    destination = stations.normalize(destination)['station'] or destination
+                found = routes.search(origin, destination, str(args.get('min_departure', '')))
+                return {'origin': origin, 'destination': destination, 'routes': found}
+
+            registry.register(
+                'search_routes',
+                search_routes,
+                {
+                    'description': '出発駅から到着駅までの経路を到着時刻の早い順に探す',
+                    'parameters': {
+                        'type': 'OBJECT',
+                        'properties': {
+                            'origin': {'type': 'STRING', 'description': '出発駅'},
+                            'destination': {'type': 'STRING', 'description': '到着駅'},
+                            'min_departure': {'type': 'STRING', 'description': '出発時刻の下限（HH:MM、省略可）'},
+                        },
+                        'required': ['origin', 'destination'],
+                    },
+                }
+            )
+
+    return registry
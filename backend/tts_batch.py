@@ -0,0 +1,162 @@
+"""
+TTSバッチ合成
+複数の案内文（確認文・経路の要約・次の質問など）を1回のHTTPリクエストで受け取り、
+上限付きで並行に合成して、合成できた順に長さ付きのバイナリ形式で返す
+
+レスポンスの形式（アイテムごとに以下を繰り返す）:
+    [ヘッダー長 uint32 ビッグエンディアン][ヘッダー JSON (UTF-8)][音声データ (ヘッダーの length バイト)]
+
+ヘッダー JSON:
+    {"index": 0, "ok": true, "contentType": "audio/wav", "length": 48044}
+    {"index": 1, "ok": false, "error": "...", "length": 0}
+"""
+import os
+import json
+import struct
+import asyncio
+import logging
+from typing import AsyncIterator, List, Dict, Any
+
+from tts_formats import DEFAULT_SAMPLE_RATE, audio_content_type
+
+logger = logging.getLogger(__name__)
+
+BATCH_CONTENT_TYPE = 'application/vnd.jre.tts-batch'
+
+# 1リクエストあたりの最大アイテム数と同時合成数
+MAX_BATCH_ITEMS = int(os.getenv('TTS_BATCH_MAX_ITEMS', '20'))
+BATCH_CONCURRENCY = int(os.getenv('TTS_BATCH_CONCURRENCY', '4'))
+
+
+def parse_batch_items(data: Dict[str, Any]) -> List[Dict[str, str]]:
+    """
+    バッチリクエストのアイテムを正規化
+
+    items には文字列、または {"text", "voiceName", "languageCode"} を指定できる
+    （省略した項目はリクエスト全体の voiceName / languageCode を使う）
+
+    Args:
+        data: リクエストのJSON
+
+    Returns:
+        {"text", "voice_name", "language_code"} のリスト
+
+    Raises:
+        ValueError: 形式が不正な場合
+    """
+    items = data.get('items', data.get('texts'))
+    if not isinstance(items, list) or not items:
+        raise ValueError('items must be a non-empty list')
+    if len(items) > MAX_BATCH_ITEMS:
+        raise ValueError(f'Too many items (max {MAX_BATCH_ITEMS})')
+
+    voice_name = data.get('voiceName', 'Kore')
+    language_code = data.get('languageCode', 'ja-JP')
+    parsed = []
+    for item in items:
+        if isinstance(item, str):
+            item = {'text': item}
+        if not isinstance(item, dict):
+            raise ValueError('Each item must be a string or an object')
+        parsed.append({
+            'text': item.get('text', ''),
+            'voice_name': item.get('voiceName', voice_name),
+            'language_code': item.get('languageCode', language_code),
+        })
+    return parsed
+
+
+def is_batch_cached(
+    async_tts_service,
+    items: List[Dict[str, str]],
+    audio_format: str = 'wav',
+    sample_rate: int = DEFAULT_SAMPLE_RATE
+) -> bool:
+    """
+    すべてのアイテムがメモリキャッシュから返せるか（合成せずに返せるか）
+
+    Args:
+        async_tts_service: AsyncTTSServiceのインスタンス
+        items: parse_batch_items の結果
+        audio_format: 出力フォーマット
+        sample_rate: 出力のサンプリングレート
+
+    Returns:
+        すべてのアイテムがメモリキャッシュにある（またはテキストが空の）場合はTrue
+    """
+    return all(
+        not item['text'] or async_tts_service.is_cached(
+            item['text'], item['voice_name'], item['language_code'], audio_format, sample_rate
+        )
+        for item in items
+    )
+
+
+def encode_batch_part(header: Dict[str, Any], payload: bytes = b'') -> bytes:
+    """
+    1アイテム分のレスポンスを作成
+
+    Args:
+        header: ヘッダー（length は自動で設定）
+        payload: 音声データ
+
+    Returns:
+        長さ付きのバイナリ
+    """
+    header = {**header, 'length': len(payload)}
+    header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    return struct.pack('>I', len(header_bytes)) + header_bytes + payload
+
+
+async def synthesize_batch(
+    async_tts_service,
+    items: List[Dict[str, str]],
+    audio_format: str = 'wav',
+    sample_rate: int = DEFAULT_SAMPLE_RATE,
+    concurrency: int = BATCH_CONCURRENCY
+) -> AsyncIterator[bytes]:
+    """
+    アイテムを並行に合成し、合成できた順にエンコード済みのパートを返す
+    失敗したアイテムはエラーのパートとして返し、バッチ全体は止めない
+
+    Args:
+        async_tts_service: AsyncTTSServiceのインスタンス
+        items: parse_batch_items の結果
+        audio_format: 出力フォーマット
+        sample_rate: 出力のサンプリングレート
+        concurrency: このバッチ内の同時合成数（全体の上限はAsyncTTSServiceで制限）
+
+    Yields:
+        エンコード済みのパート
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def synthesize(index: int, item: Dict[str, str]) -> bytes:
+        if not item['text']:
+            return encode_batch_part({'index': index, 'ok': False, 'error': 'Text is required'})
+        try:
+            async with semaphore:
+                audio_data = await async_tts_service.synthesize_speech(
+                    text=item['text'],
+                    voice_name=item['voice_name'],
+                    language_code=item['language_code'],
+                    audio_format=audio_format,
+                    sample_rate=sample_rate
+                )
+            return encode_batch_part(
+                {'index': index, 'ok': True, 'contentType': audio_content_type(audio_format, sample_rate)},
+                audio_data
+            )
+        except Exception as e:
+            logger.error(f"[TTS Batch] Item {index} failed: {e}")
+            return encode_batch_part({'index': index, 'ok': False, 'error': str(e)})
+
+    tasks = [asyncio.ensure_future(synthesize(i, item)) for i, item in enumerate(items)]
+    try:
+        for completed in asyncio.as_completed(tasks):
+            yield await completed
+    finally:
+        # クライアント切断などで中断した場合は残りの合成を取り消す
+        for task in tasks:
+            if not task.done():
+                task.cancel()
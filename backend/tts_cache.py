@@ -0,0 +1,301 @@
+"""
+TTS音声キャッシュ
+(テキスト, 音声, 言語, 後処理バージョン) から計算したハッシュをキーにした
+内容アドレス型キャッシュ。メモリ上のLRUとディスク層の2段構成で、
+ディスク層はプロセス再起動後も有効
+"""
+import os
+import json
+import hashlib
+import logging
+import time
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+# ディスク層の使用量を数え直す間隔（秒）。ディスク層はgunicornのワーカー間で共有されるため、
+# 自分の書き込みだけを数えていると他のワーカーの分だけ上限を超える
+DISK_RESCAN_INTERVAL = 30.0
+
+
+class TTSAudioCache:
+    """合成済み音声のキャッシュ（メモリLRU + ディスク）"""
+
+    def __init__(
+        self,
+        max_memory_items: int = 256,
+        max_memory_bytes: int = 64 * 1024 * 1024,
+        disk_dir: Optional[str] = None,
+        max_disk_bytes: int = 512 * 1024 * 1024
+    ):
+        """
+        初期化
+        Args:
+            max_memory_items: メモリに保持する最大エントリ数
+            max_memory_bytes: メモリに保持する最大バイト数
+            disk_dir: ディスクキャッシュのディレクトリ（Noneの場合はディスク層を使わない）
+            max_disk_bytes: ディスクキャッシュの最大バイト数
+        """
+        self.max_memory_items = max_memory_items
+        self.max_memory_bytes = max_memory_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._disk_scanned_at = 0.0
+        # 合成はスレッドプールからも呼ばれるためロックで保護する
+        self._lock = threading.Lock()
+
+        self._stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'writes': 0,
+            'memory_evictions': 0,
+            'disk_evictions': 0,
+            'disk_errors': 0,
+        }
+
+        if self.disk_dir:
+            try:
+                os.makedirs(self.disk_dir, exist_ok=True)
+                self._disk_bytes = sum(size for _, size, _ in self._scan_disk())
+                self._disk_scanned_at = time.monotonic()
+            except OSError as e:
+                logger.warning(f"[TTSCache] Disk cache disabled: {e}")
+                self.disk_dir = None
+
+    @classmethod
+    def from_env(cls) -> "TTSAudioCache":
+        """環境変数から設定を読み込んでキャッシュを作成"""
+        disk_dir = os.getenv(
+            'TTS_CACHE_DIR',
+            os.path.join(os.path.dirname(__file__), '.tts_cache')
+        )
+        if os.getenv('TTS_CACHE_DISK_ENABLED', 'true').lower() != 'true':
+            disk_dir = None
+        return cls(
+            max_memory_items=int(os.getenv('TTS_CACHE_MEMORY_ITEMS', '256')),
+            max_memory_bytes=int(os.getenv('TTS_CACHE_MEMORY_MB', '64')) * 1024 * 1024,
+            disk_dir=disk_dir,
+            max_disk_bytes=int(os.getenv('TTS_CACHE_DISK_MB', '512')) * 1024 * 1024
+        )
+
+    @staticmethod
+    def make_key(**params: Any) -> str:
+        """
+        キャッシュキーを作成
+        Args:
+            params: キーを構成するパラメータ（テキスト、音声名など）
+        Returns:
+            SHA-256の16進文字列
+        """
+        canonical = json.dumps(params, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def get(self, key: str, memory_only: bool = False) -> Optional[bytes]:
+        """
+        キャッシュから音声データを取得
+        Args:
+            key: キャッシュキー
+            memory_only: Trueの場合はメモリ層のみ参照する（ディスクI/Oをしないため
+                イベントループ上から呼んでもブロックしない）
+        Returns:
+            音声データ（存在しない場合はNone）
+        """
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self._stats['memory_hits'] += 1
+                return data
+        if memory_only:
+            return None
+
+        data = self._read_disk(key)
+        with self._lock:
+            if data is None:
+                self._stats['misses'] += 1
+                return None
+            self._stats['disk_hits'] += 1
+            # ディスクからのヒットはメモリ層に昇格させる
+            self._put_memory(key, data)
+        return data
+
+    def contains(self, key: str) -> bool:
+        """
+        メモリ層にあるか（ヒットとして数えない）
+        Args:
+            key: キャッシュキー
+        Returns:
+            メモリ層にある場合はTrue
+        """
+        with self._lock:
+            return key in self._memory
+
+    def put(self, key: str, data: bytes) -> None:
+        """
+        音声データをキャッシュに保存
+        Args:
+            key: キャッシュキー
+            data: 音声データ
+        """
+        with self._lock:
+            self._stats['writes'] += 1
+            self._put_memory(key, data)
+        self._write_disk(key, data)
+
+    def clear(self) -> None:
+        """メモリ層とディスク層をすべて削除"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+        for path, _, _ in self._scan_disk():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        with self._lock:
+            self._disk_bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """ヒット/ミス/追い出しのカウンタと現在のサイズを取得"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                'memory_items': len(self._memory),
+                'memory_bytes': self._memory_bytes,
+                'disk_enabled': self.disk_dir is not None,
+                'disk_bytes': self._disk_bytes,
+            })
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_ratio'] = (
+            (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        )
+        return stats
+
+    # -------------------------------------
+    # メモリ層
+    # -------------------------------------
+
+    def _put_memory(self, key: str, data: bytes) -> None:
+        """メモリ層に保存し、上限を超えた分を古い順に追い出す（ロック取得済みで呼ぶこと）"""
+        if len(data) > self.max_memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old)
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+
+        while (len(self._memory) > self.max_memory_items or
+               self._memory_bytes > self.max_memory_bytes):
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self._stats['memory_evictions'] += 1
+
+    # -------------------------------------
+    # ディスク層
+    # -------------------------------------
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.bin")
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            # 最終アクセス時刻を更新してディスク層の追い出し順に反映する
+            os.utime(path, None)
+            return data
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"[TTSCache] Failed to read {path}: {e}")
+            with self._lock:
+                self._stats['disk_errors'] += 1
+            return None
+
+    def _write_disk(self, key: str, data: bytes) -> None:
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        try:
+            existing = os.path.getsize(path) if os.path.exists(path) else 0
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # 途中まで書かれたファイルを読まないよう一時ファイル経由で置き換える
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except BaseException:
+                # 書き込み・置き換えに失敗した一時ファイルを残さない
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                raise
+        except OSError as e:
+            logger.warning(f"[TTSCache] Failed to write {path}: {e}")
+            with self._lock:
+                self._stats['disk_errors'] += 1
+            return
+
+        # 他のワーカーの書き込みも含めるため、一定間隔でディレクトリを数え直す
+        rescan = time.monotonic() - self._disk_scanned_at >= DISK_RESCAN_INTERVAL
+        scanned = sum(size for _, size, _ in self._scan_disk()) if rescan else None
+        with self._lock:
+            if scanned is not None:
+                self._disk_bytes = scanned
+                self._disk_scanned_at = time.monotonic()
+            else:
+                self._disk_bytes += len(data) - existing
+            over_limit = self._disk_bytes > self.max_disk_bytes
+        if over_limit:
+            self._evict_disk()
+
+    def _scan_disk(self):
+        """ディスク層のファイル一覧を (パス, サイズ, 更新時刻) で返す"""
+        if not self.disk_dir or not os.path.isdir(self.disk_dir):
+            return []
+        entries = []
+        for root, _, files in os.walk(self.disk_dir):
+            for name in files:
+                if not name.endswith('.bin'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((path, st.st_size, st.st_mtime))
+        return entries
+
+    def _evict_disk(self) -> None:
+        """ディスク層を最終アクセスの古い順に削除して上限の9割まで減らす"""
+        entries = sorted(self._scan_disk(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_disk_bytes * 0.9)
+        evicted = 0
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        with self._lock:
+            self._disk_bytes = total
+            self._disk_scanned_at = time.monotonic()
+            self._stats['disk_evictions'] += evicted
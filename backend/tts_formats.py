@@ -0,0 +1,186 @@
+"""
+TTS出力フォーマットの定義とネゴシエーション
+リクエストの audioFormat 指定、または Accept ヘッダーから返却するフォーマットを決定する
+
+- wav: 24kHz LINEAR16 のWAV（既定、後処理済み）
+- pcm: WAVヘッダーなしの16bit PCM（後処理済み）
+- ogg_opus / mp3: 後処理済みのPCMをサーバー側で圧縮したもの（帯域の細い店舗回線向け、soundfile が必要）
+"""
+import io
+from typing import Optional, Dict
+
+import numpy as np
+
+try:
+    import soundfile
+except ImportError:  # soundfile（libsndfile）がない環境では圧縮フォーマットを返さない
+    soundfile = None
+
+# フォーマット名 → レスポンスのContent-Type
+AUDIO_FORMATS: Dict[str, str] = {
+    'wav': 'audio/wav',
+    'pcm': 'audio/L16; rate=24000; channels=1',
+    'ogg_opus': 'audio/ogg; codecs=opus',
+    'mp3': 'audio/mpeg',
+}
+
+# フォーマット名 → ファイルの拡張子（Content-Disposition用）
+AUDIO_FILE_EXTENSIONS: Dict[str, str] = {
+    'wav': 'wav',
+    'pcm': 'pcm',
+    'ogg_opus': 'ogg',
+    'mp3': 'mp3',
+}
+
+DEFAULT_AUDIO_FORMAT = 'wav'
+
+# 出力できるサンプリングレート（合成は24kHzで行い、それ以外はサーバー側でリサンプリング）
+SUPPORTED_SAMPLE_RATES = (8000, 16000, 22050, 24000, 48000)
+DEFAULT_SAMPLE_RATE = 24000
+
+# フォーマットごとに出力できるサンプリングレート（Opusは 8/12/16/24/48kHz のみで、22050Hzは扱えない）
+FORMAT_SAMPLE_RATES: Dict[str, tuple] = {
+    'ogg_opus': (8000, 16000, 24000, 48000),
+}
+
+# 圧縮フォーマット → soundfile の (format, subtype)
+# TTS APIのエンコードを使うと後処理（重複除去・フェード・フィルタ）を通らないため、
+# 後処理済みのPCMをサーバー側でエンコードする
+COMPRESSED_AUDIO_FORMATS: Dict[str, tuple] = {
+    'ogg_opus': ('OGG', 'OPUS'),
+    'mp3': ('MP3', 'MPEG_LAYER_III'),
+}
+
+# Acceptヘッダーのメディアタイプ → フォーマット名
+_MEDIA_TYPES = {
+    'audio/wav': 'wav',
+    'audio/wave': 'wav',
+    'audio/x-wav': 'wav',
+    'audio/l16': 'pcm',
+    'audio/pcm': 'pcm',
+    'audio/ogg': 'ogg_opus',
+    'audio/opus': 'ogg_opus',
+    'audio/mpeg': 'mp3',
+    'audio/mp3': 'mp3',
+}
+
+
+def is_format_available(audio_format: str) -> bool:
+    """このサーバーで返せるフォーマットか（圧縮フォーマットは soundfile が必要）"""
+    return audio_format in AUDIO_FORMATS and (audio_format not in COMPRESSED_AUDIO_FORMATS or soundfile is not None)
+
+
+def encode_audio(pcm: bytes, sample_rate: int, audio_format: str) -> bytes:
+    """
+    16bit モノラルのPCMを圧縮フォーマットにエンコード
+
+    Args:
+        pcm: PCMデータ（16bit, モノラル）
+        sample_rate: PCMのサンプリングレート
+        audio_format: ogg_opus または mp3
+
+    Returns:
+        圧縮音声データ
+
+    Raises:
+        ValueError: このサーバーでエンコードできないフォーマットの場合
+    """
+    if audio_format not in COMPRESSED_AUDIO_FORMATS or not is_format_available(audio_format):
+        raise ValueError(f"Audio format '{audio_format}' is not available on this server")
+    container, subtype = COMPRESSED_AUDIO_FORMATS[audio_format]
+    samples = np.frombuffer(pcm, dtype=np.int16, count=len(pcm) // 2)
+    output = io.BytesIO()
+    soundfile.write(output, samples, sample_rate, format=container, subtype=subtype)
+    return output.getvalue()
+
+
+def supported_sample_rates(audio_format: str = DEFAULT_AUDIO_FORMAT) -> tuple:
+    """フォーマットで出力できるサンプリングレート"""
+    return FORMAT_SAMPLE_RATES.get(audio_format, SUPPORTED_SAMPLE_RATES)
+
+
+def parse_sample_rate(value=None, audio_format: str = DEFAULT_AUDIO_FORMAT) -> int:
+    """
+    リクエストの sampleRate を検証
+
+    Args:
+        value: sampleRate の値（文字列または数値、省略時は24000）
+        audio_format: 返却するフォーマット（フォーマットごとに使えるサンプリングレートが異なる）
+
+    Returns:
+        サンプリングレート
+
+    Raises:
+        ValueError: 未対応のサンプリングレートの場合
+    """
+    if value in (None, ''):
+        return DEFAULT_SAMPLE_RATE
+    try:
+        sample_rate = int(value)
+    except (TypeError, ValueError):
+        sample_rate = None
+    if sample_rate not in supported_sample_rates(audio_format):
+        raise ValueError(f"Invalid sample rate for {audio_format}. Available: {list(supported_sample_rates(audio_format))}")
+    return sample_rate
+
+
+def audio_content_type(audio_format: str, sample_rate: int = DEFAULT_SAMPLE_RATE) -> str:
+    """
+    フォーマットとサンプリングレートに対応するContent-Typeを取得
+
+    Args:
+        audio_format: フォーマット名
+        sample_rate: サンプリングレート
+
+    Returns:
+        Content-Type
+    """
+    if audio_format == 'pcm':
+        return f'audio/L16; rate={sample_rate}; channels=1'
+    return AUDIO_FORMATS[audio_format]
+
+
+def negotiate_audio_format(accept: Optional[str] = None, requested: Optional[str] = None) -> str:
+    """
+    返却する音声フォーマットを決定
+
+    リクエストで明示された audioFormat を優先し、なければAcceptヘッダーのq値が
+    最も高い対応フォーマットを選ぶ。どちらもなければWAV
+
+    Args:
+        accept: Acceptヘッダーの値
+        requested: リクエストの audioFormat（wav / pcm / ogg_opus / mp3）
+
+    Returns:
+        フォーマット名
+
+    Raises:
+        ValueError: 未対応（またはこのサーバーで返せない）フォーマットが明示された場合
+    """
+    if requested:
+        audio_format = requested.lower()
+        if audio_format not in AUDIO_FORMATS:
+            raise ValueError(f"Invalid audio format. Available: {list(AUDIO_FORMATS.keys())}")
+        if not is_format_available(audio_format):
+            raise ValueError(f"Audio format '{audio_format}' is not available on this server")
+        return audio_format
+
+    if not accept:
+        return DEFAULT_AUDIO_FORMAT
+
+    best_format, best_q = None, 0.0
+    for item in accept.split(','):
+        parts = [p.strip() for p in item.split(';')]
+        media_type = parts[0].lower()
+        q = 1.0
+        for param in parts[1:]:
+            if param.startswith('q='):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        audio_format = _MEDIA_TYPES.get(media_type)
+        # 同じq値なら先に書かれたものを優先（返せないフォーマットは候補にしない）
+        if audio_format and is_format_available(audio_format) and q > best_q:
+            best_format, best_q = audio_format, q
+    return best_format or DEFAULT_AUDIO_FORMAT
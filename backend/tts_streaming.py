@@ -0,0 +1,217 @@
+"""
+TTSストリーミング合成
+長い案内文を日本語の文境界で分割し、区間ごとに合成・後処理したPCMを
+合成が終わった順（先頭から）に送出して、最初の音声が出るまでの時間を短くする
+区間ごとの音量の違いは発話全体で1つの基準に合わせる
+"""
+import re
+import asyncio
+import logging
+from typing import AsyncIterator, List, Optional
+
+import numpy as np
+
+from audio_postprocess import pcm_from_audio_content
+
+logger = logging.getLogger(__name__)
+
+# 区切りとして扱う文字（句点・感嘆符・疑問符・読点・改行）
+SENTENCE_BOUNDARY_PATTERN = re.compile(r'[^。！？!?、\n]*[。！？!?、\n]+|[^。！？!?、\n]+$')
+
+# 発話全体の音量の基準を、先頭の区間のRMSからどれだけ下げるか（-3dB）
+# 後続の区間は基準に合わせて増幅することがあるため、その分の余裕を残す
+LEVEL_HEADROOM = 0.7
+# 区間を増幅したときのピークの上限（AudioPostProcessor の peak_level と同じ）
+LEVEL_PEAK_LIMIT = 32767 * 0.95
+# 区間の増幅率の上限（間の多い短い区間を持ち上げすぎない）
+LEVEL_MAX_GAIN = 2.0
+
+
+def split_japanese_sentences(text: str, min_chars: int = 8) -> List[str]:
+    """
+    テキストを日本語の文境界（。！？、）で分割
+
+    短すぎる区間は1回の合成として効率が悪く抑揚も不自然になるため、
+    min_chars 未満の区間は次の区間と結合する
+
+    Args:
+        text: 分割するテキスト
+        min_chars: 1区間の最小文字数
+
+    Returns:
+        区間のリスト
+    """
+    pieces = [p.strip() for p in SENTENCE_BOUNDARY_PATTERN.findall(text)]
+    segments: List[str] = []
+    buffer = ''
+    for piece in pieces:
+        if not piece:
+            continue
+        buffer += piece
+        if len(buffer) >= min_chars:
+            segments.append(buffer)
+            buffer = ''
+    if buffer:
+        # 末尾の短い区間は直前の区間に含める
+        if segments and len(buffer) < min_chars:
+            segments[-1] += buffer
+        else:
+            segments.append(buffer)
+    return segments
+
+
+class UtteranceLeveler:
+    """
+    1回の発話の区間の音量をそろえる
+
+    区間ごとの後処理（AudioPostProcessor）では区間ごとにピークで正規化されるため、
+    文ごとに聞こえる音量が変わる。先頭の区間のRMSから発話全体の基準を決め、
+    すべての区間をそのRMSに合わせる（ピークは LEVEL_PEAK_LIMIT を超えない）
+    """
+
+    def __init__(self):
+        self.target_rms: Optional[float] = None
+
+    def apply(self, pcm) -> bytes:
+        """
+        区間のPCMの音量を発話全体の基準に合わせる
+
+        Args:
+            pcm: 後処理済みのPCMデータ（16bit, モノラル）
+
+        Returns:
+            音量を合わせたPCMデータ
+        """
+        samples = np.frombuffer(pcm, dtype=np.int16, count=len(pcm) // 2).astype(np.float32)
+        rms = float(np.sqrt(np.mean(samples * samples))) if len(samples) else 0.0
+        if rms == 0.0:
+            return bytes(pcm)
+        if self.target_rms is None:
+            self.target_rms = rms * LEVEL_HEADROOM
+        peak = float(np.abs(samples).max())
+        gain = min(self.target_rms / rms, LEVEL_PEAK_LIMIT / peak, LEVEL_MAX_GAIN)
+        samples *= np.float32(gain)
+        return samples.astype(np.int16).tobytes()
+
+
+def is_stream_cached(
+    async_tts_service,
+    text: str,
+    voice_name: str = 'Kore',
+    language_code: str = 'ja-JP',
+    sample_rate: int = 24000
+) -> bool:
+    """
+    すべての区間がメモリキャッシュから返せるか（合成せずに送出できるか）
+
+    Args:
+        async_tts_service: AsyncTTSServiceのインスタンス
+        text: 合成するテキスト
+        voice_name: 音声の名前
+        language_code: 言語コード
+        sample_rate: 出力のサンプリングレート
+
+    Returns:
+        すべての区間がメモリキャッシュにある場合はTrue
+    """
+    return all(
+        async_tts_service.is_cached(segment, voice_name, language_code, 'wav', sample_rate)
+        for segment in split_japanese_sentences(text)
+    )
+
+
+async def stream_pcm_segments(
+    async_tts_service,
+    text: str,
+    voice_name: str = 'Kore',
+    language_code: str = 'ja-JP',
+    sample_rate: int = 24000
+) -> AsyncIterator[bytes]:
+    """
+    区間ごとに合成したPCM（16bit, モノラル）を先頭から順に返す
+
+    すべての区間の合成を先に投入し（同時実行数はAsyncTTSServiceで制限）、
+    先頭の区間が終わり次第返すため、後続の区間の合成は送出中に並行して進む。
+    区間の音量は UtteranceLeveler で発話全体にそろえる
+
+    Args:
+        async_tts_service: AsyncTTSServiceのインスタンス
+        text: 合成するテキスト
+        voice_name: 音声の名前
+        language_code: 言語コード
+        sample_rate: 出力のサンプリングレート
+
+    Yields:
+        区間ごとのPCMデータ
+    """
+    segments = split_japanese_sentences(text)
+    tasks = [
+        asyncio.ensure_future(async_tts_service.synthesize_speech(
+            text=segment,
+            voice_name=voice_name,
+            language_code=language_code,
+            sample_rate=sample_rate
+        ))
+        for segment in segments
+    ]
+    leveler = UtteranceLeveler()
+    try:
+        for index, task in enumerate(tasks):
+            wav_data = await task
+            logger.debug(f"[TTS Stream] Segment {index + 1}/{len(tasks)} ready: {segments[index][:20]}")
+            yield leveler.apply(pcm_from_audio_content(wav_data))
+    finally:
+        # 区間の合成の失敗・クライアント切断などで中断した場合は残りの合成を取り消し、
+        # 取り消した（または失敗した）区間の例外を回収する
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+            task.add_done_callback(_discard_segment)
+
+
+async def open_pcm_stream(
+    async_tts_service,
+    text: str,
+    voice_name: str = 'Kore',
+    language_code: str = 'ja-JP',
+    sample_rate: int = 24000
+) -> AsyncIterator[bytes]:
+    """
+    先頭の区間の合成を待ってから、区間ごとのPCMを返すイテレーターを返す
+
+    レスポンスのヘッダーを送る前に呼ぶことで、先頭の区間の合成に失敗した場合は
+    例外がそのまま送出され、呼び出し側でエラーのステータス（500）を返せる
+
+    Args:
+        async_tts_service: AsyncTTSServiceのインスタンス
+        text: 合成するテキスト
+        voice_name: 音声の名前
+        language_code: 言語コード
+        sample_rate: 出力のサンプリングレート
+
+    Returns:
+        区間ごとのPCMデータを返すイテレーター（先頭の区間は合成済み）
+    """
+    segments = stream_pcm_segments(async_tts_service, text, voice_name, language_code, sample_rate)
+    try:
+        first = await segments.__anext__()
+    except StopAsyncIteration:
+        first = None
+    return _prepend(first, segments)
+
+
+async def _prepend(first: Optional[bytes], rest: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """合成済みの先頭の区間に続けて、残りの区間を返す"""
+    try:
+        if first is not None:
+            yield first
+        async for pcm_data in rest:
+            yield pcm_data
+    finally:
+        await rest.aclose()
+
+
+def _discard_segment(task: asyncio.Future) -> None:
+    """送出しなかった区間の例外を回収する（未回収の例外の警告を出さない）"""
+    if not task.cancelled() and task.exception() is not None:
+        logger.debug(f"[TTS Stream] Discarded segment error: {task.exception()}")
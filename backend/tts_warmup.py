@@ -0,0 +1,223 @@
+"""
+固定案内文（プロンプトバンク）のTTS事前合成
+prompt_bank.json に列挙した案内文を、設定された全Chirp3音声で合成してTTSキャッシュに載せる
+サーバー起動時のバックグラウンド処理、またはCLIとして実行する
+
+CLI:
+    python tts_warmup.py [--manifest prompt_bank.json] [--voices Kore,Puck] [--concurrency 2]
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+import argparse
+from contextlib import asynccontextmanager
+from typing import Optional, List, Dict, Any
+
+from tts_streaming import split_japanese_sentences
+
+try:
+    import fcntl
+except ImportError:  # Windows（ローカル開発）ではワーカー間の排他をしない
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MANIFEST_PATH = os.path.join(os.path.dirname(__file__), 'prompt_bank.json')
+
+
+def load_prompt_bank(path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    プロンプトバンクのマニフェストを読み込む
+
+    Args:
+        path: マニフェストのパス（省略時は環境変数 TTS_PROMPT_BANK またはbackend/prompt_bank.json）
+
+    Returns:
+        マニフェストの内容
+    """
+    path = path or os.getenv('TTS_PROMPT_BANK', DEFAULT_MANIFEST_PATH)
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def resolve_voices(manifest: Dict[str, Any], available_voices, voices: Optional[List[str]] = None) -> List[str]:
+    """
+    事前合成する音声を決定
+
+    優先順位: 引数 > 環境変数 TTS_WARMUP_VOICES > マニフェストの voices
+    "all" を指定した場合は利用可能な全音声
+
+    Args:
+        manifest: マニフェスト
+        available_voices: 利用可能な音声名の一覧
+        voices: 明示的に指定する音声名のリスト
+
+    Returns:
+        音声名のリスト
+    """
+    if not voices:
+        env_voices = os.getenv('TTS_WARMUP_VOICES', '')
+        voices = [v.strip() for v in env_voices.split(',') if v.strip()] or manifest.get('voices', ['Kore'])
+    if 'all' in voices:
+        return list(available_voices)
+    unknown = [v for v in voices if v not in available_voices]
+    if unknown:
+        logger.warning(f"[TTS Warmup] Unknown voices are skipped: {unknown}")
+    return [v for v in voices if v in available_voices]
+
+
+def build_warmup_items(manifest: Dict[str, Any], include_segments: bool = True) -> List[str]:
+    """
+    事前合成するテキストの一覧を作成（重複は除く）
+
+    Args:
+        manifest: マニフェスト
+        include_segments: /api/tts/stream が使う文単位の区間も含めるか
+
+    Returns:
+        テキストのリスト
+    """
+    texts: List[str] = []
+    for prompt in manifest.get('prompts', []):
+        candidates = [prompt['text']]
+        if include_segments:
+            candidates += split_japanese_sentences(prompt['text'])
+        for text in candidates:
+            if text not in texts:
+                texts.append(text)
+    return texts
+
+
+async def warm_up_prompt_bank(
+    async_tts_service,
+    manifest: Optional[Dict[str, Any]] = None,
+    voices: Optional[List[str]] = None,
+    concurrency: Optional[int] = None,
+    include_segments: bool = True
+) -> Dict[str, Any]:
+    """
+    プロンプトバンクの全案内文を全音声で合成してキャッシュに載せる
+
+    Args:
+        async_tts_service: AsyncTTSServiceのインスタンス
+        manifest: マニフェスト（省略時は既定のファイルを読み込む）
+        voices: 合成する音声名のリスト
+        concurrency: 同時に合成する数（省略時は環境変数 TTS_WARMUP_CONCURRENCY）
+        include_segments: /api/tts/stream が使う文単位の区間も合成するか
+
+    Returns:
+        実行結果のサマリー
+    """
+    manifest = manifest or load_prompt_bank()
+    tts_service = async_tts_service.tts_service
+    voices = resolve_voices(manifest, tts_service.CHIRP3_HD_VOICES, voices)
+    language_code = manifest.get('languageCode', 'ja-JP')
+    concurrency = concurrency or int(os.getenv('TTS_WARMUP_CONCURRENCY', '2'))
+    texts = build_warmup_items(manifest, include_segments)
+
+    summary = {
+        'voices': voices,
+        'items': len(texts) * len(voices),
+        'already_cached': 0,
+        'synthesized': 0,
+        'failed': 0,
+    }
+    semaphore = asyncio.Semaphore(concurrency)
+    started = time.perf_counter()
+
+    async def warm(text: str, voice_name: str):
+        async with semaphore:
+            if tts_service.get_cached_speech(text, voice_name, language_code) is not None:
+                summary['already_cached'] += 1
+                return
+            try:
+                await async_tts_service.synthesize_speech(
+                    text=text,
+                    voice_name=voice_name,
+                    language_code=language_code
+                )
+                summary['synthesized'] += 1
+            except Exception as e:
+                summary['failed'] += 1
+                logger.error(f"[TTS Warmup] Failed ({voice_name}): {text[:30]}... {e}")
+
+    logger.info(f"[TTS Warmup] Warming {summary['items']} items (voices: {voices}, concurrency: {concurrency})")
+    await asyncio.gather(*[warm(text, voice) for voice in voices for text in texts])
+
+    summary['elapsed_seconds'] = round(time.perf_counter() - started, 2)
+    logger.info(f"[TTS Warmup] Done: {summary}")
+    return summary
+
+
+@asynccontextmanager
+async def _exclusive_warmup(lock_path: Optional[str]):
+    """
+    gunicornの複数ワーカーが同時に同じ案内文を合成しないよう、ファイルロックで1ワーカーずつ実行する
+    後から実行するワーカーは先行ワーカーが書いたディスクキャッシュを読むだけになる
+    """
+    if fcntl is None or not lock_path:
+        yield
+        return
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    with open(lock_path, 'w') as lock_file:
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                await asyncio.sleep(1)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+async def run_startup_warmup(async_tts_service) -> Optional[Dict[str, Any]]:
+    """
+    サーバー起動時の事前合成（TTS_WARMUP_ON_START=true の場合のみ）
+
+    Args:
+        async_tts_service: AsyncTTSServiceのインスタンス
+
+    Returns:
+        実行結果のサマリー（実行しなかった場合はNone）
+    """
+    if os.getenv('TTS_WARMUP_ON_START', 'false').lower() != 'true':
+        return None
+    cache = async_tts_service.tts_service.cache
+    lock_path = os.path.join(cache.disk_dir, 'warmup.lock') if cache and cache.disk_dir else None
+    try:
+        async with _exclusive_warmup(lock_path):
+            return await warm_up_prompt_bank(async_tts_service)
+    except Exception as e:
+        logger.error(f"[TTS Warmup] Startup warm-up failed: {e}")
+        return None
+
+
+def main() -> None:
+    from google_cloud_tts import GoogleCloudTTSService
+    from async_tts import AsyncTTSService
+
+    parser = argparse.ArgumentParser(description='プロンプトバンクをTTSキャッシュに事前合成する')
+    parser.add_argument('--manifest', default=None, help='マニフェストのパス')
+    parser.add_argument('--voices', default=None, help='カンマ区切りの音声名（all で全音声）')
+    parser.add_argument('--concurrency', type=int, default=None, help='同時に合成する数')
+    parser.add_argument('--no-segments', action='store_true', help='文単位の区間は合成しない')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    async_tts_service = AsyncTTSService(GoogleCloudTTSService())
+    summary = asyncio.run(warm_up_prompt_bank(
+        async_tts_service,
+        manifest=load_prompt_bank(args.manifest),
+        voices=args.voices.split(',') if args.voices else None,
+        concurrency=args.concurrency,
+        include_segments=not args.no_segments
+    ))
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
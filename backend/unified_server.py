@@ -16,6 +16,13 @@ from dotenv import load_dotenv
 
 # Google Cloud TTSをインポート
 from google_cloud_tts import GoogleCloudTTSService
+from async_tts import AsyncTTSService
+from tts_streaming import is_stream_cached, open_pcm_stream
+from tts_warmup import run_startup_warmup
+from ws_bridge import bridge_websocket
+from tts_formats import AUDIO_FILE_EXTENSIONS, negotiate_audio_format, parse_sample_rate, audio_content_type
+from tts_batch import BATCH_CONTENT_TYPE, is_batch_cached, parse_batch_items, synthesize_batch
+from http_cache import TTS_CACHE_CONTROL, weak_etag, etag_matches
 
 # .envファイルを読み込む
 env_path = Path(__file__).parent / '.env'
@@ -27,9 +34,14 @@ if env_path.exists():
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+# ワーカーごとの受け付け制限（.env の上限を読み込んだ後にインポートする）
+from admission import ws_sessions, tts_requests, get_load, busy_response, AdmissionRejected, synthesize_with_admission
+
 # 既存のWebSocketハンドラーをインポート
 try:
-    from main import handle_client, proxy, PROJECT_ID, PORT
+    from main import handle_client, proxy, PROJECT_ID, PORT, start_upstream_pool, close_upstream_pool
+    from main import get_proxy_stats
+    from proxy_metrics import proxy_metrics
     logger.info("Successfully imported WebSocket handlers from main.py")
 except ImportError as e:
     logger.warning(f"Failed to import from main.py: {e}")
@@ -37,6 +49,10 @@ except ImportError as e:
     PORT = int(os.getenv("PORT", "8080"))
     handle_client = None
     proxy = None
+    start_upstream_pool = None
+    close_upstream_pool = None
+    get_proxy_stats = None
+    proxy_metrics = None
 
 # 基本認証の設定
 BASIC_AUTH_USERNAME = os.getenv("BASIC_AUTH_USERNAME", "jre-admin")
@@ -44,6 +60,8 @@ BASIC_AUTH_PASSWORD = os.getenv("BASIC_AUTH_PASSWORD", "jre-password-axcxeptplt"
 
 # Google Cloud TTSサービスの初期化
 tts_service = GoogleCloudTTSService()
+# 合成はスレッドプールで実行してイベントループを止めない
+async_tts_service = AsyncTTSService(tts_service)
 
 # aiohttp Applicationの作成
 app = web.Application()
@@ -101,9 +119,19 @@ async def health_check(request):
         "service": "Unified Server (Python)",
         "features": ["WebSocket Proxy", "Google Cloud TTS"],
         "websocket": "ready" if handle_client else "not_available",
-        "tts": "ready"
+        "tts": "ready",
+        # ロードバランサー向けのワーカーの負荷と空き
+        "load": get_load()
     })
 
+async def readiness_check(request):
+    """レディネスチェック（ワーカーに空きがなければ503。ロードバランサーが混んでいるワーカーを避ける）"""
+    load = get_load()
+    return web.json_response(
+        {"status": "ready" if load["accepting"] else "busy", "load": load},
+        status=200 if load["accepting"] else 503
+    )
+
 async def synthesize_speech(request):
     """音声合成エンドポイント"""
     try:
@@ -118,24 +146,85 @@ async def synthesize_speech(request):
                 status=400
             )
         
-        logger.info(f"[TTS] Synthesizing with voice: {voice_name}")
+        # 出力フォーマット（audioFormat 指定 > Acceptヘッダー > WAV）
+        audio_format = negotiate_audio_format(
+            request.headers.get('Accept'),
+            data.get('audioFormat')
+        )
+        sample_rate = parse_sample_rate(data.get('sampleRate'), audio_format)
         
-        # 音声合成
-        audio_data = tts_service.synthesize_speech(
-            text=text,
-            voice_name=voice_name,
-            language_code=language_code
+        logger.info(f"[TTS] Synthesizing with voice: {voice_name} ({audio_format})")
+        
+        # 音声合成（キャッシュ済みの場合はTTS APIを呼ばず、ワーカーの同時処理数の枠も使わずに返る）
+        audio_data = await synthesize_with_admission(
+            tts_requests, async_tts_service, text, voice_name, language_code, audio_format, sample_rate
         )
         
-        # WAVファイルとして返す
         return web.Response(
             body=audio_data,
-            content_type='audio/wav',
             headers={
-                'Content-Disposition': 'inline; filename=speech.wav'
+                'Content-Type': audio_content_type(audio_format, sample_rate),
+                'Content-Disposition': f'inline; filename=speech.{AUDIO_FILE_EXTENSIONS[audio_format]}',
+                'Vary': 'Accept'
             }
         )
         
+    except AdmissionRejected as e:
+        return busy_response(e.limiter)
+    except ValueError as e:
+        return web.json_response({"error": str(e)}, status=400)
+    except Exception as e:
+        logger.error(f"[TTS] Error: {e}")
+        return web.json_response(
+            {"error": f"Speech synthesis failed: {str(e)}"},
+            status=500
+        )
+
+async def synthesize_speech_get(request):
+    """
+    音声合成エンドポイント（GET版、ブラウザ・リバースプロキシでキャッシュ可能）
+    /api/tts/synthesize?text=...&voiceName=Kore&languageCode=ja-JP&audioFormat=wav&sampleRate=24000
+    """
+    text = request.query.get('text', '')
+    voice_name = request.query.get('voiceName', 'Kore')
+    language_code = request.query.get('languageCode', 'ja-JP')
+    
+    if not text:
+        return web.json_response(
+            {"error": "Text is required"},
+            status=400
+        )
+    if voice_name not in tts_service.CHIRP3_HD_VOICES:
+        return web.json_response(
+            {"error": f"Invalid voice name. Available: {list(tts_service.CHIRP3_HD_VOICES.keys())}"},
+            status=400
+        )
+    
+    try:
+        audio_format = negotiate_audio_format(
+            request.headers.get('Accept'),
+            request.query.get('audioFormat')
+        )
+        sample_rate = parse_sample_rate(request.query.get('sampleRate'), audio_format)
+    except ValueError as e:
+        return web.json_response({"error": str(e)}, status=400)
+    
+    # ETagは合成の条件のハッシュ（合成しなくても決まる）ため、一致すれば何もせずに304を返す
+    etag = weak_etag(tts_service.content_hash(text, voice_name, language_code, audio_format, sample_rate))
+    cache_headers = {
+        'ETag': etag,
+        'Cache-Control': TTS_CACHE_CONTROL,
+        'Vary': 'Accept'
+    }
+    if etag_matches(request.headers.get('If-None-Match'), etag):
+        return web.Response(status=304, headers=cache_headers)
+    
+    try:
+        audio_data = await synthesize_with_admission(
+            tts_requests, async_tts_service, text, voice_name, language_code, audio_format, sample_rate
+        )
+    except AdmissionRejected as e:
+        return busy_response(e.limiter)
     except ValueError as e:
         return web.json_response({"error": str(e)}, status=400)
     except Exception as e:
@@ -144,6 +233,134 @@ async def synthesize_speech(request):
             {"error": f"Speech synthesis failed: {str(e)}"},
             status=500
         )
+    
+    return web.Response(
+        body=audio_data,
+        headers={
+            'Content-Type': audio_content_type(audio_format, sample_rate),
+            'Content-Disposition': f'inline; filename=speech.{AUDIO_FILE_EXTENSIONS[audio_format]}',
+            **cache_headers
+        }
+    )
+
+async def stream_speech(request):
+    """音声合成ストリーミングエンドポイント（文単位で合成できた順にPCMを送出）"""
+    try:
+        data = await request.json()
+    except Exception:
+        return web.json_response({"error": "Invalid JSON"}, status=400)
+    
+    text = data.get('text', '')
+    voice_name = data.get('voiceName', 'Kore')
+    language_code = data.get('languageCode', 'ja-JP')
+    
+    if not text:
+        return web.json_response(
+            {"error": "Text is required"},
+            status=400
+        )
+    if voice_name not in tts_service.CHIRP3_HD_VOICES:
+        return web.json_response(
+            {"error": f"Invalid voice name. Available: {list(tts_service.CHIRP3_HD_VOICES.keys())}"},
+            status=400
+        )
+    try:
+        sample_rate = parse_sample_rate(data.get('sampleRate'), 'pcm')
+    except ValueError as e:
+        return web.json_response({"error": str(e)}, status=400)
+    
+    logger.info(f"[TTS Stream] Synthesizing with voice: {voice_name}")
+    
+    # 合成する区間がある場合（すべてメモリキャッシュにある場合以外）だけ、ワーカーの同時処理数の枠を使う
+    try:
+        with tts_requests.slot(needed=not is_stream_cached(async_tts_service, text, voice_name, language_code, sample_rate)):
+            return await write_speech_stream(request, text, voice_name, language_code, sample_rate)
+    except AdmissionRejected as e:
+        return busy_response(e.limiter)
+
+async def write_speech_stream(request, text, voice_name, language_code, sample_rate):
+    """stream_speech で受け付けたテキストの音声を送出する"""
+    # 16bit リトルエンディアン モノラルのPCMをチャンク転送で返す
+    response = web.StreamResponse(
+        headers={
+            'Content-Type': audio_content_type('pcm', sample_rate),
+            'X-Audio-Sample-Rate': str(sample_rate),
+            'X-Audio-Channels': '1',
+            'Cache-Control': 'no-cache'
+        }
+    )
+    # 先頭の区間の合成を待ってからヘッダーを送る（失敗した場合は500を返せるように）
+    try:
+        segments = await open_pcm_stream(
+            async_tts_service,
+            text=text,
+            voice_name=voice_name,
+            language_code=language_code,
+            sample_rate=sample_rate
+        )
+    except Exception as e:
+        logger.error(f"[TTS Stream] Error: {e}")
+        return web.json_response({"error": f"Speech synthesis failed: {str(e)}"}, status=500)
+    
+    response.enable_chunked_encoding()
+    await response.prepare(request)
+    
+    try:
+        async for pcm_data in segments:
+            await response.write(pcm_data)
+    except Exception as e:
+        # ヘッダー送信後のためステータスは変えられない（送出を打ち切る）
+        logger.error(f"[TTS Stream] Error: {e}")
+    finally:
+        # 残りの区間の合成を取り消す
+        await segments.aclose()
+    
+    await response.write_eof()
+    return response
+
+async def synthesize_batch_speech(request):
+    """音声バッチ合成エンドポイント（複数の案内文を並行に合成し、合成できた順に返す）"""
+    try:
+        data = await request.json()
+        items = parse_batch_items(data)
+        audio_format = negotiate_audio_format(None, data.get('audioFormat'))
+        sample_rate = parse_sample_rate(data.get('sampleRate'), audio_format)
+    except ValueError as e:
+        return web.json_response({"error": str(e)}, status=400)
+    except Exception:
+        return web.json_response({"error": "Invalid JSON"}, status=400)
+    
+    logger.info(f"[TTS Batch] Synthesizing {len(items)} items ({audio_format})")
+    
+    # 合成するアイテムがある場合（すべてメモリキャッシュにある場合以外）だけ、ワーカーの同時処理数の枠を使う
+    try:
+        with tts_requests.slot(needed=not is_batch_cached(async_tts_service, items, audio_format, sample_rate)):
+            return await write_speech_batch(request, items, audio_format, sample_rate)
+    except AdmissionRejected as e:
+        return busy_response(e.limiter)
+
+async def write_speech_batch(request, items, audio_format, sample_rate):
+    """synthesize_batch_speech で受け付けたアイテムの音声を送出する"""
+    # アイテムごとに長さ付きのパートをチャンク転送で返す
+    response = web.StreamResponse(
+        headers={
+            'Content-Type': BATCH_CONTENT_TYPE,
+            'X-TTS-Batch-Items': str(len(items)),
+            'Cache-Control': 'no-cache'
+        }
+    )
+    response.enable_chunked_encoding()
+    await response.prepare(request)
+    
+    try:
+        async for part in synthesize_batch(async_tts_service, items, audio_format, sample_rate):
+            await response.write(part)
+    except ConnectionResetError:
+        logger.info("[TTS Batch] Client disconnected")
+        return response
+    
+    await response.write_eof()
+    return response
 
 async def get_voices(request):
     """利用可能な音声のリスト"""
@@ -151,6 +368,29 @@ async def get_voices(request):
         "voices": tts_service.get_available_voices()
     })
 
+async def get_cache_stats(request):
+    """TTSキャッシュの統計情報"""
+    return web.json_response({
+        "cache": tts_service.get_cache_stats(),
+        "executor": async_tts_service.get_stats()
+    })
+
+async def proxy_stats(request):
+    """Geminiプロキシの統計情報（セッションごとの送信キューの深さ・破棄数など）"""
+    if not get_proxy_stats:
+        return web.json_response({"error": "WebSocket proxy is not available"}, status=503)
+    return web.json_response(get_proxy_stats())
+
+async def metrics(request):
+    """Geminiプロキシのセッション計測のヒストグラム（Prometheusのテキスト形式、ワーカーごと）"""
+    if not proxy_metrics:
+        return web.json_response({"error": "WebSocket proxy is not available"}, status=503)
+    return web.Response(
+        text=proxy_metrics.render_prometheus(),
+        content_type="text/plain",
+        headers={"Cache-Control": "no-store"}
+    )
+
 # =====================================
 # 既存のWebSocketハンドラー
 # =====================================
@@ -158,8 +398,11 @@ async def get_voices(request):
 async def websocket_handler(request):
     """既存のWebSocketハンドラー"""
     if handle_client:
-        # main.pyのhandle_clientを使用
-        return await handle_client(request)
+        # セッション数が上限に達していれば、アップグレードせずに 503 + Retry-After を返す
+        if ws_sessions.headroom == 0:
+            return busy_response(ws_sessions)
+        # aiohttpのWebSocketをwebsocketsのインターフェースに合わせてmain.pyのhandle_clientに渡す
+        return await bridge_websocket(request, handle_client)
     else:
         # フォールバック（main.pyがない場合）
         ws = web.WebSocketResponse()
@@ -202,12 +445,36 @@ async def config_handler(request):
 
 # TTS API（新規）
 app.router.add_get('/api/health', health_check)
+app.router.add_get('/api/ready', readiness_check)
 app.router.add_post('/api/tts/synthesize', synthesize_speech)
+app.router.add_get('/api/tts/synthesize', synthesize_speech_get)
+app.router.add_post('/api/tts/stream', stream_speech)
+app.router.add_post('/api/tts/batch', synthesize_batch_speech)
 app.router.add_get('/api/tts/voices', get_voices)
+app.router.add_get('/api/tts/cache/stats', get_cache_stats)
+app.router.add_get('/api/proxy/stats', proxy_stats)
+app.router.add_get('/api/metrics', metrics)
 
 # 既存のAPI
 app.router.add_get('/api/config', config_handler)
 
+# 固定案内文の事前合成（TTS_WARMUP_ON_START=true の場合、起動後にバックグラウンドで実行）
+async def start_tts_warmup(app):
+    app['tts_warmup_task'] = asyncio.create_task(run_startup_warmup(async_tts_service))
+
+async def stop_tts_warmup(app):
+    task = app.get('tts_warmup_task')
+    if task and not task.done():
+        task.cancel()
+
+app.on_startup.append(start_tts_warmup)
+app.on_cleanup.append(stop_tts_warmup)
+
+# 上流（Gemini Live）接続のプールを起動時から補充しておく
+if start_upstream_pool:
+    app.on_startup.append(start_upstream_pool)
+    app.on_cleanup.append(close_upstream_pool)
+
 # WebSocket
 app.router.add_get('/ws', websocket_handler)
 
@@ -247,7 +514,11 @@ if __name__ == '__main__':
     Endpoints:
     - WebSocket: ws://localhost:{PORT}/ws
     - TTS API: http://localhost:{PORT}/api/tts/synthesize
+    - TTS Stream: http://localhost:{PORT}/api/tts/stream
     - Voices: http://localhost:{PORT}/api/tts/voices
+    - TTS Cache: http://localhost:{PORT}/api/tts/cache/stats
+    - Proxy Stats: http://localhost:{PORT}/api/proxy/stats
+    - Metrics: http://localhost:{PORT}/api/metrics
     - Health: http://localhost:{PORT}/api/health
     - Config: http://localhost:{PORT}/api/config
     
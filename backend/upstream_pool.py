@@ -0,0 +1,201 @@
+"""
+Gemini Live（上流）WebSocket接続のプール
+/ws の接続ごとに websockets.connect すると、DNS・TLSハンドシェイク・認証が
+最初の音声より前に毎回発生するため、接続済み・認証済みの上流接続をワーカーごとに
+数本用意しておき、新しいセッションに渡す。使った分はバックグラウンドで補充する
+
+- アイドル接続は TTL を過ぎたら閉じて作り直す（上流側のアイドル切断を避ける）
+- プールが空の場合はその場で接続する（待たない）
+- 補充に失敗した場合は間隔を倍にして再試行し、UPSTREAM_POOL_MAX_FAILURES 回続けて失敗したら
+  補充を止める（認証情報がない場合などに空のトークンで接続し続けない）。
+  その場での接続に成功すると補充を再開する
+- 既定は無効（UPSTREAM_POOL_SIZE=0）。有効にするとワーカーごとに UPSTREAM_POOL_SIZE 本の
+  Gemini Live のセッションを、キオスクが接続していない間も保持し、TTL ごとに作り直す
+  （ワーカー数 × UPSTREAM_POOL_SIZE 本分の上流接続が常に開くため、割り当て・課金を確認して有効にする）
+"""
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Any, Optional, Tuple
+
+from websockets.protocol import State
+
+logger = logging.getLogger(__name__)
+
+# ワーカーあたりのアイドル接続数（0でプールを使わない。既定）と、アイドル接続の有効期間（秒）
+UPSTREAM_POOL_SIZE = int(os.getenv('UPSTREAM_POOL_SIZE', '0'))
+UPSTREAM_POOL_TTL = float(os.getenv('UPSTREAM_POOL_TTL', '45'))
+# 補充を止めるまでの連続失敗回数と、再試行の間隔の上限（秒）
+UPSTREAM_POOL_MAX_FAILURES = int(os.getenv('UPSTREAM_POOL_MAX_FAILURES', '5'))
+UPSTREAM_POOL_MAX_RETRY_INTERVAL = 60.0
+
+
+class UpstreamConnectionPool:
+    """接続済みの上流WebSocketを保持し、補充するプール"""
+
+    def __init__(
+        self,
+        connect: Callable[[], Awaitable[Any]],
+        size: int = UPSTREAM_POOL_SIZE,
+        ttl: float = UPSTREAM_POOL_TTL,
+        retry_interval: float = 5.0,
+        max_failures: int = UPSTREAM_POOL_MAX_FAILURES
+    ):
+        """
+        初期化
+        Args:
+            connect: 認証済みの上流接続を開くコルーチン関数
+            size: 保持するアイドル接続数
+            ttl: アイドル接続の有効期間（秒）
+            retry_interval: 接続に失敗した場合に再試行するまでの秒数（失敗が続くたびに倍にする）
+            max_failures: 補充を止めるまでの連続失敗回数
+        """
+        self._connect = connect
+        self.size = size
+        self.ttl = ttl
+        self.retry_interval = retry_interval
+        self.max_failures = max_failures
+        self._failures = 0
+        self._idle: Deque[Tuple[Any, float]] = deque()
+        self._wakeup = asyncio.Event()
+        self._refill_task: Optional[asyncio.Task] = None
+        self._closed = False
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'expired': 0,
+            'discarded': 0,
+            'connect_errors': 0,
+            'connects': 0,
+            'connect_ms_total': 0.0,
+        }
+
+    def start(self) -> None:
+        """バックグラウンドの補充を開始（実行中のイベントループ上で呼ぶ）"""
+        if self._refill_task is None and self.size > 0 and not self.suspended:
+            self._refill_task = asyncio.create_task(self._refill_loop())
+
+    @property
+    def suspended(self) -> bool:
+        """補充の失敗が続いて補充を止めているか"""
+        return self._failures >= self.max_failures
+
+    async def acquire(self) -> Any:
+        """
+        上流接続を取得（プールが空ならその場で接続する）
+
+        Returns:
+            接続済みの上流WebSocket（使い終わったら呼び出し側で close する）
+        """
+        self.start()
+        self._prune()
+        connection = None
+        if self._idle:
+            connection, _ = self._idle.popleft()
+            self._stats['hits'] += 1
+        # 取り出した分をすぐに補充する
+        self._wakeup.set()
+        if connection is not None:
+            return connection
+        self._stats['misses'] += 1
+        connection = await self._open()
+        if self.suspended:
+            # 接続できるようになったため補充を再開する
+            logger.info("[Upstream Pool] Upstream connection succeeded, resuming refill")
+            self._failures = 0
+            self.start()
+        return connection
+
+    async def close(self) -> None:
+        """補充を止め、アイドル接続をすべて閉じる"""
+        self._closed = True
+        if self._refill_task:
+            self._refill_task.cancel()
+            try:
+                await self._refill_task
+            except asyncio.CancelledError:
+                pass
+        while self._idle:
+            connection, _ = self._idle.popleft()
+            await self._close_quietly(connection)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """プールの状態とカウンタを取得"""
+        connects = self._stats['connects']
+        return {
+            'size': self.size,
+            'ttl': self.ttl,
+            'idle': len(self._idle),
+            'consecutive_failures': self._failures,
+            'suspended': self.suspended,
+            **{k: v for k, v in self._stats.items() if k != 'connect_ms_total'},
+            'avg_connect_ms': round(self._stats['connect_ms_total'] / connects, 1) if connects else None,
+        }
+
+    async def _open(self) -> Any:
+        """上流に接続し、接続にかかった時間を記録する"""
+        started = time.perf_counter()
+        try:
+            connection = await self._connect()
+        except Exception:
+            self._stats['connect_errors'] += 1
+            raise
+        self._stats['connects'] += 1
+        self._stats['connect_ms_total'] += (time.perf_counter() - started) * 1000
+        return connection
+
+    def _prune(self) -> None:
+        """期限切れ・切断済みのアイドル接続を取り除く"""
+        now = time.monotonic()
+        alive: Deque[Tuple[Any, float]] = deque()
+        while self._idle:
+            connection, opened_at = self._idle.popleft()
+            if connection.state is not State.OPEN:
+                self._stats['discarded'] += 1
+            elif now - opened_at > self.ttl:
+                self._stats['expired'] += 1
+                asyncio.ensure_future(self._close_quietly(connection))
+            else:
+                alive.append((connection, opened_at))
+        self._idle = alive
+
+    async def _refill_loop(self) -> None:
+        """アイドル接続を size 本に保つ"""
+        while not self._closed:
+            # 補充中に取り出された場合も取りこぼさないよう、先にクリアしておく
+            self._wakeup.clear()
+            self._prune()
+            try:
+                while len(self._idle) < self.size:
+                    connection = await self._open()
+                    self._idle.append((connection, time.monotonic()))
+                    self._failures = 0
+                delay = self.ttl / 2
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._failures += 1
+                if self.suspended:
+                    logger.error(
+                        f"[Upstream Pool] Failed to open upstream connection {self._failures} times in a row, "
+                        f"stopping refill: {e}"
+                    )
+                    self._refill_task = None
+                    return
+                delay = min(self.retry_interval * 2 ** (self._failures - 1), UPSTREAM_POOL_MAX_RETRY_INTERVAL)
+                logger.warning(f"[Upstream Pool] Failed to open upstream connection (retry in {delay:.0f}s): {e}")
+
+            # 取り出されるか、期限切れの確認時刻になるまで待つ
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    @staticmethod
+    async def _close_quietly(connection: Any) -> None:
+        try:
+            await connection.close()
+        except Exception:
+            pass
@@ -0,0 +1,228 @@
+"""
+プロキシでの入力音声の音声区間検出（VAD）ゲート
+キオスクはマイクのPCMを常に送り続けるため、無音や駅の環境音もすべて上流（Vertex AI）に送られる。
+realtime_input の音声だけをデコードし、20msごとのエネルギーとゼロ交差率（NumPyでまとめて計算）
+から発話を判定して、発話でない区間は上流に送らない
+
+- 発話の判定: エネルギーが閾値を超える（有声音）、または閾値より少し低くてもゼロ交差率が高い（無声子音）
+- 閾値は固定の下限（PROXY_VAD_MIN_ENERGY_DB）と、環境音のレベル＋マージン（PROXY_VAD_MARGIN_DB）の
+  大きい方。環境音のレベルは直近3秒のエネルギーの下位10%点とする（発話には音節の間の
+  途切れがあるため、発話中も環境音のレベルに近い値になる。駅の環境音に合わせて上がる）
+- 発話の後は PROXY_VAD_HANGOVER_MS の間は送り続ける（Geminiの発話終了の検出に無音が必要なため）
+- 発話の開始時は直前の PROXY_VAD_PREROLL_MS 分の音声を先に送る（語頭を切らない）
+- 無音の間も PROXY_VAD_KEEPALIVE_MS ごとに1フレームだけ送る（上流の接続と発話検出を保つ）
+"""
+import os
+import base64
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from audio_coalescer import parse_audio_frame
+from relay_queue import is_audio_input
+
+Message = Union[str, bytes]
+
+PROXY_VAD_ENABLED = os.getenv('PROXY_VAD_ENABLED', 'false').lower() == 'true'
+PROXY_VAD_MIN_ENERGY_DB = float(os.getenv('PROXY_VAD_MIN_ENERGY_DB', '-50'))
+PROXY_VAD_MARGIN_DB = float(os.getenv('PROXY_VAD_MARGIN_DB', '10'))
+PROXY_VAD_HANGOVER_MS = float(os.getenv('PROXY_VAD_HANGOVER_MS', '800'))
+PROXY_VAD_PREROLL_MS = float(os.getenv('PROXY_VAD_PREROLL_MS', '300'))
+PROXY_VAD_KEEPALIVE_MS = float(os.getenv('PROXY_VAD_KEEPALIVE_MS', '1000'))
+
+# 判定の単位（ミリ秒）と、mime type にレートがない場合のサンプリングレート
+VAD_FRAME_MS = 20
+DEFAULT_INPUT_RATE = 16000
+
+# 無声子音とみなすゼロ交差率と、そのときに許す閾値からの不足分（dB）
+UNVOICED_ZCR = 0.25
+UNVOICED_MARGIN_DB = 6.0
+
+# 環境音のレベルを推定する区間（判定の単位の数）と下位の割合、最初の値（dBFS）
+NOISE_WINDOW_FRAMES = 3000 // VAD_FRAME_MS
+NOISE_PERCENTILE = 10
+INITIAL_NOISE_FLOOR_DB = -70.0
+
+
+def frame_features(samples: np.ndarray, frame_len: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    短時間フレームごとのエネルギーとゼロ交差率を計算
+
+    Args:
+        samples: int16のPCMサンプル
+        frame_len: フレームのサンプル数
+
+    Returns:
+        (エネルギー[dBFS], ゼロ交差率) の配列。端数のサンプルは1フレームとして扱う
+    """
+    count = max(1, -(-len(samples) // frame_len))
+    padded = np.zeros(count * frame_len, dtype=np.float32)
+    padded[:len(samples)] = samples
+    frames = padded.reshape(count, frame_len) / 32768.0
+    energy_db = 10.0 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+    signs = np.signbit(frames)
+    zcr = np.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+    return energy_db, zcr
+
+
+def sample_rate_of(mime_type: str) -> int:
+    """mime type（audio/pcm;rate=16000）からサンプリングレートを取得"""
+    for param in mime_type.split(';')[1:]:
+        key, _, value = param.strip().partition('=')
+        if key == 'rate' and value.isdigit():
+            return int(value)
+    return DEFAULT_INPUT_RATE
+
+
+class VoiceActivityGate:
+    """入力音声のフレームを、発話区間（と前後の余白・キープアライブ）だけ通すゲート"""
+
+    def __init__(
+        self,
+        min_energy_db: float = PROXY_VAD_MIN_ENERGY_DB,
+        margin_db: float = PROXY_VAD_MARGIN_DB,
+        hangover_ms: float = PROXY_VAD_HANGOVER_MS,
+        preroll_ms: float = PROXY_VAD_PREROLL_MS,
+        keepalive_ms: float = PROXY_VAD_KEEPALIVE_MS,
+        on_speech: Optional[Callable[[], None]] = None
+    ):
+        """
+        初期化
+        Args:
+            min_energy_db: 発話とみなすエネルギーの下限（dBFS）
+            margin_db: 環境音のレベルに対するマージン（dB）
+            hangover_ms: 発話の後に送り続ける時間（ミリ秒）
+            preroll_ms: 発話の開始時に先に送る直前の音声の長さ（ミリ秒）
+            keepalive_ms: 無音の間に1フレームだけ送る間隔（ミリ秒、0で送らない）
+            on_speech: 発話と判定したフレームごとに呼ぶコールバック（計測用）
+        """
+        self.min_energy_db = min_energy_db
+        self.margin_db = margin_db
+        self.hangover = hangover_ms / 1000
+        self.preroll = preroll_ms / 1000
+        self.keepalive = keepalive_ms / 1000
+        self.on_speech = on_speech
+        self.noise_floor_db = INITIAL_NOISE_FLOOR_DB
+        # 直近のフレームのエネルギー（リングバッファ）
+        self._levels = np.zeros(NOISE_WINDOW_FRAMES, dtype=np.float32)
+        self._levels_pos = 0
+        self._levels_filled = 0
+        self._hangover_left = 0.0
+        self._since_keepalive = 0.0
+        # 送らなかった直前の音声（メッセージ, 長さ[秒]）
+        self._preroll: Deque[Tuple[Message, float]] = deque()
+        self._preroll_duration = 0.0
+        self._stats = {
+            'frames_in': 0,
+            'bytes_in': 0,
+            'frames_out': 0,
+            'bytes_out': 0,
+            'speech_onsets': 0,
+            'keepalives': 0,
+        }
+
+    def process(self, message: Message) -> List[Message]:
+        """
+        クライアントからのフレームを受け取り、上流に送るフレームを返す
+
+        Args:
+            message: クライアントからのフレーム
+
+        Returns:
+            送るフレームのリスト（音声以外のフレームはそのまま返す）
+        """
+        if not is_audio_input(message):
+            return [message]
+        parsed = parse_audio_frame(message)
+        if parsed is None:
+            return [message]
+
+        speech, duration = self._detect(parsed[2])
+        self._stats['frames_in'] += 1
+        self._stats['bytes_in'] += len(message)
+
+        if speech:
+            if self.on_speech is not None:
+                self.on_speech()
+            if self._hangover_left <= 0:
+                self._stats['speech_onsets'] += 1
+            self._hangover_left = self.hangover
+            output = [preroll for preroll, _ in self._preroll] + [message]
+            self._preroll.clear()
+            self._preroll_duration = 0.0
+            self._since_keepalive = 0.0
+        elif self._hangover_left > 0:
+            self._hangover_left -= duration
+            output = [message]
+        else:
+            self._since_keepalive += duration
+            if self.keepalive > 0 and self._since_keepalive >= self.keepalive:
+                self._since_keepalive = 0.0
+                self._stats['keepalives'] += 1
+                # 溜めていたプリロールはキープアライブより前の音声のため、後から送ると順序が入れ替わる。
+                # 捨てて、キープアライブの後の音声からプリロールを溜め直す
+                self._preroll.clear()
+                self._preroll_duration = 0.0
+                output = [message]
+            else:
+                self._keep_for_preroll(message, duration)
+                output = []
+
+        for sent in output:
+            self._stats['frames_out'] += 1
+            self._stats['bytes_out'] += len(sent)
+        return output
+
+    def get_stats(self) -> Dict[str, Any]:
+        """送らずに済んだフレーム数・バイト数"""
+        stats = self._stats
+        return {
+            **stats,
+            'frames_saved': stats['frames_in'] - stats['frames_out'],
+            'bytes_saved': stats['bytes_in'] - stats['bytes_out'],
+            'noise_floor_db': round(self.noise_floor_db, 1),
+        }
+
+    def _detect(self, chunks: List[dict]) -> Tuple[bool, float]:
+        """チャンクのPCMから発話を含むか判定し、環境音のレベルを更新する（発話か, 長さ[秒]）"""
+        speech = False
+        duration = 0.0
+        for chunk in chunks:
+            mime_type = str(chunk.get('mime_type', chunk.get('mimeType', '')))
+            if not mime_type.startswith('audio/pcm'):
+                continue
+            pcm = base64.b64decode(chunk['data'])
+            samples = np.frombuffer(pcm[:len(pcm) - len(pcm) % 2], dtype='<i2')
+            if len(samples) == 0:
+                continue
+            rate = sample_rate_of(mime_type)
+            duration += len(samples) / rate
+            energy_db, zcr = frame_features(samples, rate * VAD_FRAME_MS // 1000)
+            self._update_noise_floor(energy_db)
+
+            threshold = max(self.min_energy_db, self.noise_floor_db + self.margin_db)
+            voiced = energy_db > threshold
+            unvoiced = (energy_db > threshold - UNVOICED_MARGIN_DB) & (zcr > UNVOICED_ZCR)
+            is_speech = voiced | unvoiced
+            speech = speech or bool(is_speech.any())
+        return speech, duration
+
+    def _update_noise_floor(self, energy_db: np.ndarray) -> None:
+        """直近のエネルギーの下位の値から環境音のレベルを推定する"""
+        levels = energy_db[-NOISE_WINDOW_FRAMES:]
+        positions = (self._levels_pos + np.arange(len(levels))) % NOISE_WINDOW_FRAMES
+        self._levels[positions] = levels
+        self._levels_pos = (self._levels_pos + len(levels)) % NOISE_WINDOW_FRAMES
+        self._levels_filled = min(NOISE_WINDOW_FRAMES, self._levels_filled + len(levels))
+        filled = self._levels[:self._levels_filled]
+        k = len(filled) * NOISE_PERCENTILE // 100
+        self.noise_floor_db = float(np.partition(filled, k)[k])
+
+    def _keep_for_preroll(self, message: Message, duration: float) -> None:
+        """送らなかった音声を、発話の開始時に送るため直近の分だけ残す"""
+        self._preroll.append((message, duration))
+        self._preroll_duration += duration
+        while self._preroll and self._preroll_duration - self._preroll[0][1] >= self.preroll:
+            _, dropped = self._preroll.popleft()
+            self._preroll_duration -= dropped
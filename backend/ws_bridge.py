@@ -0,0 +1,188 @@
+"""
+aiohttpのWebSocketと上流（websocketsライブラリ）の橋渡し
+main.handle_client / create_proxy は websockets のプロトコルオブジェクト
+（async for でフレームを返し、send / close を持つ）を前提にしているため、
+aiohttpの WebSocketResponse を同じインターフェースで扱えるようにする
+
+- async for はテキスト/バイナリのフレームの中身（str / bytes）を返す
+- 送信は上限付きのキューを介して専用タスクが行い、キューが満杯の間は send が待つ
+  （上流からの読み込みが止まり、TCPのフロー制御で上流側に背圧がかかる）
+- 送信が WS_SEND_TIMEOUT 秒以上進まないクライアントは切断し、ワーカーに無制限に溜めない
+  （送信タスクが終了した（クライアントへの送信に失敗した）場合は待たずにすぐ ConnectionResetError にする）
+- どちらかが閉じたら、もう一方も閉じる（main.passthrough_task が close を呼ぶ）
+"""
+import os
+import asyncio
+import logging
+from typing import Optional, Union
+
+from aiohttp import web, WSMsgType
+
+from pcm_protocol import PCM_SUBPROTOCOL
+
+logger = logging.getLogger(__name__)
+
+# 送信キューの上限（フレーム数）と、キューが空くのを待つ最大時間（秒）
+WS_SEND_QUEUE_SIZE = int(os.getenv('WS_SEND_QUEUE_SIZE', '64'))
+WS_SEND_TIMEOUT = float(os.getenv('WS_SEND_TIMEOUT', '10'))
+# close時に未送信のフレームを送り切るまで待つ最大時間（秒）
+WS_CLOSE_TIMEOUT = float(os.getenv('WS_CLOSE_TIMEOUT', '2'))
+
+_CLOSE = object()
+
+
+class AiohttpWebSocketAdapter:
+    """aiohttpの WebSocketResponse を websockets のプロトコルオブジェクトとして扱うアダプター"""
+
+    def __init__(
+        self,
+        ws: web.WebSocketResponse,
+        max_queue: Optional[int] = None,
+        send_timeout: Optional[float] = None,
+        path: str = ''
+    ):
+        """
+        初期化
+        Args:
+            ws: prepare済みの WebSocketResponse
+            max_queue: 送信キューの上限（省略時は環境変数 WS_SEND_QUEUE_SIZE）
+            send_timeout: キューが空くのを待つ最大時間（省略時は環境変数 WS_SEND_TIMEOUT）
+            path: リクエストのパス（クエリ文字列を含む）
+        """
+        self._ws = ws
+        self.path = path
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue or WS_SEND_QUEUE_SIZE)
+        self._send_timeout = send_timeout or WS_SEND_TIMEOUT
+        self._writer = asyncio.ensure_future(self._write_loop())
+        self._closing = False
+
+    @property
+    def close_code(self) -> Optional[int]:
+        """クライアントから受け取った（または送った）クローズコード"""
+        return self._ws.close_code
+
+    @property
+    def close_reason(self) -> str:
+        return ''
+
+    @property
+    def subprotocol(self) -> Optional[str]:
+        """ハンドシェイクで選んだサブプロトコル（なければNone）"""
+        return self._ws.ws_protocol
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        """テキスト/バイナリフレームの中身を返す（クローズまたはエラーで終了）"""
+        async for msg in self._ws:
+            if msg.type in (WSMsgType.TEXT, WSMsgType.BINARY):
+                yield msg.data
+            elif msg.type == WSMsgType.ERROR:
+                logger.error(f"[WS Bridge] Client connection error: {self._ws.exception()}")
+                break
+
+    async def send(self, message: Union[str, bytes]) -> None:
+        """
+        フレームを送信キューに入れる（満杯の間は待つ）
+
+        Args:
+            message: テキスト（str）またはバイナリ（bytes）
+
+        Raises:
+            ConnectionResetError: 接続が閉じている、または送信が詰まったままの場合
+        """
+        if self._closing or self._writer.done():
+            raise ConnectionResetError('Client WebSocket is closed')
+        try:
+            self._queue.put_nowait(message)
+            return
+        except asyncio.QueueFull:
+            pass
+        # 満杯の間は、空くか、送信タスクが終了する（クライアントへの送信に失敗した）まで待つ
+        put = asyncio.ensure_future(self._queue.put(message))
+        try:
+            await asyncio.wait((put, self._writer), timeout=self._send_timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            queued = put.done()
+            if not queued:
+                put.cancel()
+        if queued:
+            return
+        if self._writer.done():
+            raise ConnectionResetError('Client WebSocket is closed')
+        logger.warning(
+            f"[WS Bridge] Client is not reading for {self._send_timeout}s "
+            f"({self._queue.qsize()} frames queued). Closing connection."
+        )
+        await self.close(code=1011, reason='Send buffer overflow', flush=False)
+        raise ConnectionResetError('Client WebSocket send buffer overflow')
+
+    async def close(self, code: int = 1000, reason: str = '', flush: bool = True) -> None:
+        """
+        未送信のフレームを送り切ってから接続を閉じる
+
+        Args:
+            code: クローズコード
+            reason: クローズの理由
+            flush: 未送信のフレームを送るか（Falseの場合は破棄する）
+        """
+        if self._closing:
+            return
+        self._closing = True
+
+        if flush and not self._writer.done():
+            try:
+                await asyncio.wait_for(self._queue.put(_CLOSE), timeout=WS_CLOSE_TIMEOUT)
+                await asyncio.wait_for(asyncio.shield(self._writer), timeout=WS_CLOSE_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning("[WS Bridge] Timed out flushing queued frames on close")
+        if not self._writer.done():
+            self._writer.cancel()
+        try:
+            await self._writer
+        except (asyncio.CancelledError, Exception):
+            pass
+
+        if not self._ws.closed:
+            await self._ws.close(code=code, message=reason.encode('utf-8'))
+
+    async def _write_loop(self) -> None:
+        """送信キューのフレームを順にクライアントへ送る"""
+        while True:
+            message = await self._queue.get()
+            if message is _CLOSE:
+                return
+            try:
+                if isinstance(message, str):
+                    await self._ws.send_str(message)
+                else:
+                    await self._ws.send_bytes(message)
+            except Exception as e:
+                logger.info(f"[WS Bridge] Client send failed: {e}")
+                return
+
+
+async def bridge_websocket(request: web.Request, handle_client) -> web.WebSocketResponse:
+    """
+    aiohttpのWebSocket接続を受け付け、main.handle_client（上流へのプロキシ）に渡す
+
+    Args:
+        request: aiohttpのリクエスト
+        handle_client: websockets のプロトコルオブジェクトを受け取るハンドラー
+
+    Returns:
+        WebSocketResponse
+    """
+    # クライアントが jre-pcm16.v1 を要求した場合だけ応じる（要求がなければ従来のJSON）
+    ws = web.WebSocketResponse(protocols=(PCM_SUBPROTOCOL,))
+    await ws.prepare(request)
+
+    client = AiohttpWebSocketAdapter(ws, path=request.path_qs)
+    try:
+        await handle_client(client)
+    except Exception as e:
+        logger.error(f"[WS Bridge] WebSocket error: {e}")
+    finally:
+        await client.close()
+    return ws
@@ -68,6 +68,23 @@ export class GeminiWebSocketService extends CommunicationService {
     return `${protocol}//${window.location.host}/ws`;
   }
 
+  private getProxyUrlWithConversationId(): string {
+    // 会話記録の開始（Cosmos DB）が接続より後になった場合は渡さない（プロキシは proxy-* の名前で保存する）
+    const conversationId = this.dialogFlowManager instanceof TicketDialogFlowManager
+      ? this.dialogFlowManager.getTicketSystemManager().getConversationRecorder()?.getCurrentConversationId()
+      : null;
+    if (!conversationId) {
+      return this.proxyUrl;
+    }
+    try {
+      const url = new URL(this.proxyUrl, window.location.href);
+      url.searchParams.set('conversation_id', conversationId);
+      return url.toString();
+    } catch {
+      return this.proxyUrl;
+    }
+  }
+
   setEventHandlers(handlers: {
     onMessage?: (message: Message) => void;
     onMessageComplete?: (message: Message) => void;
@@ -97,7 +114,8 @@ export class GeminiWebSocketService extends CommunicationService {
       this.notifyStateChange(ConnectionState.CONNECTING);
 
       // Initialize Gemini API with existing implementation
-      this.geminiAPI = new GeminiLiveAPI(this.proxyUrl, this.projectId);
+      // プロキシの録音（PROXY_RECORDING_ENABLED）を会話記録と同じIDで保存できるように、IDを渡す
+      this.geminiAPI = new GeminiLiveAPI(this.getProxyUrlWithConversationId(), this.projectId);
       this.audioProcessor = new AudioProcessor();
       this.audioRecorder = new AudioRecorder();
 